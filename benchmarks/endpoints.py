@@ -0,0 +1,349 @@
+"""
+Per-endpoint latency and query-count benchmark.
+
+Requests every route of ``eduscore/urls.py`` and ``quizzes/urls.py``
+in-process through the Django test client, signed in as the role the view
+requires, against the data in the configured database (fill it with
+``python manage.py seed_load`` first). Each route gets ``--warmup``
+unrecorded requests, then ``--requests`` timed ones; p50/p95/p99 latency
+and the number of SQL queries per request are written as JSON:
+
+    python benchmarks/endpoints.py --json bench.json --save-baseline benchmarks/baseline.json
+    ... change something ...
+    python benchmarks/endpoints.py --baseline benchmarks/baseline.json
+
+Against a baseline, a route regresses when its p95 grows by more than
+``--tolerance`` (and ``--min-delta-ms``), when it runs more queries, or
+when it starts failing; the script then exits with status 1. A route with
+no entry in ``CASES`` also fails the run, so new views get benchmarked.
+
+The whole run happens in a transaction that is rolled back, and so does
+every request, so POST routes (publish, regrade, autosave...) leave the
+database as it was. Cache writes are not rolled back.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eduscore.settings')
+
+
+@dataclass(frozen=True)
+class Case:
+    """How to request one route: as ``role``, with ``data`` built from the fixtures."""
+    role: str
+    method: str = 'GET'
+    data: object = None  # fixtures -> dict (query string for GET, form for POST)
+    kwargs: dict = None  # URL kwarg -> fixture name, where they differ
+
+
+def roster_file(fixtures):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    return {'roster': SimpleUploadedFile('roster.csv', f"email\n{fixtures['outsider_email']}\n".encode())}
+
+
+def draft_question(fixtures, prefix='q0'):
+    return {f'{prefix}_text': 'Edited question?', f'{prefix}_a': 'a', f'{prefix}_b': 'b',
+            f'{prefix}_c': 'c', f'{prefix}_d': 'd', f'{prefix}_correct': 'A', f'{prefix}_marks': '1'}
+
+
+CASES = {
+    # eduscore/urls.py: teacher pages
+    'classes': Case('teacher'),
+    'class_view': Case('teacher'),
+    'class_roster_upload': Case('teacher', 'POST', roster_file),
+    'class_gradebook': Case('teacher'),
+    'upload_material': Case('teacher'),
+    'material_upload_start': Case('teacher', 'POST', lambda f: {
+        'filename': 'notes.txt', 'size': f['blob_size'], 'sha256': f['blob_digest']}),
+    'material_upload_chunk': Case('teacher'),
+    'material_upload_complete': Case('teacher', 'POST', lambda f: {
+        'course': f['class_id'], 'title': 'Benchmark notes'}),
+    'generate_quiz': Case('teacher'),
+    'quiz_result': Case('teacher'),
+    'quiz_result_detail': Case('teacher'),
+    'teacher_dashboard': Case('teacher'),
+    # eduscore/urls.py: student pages
+    'student_dashboard': Case('student'),
+    'std_classes': Case('student'),
+    'std_class_view': Case('student'),
+    'std_leave_class': Case('student'),
+    'std_take_quiz': Case('student', kwargs={'quiz_id': 'open_quiz_id'}),
+    'std_quiz_autosave': Case('student', 'POST', lambda f: {f"q{f['open_question_id']}": 'A'},
+                              kwargs={'quiz_id': 'open_quiz_id'}),
+    'std_quiz_pending': Case('student', data=lambda f: {'format': 'json'}),
+    'std_quiz_result': Case('student'),
+    'student_profile': Case('student'),
+    'std_notifications': Case('student'),
+    'std_quizzes': Case('student'),
+    'media': Case('student'),
+    'metrics': Case('staff'),
+    # quizzes/urls.py
+    'quiz_list': Case('teacher'),
+    'create_quiz': Case('teacher'),
+    'add_questions': Case('teacher'),
+    'quiz_publish': Case('teacher', 'POST'),
+    'quiz_exam_mode': Case('teacher', 'POST'),
+    'quiz_regrade': Case('teacher', 'POST'),
+    'quiz_ai_generate': Case('teacher', 'POST', lambda f: {
+        'total_questions': '5', 'total_marks': '10', 'difficulty': 'medium'}),
+    'quiz_ai_job': Case('teacher', data=lambda f: {'format': 'json'}),
+    'quiz_ai_cancel': Case('teacher', 'POST'),
+    'quiz_ai_preview': Case('teacher', data=lambda f: {'job': f['job_id']}),
+    'quiz_ai_draft': Case('teacher'),
+    'quiz_ai_draft_question': Case('teacher', 'POST', draft_question),
+    'quiz_ai_discard': Case('teacher', 'POST'),
+    'quiz_ai_save': Case('teacher', 'POST', lambda f: {
+        'title': 'Benchmark AI quiz', 'total_questions': '1', **draft_question(f)}),
+}
+
+
+def routes():
+    """``[(label, name, kwarg names)]`` of the URL patterns to benchmark."""
+    from django.urls import URLPattern, URLResolver
+
+    from eduscore import urls as eduscore_urls
+    from quizzes import urls as quizzes_urls
+
+    found = []
+
+    def walk(patterns, prefix=''):
+        for pattern in patterns:
+            if isinstance(pattern, URLPattern):
+                found.append((prefix + str(pattern.pattern), pattern.name,
+                              tuple(getattr(pattern.pattern, 'converters', {}))))
+            elif isinstance(pattern, URLResolver) and pattern.urlconf_module is quizzes_urls:
+                walk(pattern.url_patterns, prefix + str(pattern.pattern))
+
+    walk(eduscore_urls.urlpatterns)
+    return found
+
+
+def fixtures():
+    """
+    Objects the routes are requested with: the most-enrolled course, its
+    teacher, and one of its students with a graded attempt and a quiz left
+    to take. Creates a staff user, an upload session, a finished AI job and
+    a draft, all inside the run's transaction.
+    """
+    from django.db.models import Count
+
+    from courses.models import Blob, Course, Enrollment, Material
+    from courses.uploads import start_upload
+    from jobs.models import Job
+    from quizzes.drafts import create_draft
+    from quizzes.models import Quiz, QuizAttempt
+    from quizzes.tasks import ai_quiz_ref
+    from users.models import User
+
+    graded = QuizAttempt.objects.filter(is_submitted=True).values('quiz__course')
+    course = (Course.objects.filter(id__in=graded).annotate(students=Count('enrollments'))
+              .order_by('-students', 'id').first())
+    if course is None:
+        raise SystemExit("No course with graded attempts; run `python manage.py seed_load` first.")
+    teacher = course.teacher
+    quiz_ids = list(Quiz.objects.filter(course=course).order_by('id').values_list('id', flat=True))
+    attempts = QuizAttempt.objects.filter(quiz__course=course, is_submitted=True)
+    # Prefer a student who still has a quiz to take.
+    student_id = (
+        attempts.values('student').annotate(taken=Count('id'))
+        .order_by('taken', 'student').values_list('student', flat=True).first()
+    )
+    attempt = attempts.filter(student_id=student_id).order_by('id').first()
+    taken = set(attempts.filter(student_id=student_id).values_list('quiz_id', flat=True))
+    open_quiz = Quiz.objects.get(id=next((q for q in quiz_ids if q not in taken), attempt.quiz_id))
+    outsider = (Enrollment.objects.exclude(course=course).exclude(student_id=student_id)
+                .values_list('student__email', flat=True).first() or 'nobody@example.com')
+
+    material = Material.objects.filter(course=course).order_by('id').first()
+    blob = Blob.objects.filter(name=material.file.name).first() if material else None
+    upload = start_upload(teacher, 'notes.txt', blob.size if blob else 1, blob.digest if blob else '')
+
+    quiz = {'title': 'Benchmark AI quiz', 'questions': [
+        {'question': f'Question {n}?', 'options': ['a', 'b', 'c', 'd'], 'answer': 'A', 'marks': 1}
+        for n in range(10)]}
+    job = Job.objects.create(task='quizzes.generate', ref=ai_quiz_ref(teacher.id), status=Job.DONE,
+                             payload={'course_id': course.id},
+                             result={'course_id': course.id, 'quiz': quiz})
+    draft = create_draft(teacher, course, quiz)
+    staff = User.objects.create_user('benchmark-staff@example.com', is_staff=True)
+
+    return {
+        'teacher': teacher,
+        'staff': staff,
+        'student': attempt.student,
+        'class_id': course.id,
+        'quiz_id': attempt.quiz_id,
+        'attempt_id': attempt.id,
+        'open_quiz_id': open_quiz.id,
+        'open_question_id': open_quiz.questions.values_list('id', flat=True).first() or 0,
+        'outsider_email': outsider,
+        'upload_id': upload.pk,
+        'blob_size': blob.size if blob else 1,
+        'blob_digest': blob.digest if blob else '',
+        'path': material.file.name if material else 'missing',
+        'job_id': job.id,
+        'draft_id': draft.id,
+        'position': 0,
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0
+
+
+def measure(client, method, path, data, count):
+    """Time ``count`` requests; returns ``(latencies, query counts, statuses)``."""
+    from django.db import transaction
+
+    from eduscore.queryplans import capture
+
+    latencies, queries, statuses = [], [], []
+    for _ in range(count):
+        with transaction.atomic():
+            with capture() as log:
+                started = time.perf_counter()
+                response = client.generic(method, path, **data)
+                if response.streaming:
+                    # Reading the body to the end also closes the response.
+                    b''.join(response.streaming_content)
+                finished = time.perf_counter()
+            transaction.set_rollback(True)
+        latencies.append(finished - started)
+        queries.append(len(log))
+        statuses.append(response.status_code)
+    return latencies, queries, statuses
+
+
+def request_data(method, values):
+    """``Client.generic`` arguments sending ``values`` as a query string or a multipart form."""
+    from urllib.parse import urlencode
+
+    from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+    if method == 'GET':
+        return {'QUERY_STRING': urlencode(values or {}, doseq=True)}
+    return {'data': encode_multipart(BOUNDARY, values or {}), 'content_type': MULTIPART_CONTENT}
+
+
+def run(requests=50, warmup=3, only=None):
+    """Benchmark every route; returns ``{'routes': {...}, 'uncovered': [...]}``."""
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.db import connection, transaction
+    from django.test import Client
+    from django.urls import reverse
+
+    if 'testserver' not in settings.ALLOWED_HOSTS and '*' not in settings.ALLOWED_HOSTS:
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+
+    results, uncovered = {}, []
+    with transaction.atomic():
+        values = fixtures()
+        clients = {}
+        for role in ('teacher', 'student', 'staff'):
+            clients[role] = Client(raise_request_exception=False)
+            clients[role].force_login(values[role])
+
+        for label, name, params in routes():
+            case = CASES.get(name)
+            if case is None:
+                uncovered.append(label)
+                continue
+            if only and name not in only:
+                continue
+            names = case.kwargs or {}
+            path = reverse(name, kwargs={param: values[names.get(param, param)] for param in params})
+            data = request_data(case.method, case.data(values) if case.data else None)
+            client = clients[case.role]
+
+            measure(client, case.method, path, data, warmup)
+            latencies, queries, statuses = measure(client, case.method, path, data, requests)
+            key = f"{case.method} {label}"
+            results[key] = {
+                'name': name,
+                'role': case.role,
+                'path': path,
+                'requests': len(latencies),
+                'errors': sum(status >= 400 for status in statuses),
+                'status': statistics.mode(statuses),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+                'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+                'queries': int(statistics.median(queries)),
+                'queries_max': max(queries),
+            }
+        transaction.set_rollback(True)
+
+    return {
+        'database': connection.vendor,
+        'requests': requests,
+        'routes': results,
+        'uncovered': uncovered,
+    }
+
+
+def compare(results, baseline, tolerance=1.25, min_delta_ms=1.0):
+    """Regressions of ``results`` against a ``baseline`` of the same shape, as messages."""
+    regressions = [f"{label}: no benchmark case" for label in results['uncovered']]
+    for key, row in results['routes'].items():
+        old = baseline['routes'].get(key)
+        if old is None:
+            continue
+        if row['p95_ms'] > old['p95_ms'] * tolerance and row['p95_ms'] - old['p95_ms'] > min_delta_ms:
+            regressions.append(f"{key}: p95 {old['p95_ms']} -> {row['p95_ms']} ms")
+        if row['queries'] > old['queries']:
+            regressions.append(f"{key}: queries {old['queries']} -> {row['queries']}")
+        if row['errors'] and not old['errors']:
+            regressions.append(f"{key}: {row['errors']} error response(s), status {row['status']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=50, help="Timed requests per route.")
+    parser.add_argument('--warmup', type=int, default=3, help="Unrecorded requests per route first.")
+    parser.add_argument('--route', action='append', help="Only this URL name (repeatable).")
+    parser.add_argument('--json', help="Write the results to this file.")
+    parser.add_argument('--baseline', help="Compare against results saved earlier.")
+    parser.add_argument('--save-baseline', help="Also write the results here as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="Allowed p95 growth factor before a route regresses (default 1.25).")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help="Ignore p95 changes smaller than this (default 1 ms).")
+    options = parser.parse_args()
+
+    results = run(options.requests, options.warmup, options.route)
+
+    print(f"{'route':<58}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+    for key, row in results['routes'].items():
+        print(f"{key:<58}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+              f"{row['queries']:>9}{row['errors']:>8}")
+    for target in (options.json, options.save_baseline):
+        if target:
+            Path(target).write_text(json.dumps(results, indent=2))
+
+    if options.baseline:
+        regressions = compare(results, json.loads(Path(options.baseline).read_text()),
+                              options.tolerance, options.min_delta_ms)
+    else:
+        regressions = [f"{label}: no benchmark case" for label in results['uncovered']]
+    if regressions:
+        print("\nRegressions:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
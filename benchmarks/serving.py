@@ -0,0 +1,235 @@
+"""
+Compare the student pages under a WSGI and an ASGI server.
+
+Seeds a benchmark course (one quiz, ``--students`` enrolled students, half
+of them with a graded attempt) into the configured database, starts each
+server in turn and drives it with ``--clients`` concurrent keep-alive
+connections. Each client logs in as its own student and cycles through the
+class page, the quiz page and the result page. Requests/second and
+latency percentiles are printed per server.
+
+Needs the servers installed (``pip install gunicorn uvicorn``):
+
+    python benchmarks/serving.py --clients 500 --duration 30
+
+The WSGI run uses gunicorn's threaded worker with the sync views; the ASGI
+run uses uvicorn with ``eduscore.asgi``, which switches the student pages to
+the async views in ``eduscore.asviews``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eduscore.settings')
+
+SERVERS = {
+    'wsgi': ['gunicorn', 'eduscore.wsgi:application', '--worker-class', 'gthread',
+             '--workers', '{workers}', '--threads', '{threads}', '--bind', '127.0.0.1:{port}',
+             '--backlog', '2048', '--log-level', 'warning'],
+    'asgi': ['uvicorn', 'eduscore.asgi:application', '--workers', '{workers}',
+             '--host', '127.0.0.1', '--port', '{port}', '--backlog', '2048',
+             '--no-access-log', '--log-level', 'warning'],
+}
+
+
+def seed(students):
+    """Create (or reuse) the benchmark course; returns ``[(session_key, [paths])]``."""
+    import django
+    django.setup()
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.core.management import call_command
+
+    from courses.models import Course, Enrollment
+    from quizzes.grading import grade_submissions
+    from quizzes.models import Question, Quiz, QuizAttempt
+    from users.models import User
+
+    call_command('migrate', verbosity=0)
+    teacher, _ = User.objects.get_or_create(
+        email='bench-teacher@edu.com', defaults={'first_name': 'Bench', 'role': 'teacher'})
+    course, _ = Course.objects.get_or_create(
+        code='BENCH01', defaults={'teacher': teacher, 'title': 'Benchmark class'})
+    quiz, created = Quiz.objects.get_or_create(
+        course=course, title='Benchmark quiz',
+        defaults={'created_by': teacher, 'is_published': True, 'time_limit': 30})
+    if created:
+        Question.objects.bulk_create(
+            Question(quiz=quiz, text=f'Question {n}?', option_a='a', option_b='b',
+                     option_c='c', option_d='d', correct_option='ABCD'[n % 4], marks=1)
+            for n in range(20))
+
+    existing = set(User.objects.filter(email__startswith='bench-student').values_list('email', flat=True))
+    User.objects.bulk_create(
+        User(email=email, first_name='Bench', role='student')
+        for email in (f'bench-student{i}@edu.com' for i in range(students)) if email not in existing)
+    users = list(User.objects.filter(email__startswith='bench-student').order_by('id')[:students])
+    enrolled = set(Enrollment.objects.filter(course=course).values_list('student_id', flat=True))
+    Enrollment.objects.bulk_create(
+        Enrollment(course=course, student=user) for user in users if user.id not in enrolled)
+
+    attempted = dict(QuizAttempt.objects.filter(quiz=quiz).values_list('student_id', 'id'))
+    questions = list(quiz.questions.values_list('id', flat=True))
+    todo = [user for user in users[::2] if user.id not in attempted]
+    if todo:
+        grade_submissions(quiz, [
+            (user, {qid: 'ABCD'[(user.id + n) % 4] for n, qid in enumerate(questions)}) for user in todo])
+        attempted = dict(QuizAttempt.objects.filter(quiz=quiz).values_list('student_id', 'id'))
+
+    clients = []
+    for user in users:
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        paths = [f'/student/classes/{course.id}/']
+        if user.id in attempted:
+            paths.append(f'/student/quiz-result/{attempted[user.id]}/')
+        else:
+            paths.append(f'/student/take-quiz/{quiz.id}')
+        clients.append((session.session_key, paths))
+    return clients
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {k.lower(): v.strip() for k, _, v in (line.partition(':') for line in lines[1:] if line)}
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def client(port, session_key, paths, stop_at, record_after, latencies, errors):
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < stop_at:
+        path = paths[i % len(paths)]
+        i += 1
+        request = (f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                   f'Cookie: sessionid={session_key}\r\nConnection: keep-alive\r\n\r\n').encode()
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            status, keep_alive = await read_response(reader)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            status = 0
+            if writer is not None:
+                writer.close()
+            writer = None
+        finished = time.perf_counter()
+        if started >= record_after:
+            if 200 <= status < 400:
+                latencies.append(finished - started)
+            else:
+                errors.append(status)
+    if writer is not None:
+        writer.close()
+
+
+async def drive(port, clients, concurrency, duration, warmup):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    record_after = start + warmup
+    stop_at = record_after + duration
+    await asyncio.gather(*(
+        client(port, *clients[i % len(clients)], stop_at, record_after, latencies, errors)
+        for i in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}.")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not start listening on port {port}.")
+
+
+def run_server(kind, options, clients):
+    command = [part.format(workers=options.workers, threads=options.threads, port=options.port)
+               for part in SERVERS[kind]]
+    if shutil.which(command[0]) is None:
+        raise SystemExit(f"{command[0]} is not installed; pip install gunicorn uvicorn")
+
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='eduscore.settings')
+    env.pop('EDUSCORE_ASYNC_VIEWS', None)  # eduscore.asgi sets it for the ASGI run
+    process = subprocess.Popen(command, cwd=ROOT, env=env, start_new_session=True)
+    try:
+        wait_for_port(options.port, process)
+        latencies, errors = asyncio.run(
+            drive(options.port, clients, options.clients, options.duration, options.warmup))
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0
+    return {
+        'server': kind,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / options.duration, 1),
+        'p50_ms': round(percentile(0.50), 1),
+        'p99_ms': round(percentile(0.99), 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 1) if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--servers', default='wsgi,asgi', help="Comma-separated: wsgi, asgi.")
+    parser.add_argument('--clients', type=int, default=500, help="Concurrent connections.")
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30, help="Measured seconds per server.")
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--threads', type=int, default=32, help="Threads per gunicorn worker.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--json', help="Also write the results to this file.")
+    options = parser.parse_args()
+
+    clients = seed(options.students)
+    results = [run_server(kind, options, clients) for kind in options.servers.split(',')]
+
+    print(f"{'server':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'errors':>9}")
+    for row in results:
+        print(f"{row['server']:<8}{row['rps']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}"
+              f"{row['mean_ms']:>10}{row['errors']:>9}")
+    if options.json:
+        Path(options.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Course, Enrollment, Material
+from .models import Blob, Course, Enrollment, Material, TeacherStats
 
 
 @admin.register(Course)
@@ -36,3 +36,18 @@ class MaterialAdmin(admin.ModelAdmin):
     search_fields = ('title', 'course__title')
     ordering = ('-uploaded_at',)
     readonly_fields = ('uploaded_at',)
+
+
+@admin.register(TeacherStats)
+class TeacherStatsAdmin(admin.ModelAdmin):
+    list_display = ('teacher', 'total_classes', 'total_students', 'total_quizzes',
+                    'total_materials', 'attempt_count', 'updated_at')
+    search_fields = ('teacher__email',)
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'created_at', 'released_at')
+    search_fields = ('name', 'digest')
+    readonly_fields = ('name', 'digest', 'size', 'created_at', 'released_at')
@@ -0,0 +1,109 @@
+import codecs
+import csv
+import re
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import User
+from .models import Enrollment
+from . import stats
+
+
+# Stay under SQLite's default limit of 999 bound parameters per statement.
+LOOKUP_BATCH_SIZE = 900
+
+EMAIL_SPLIT_RE = re.compile(r'[\s,;]+')
+
+
+def batched(iterable, size):
+    """Yield lists of at most ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def normalize_emails(emails):
+    """Lower-case, strip and de-duplicate emails, keeping their first-seen order."""
+    seen = set()
+    for email in emails:
+        email = email.strip().lower()
+        if email and email not in seen:
+            seen.add(email)
+            yield email
+
+
+def split_emails(raw):
+    """Split a pasted roster on commas, semicolons or whitespace."""
+    return EMAIL_SPLIT_RE.split(raw or '')
+
+
+def parse_roster(file):
+    """
+    Stream email addresses out of an uploaded CSV or plain-text roster.
+
+    The file is decoded chunk by chunk, so memory stays flat however long
+    the roster is. Any cell that looks like an address is picked up, which
+    covers one-per-line lists as well as exports with name/email columns.
+    """
+    lines = codecs.iterdecode(file, 'utf-8-sig', errors='replace')
+    for row in csv.reader(lines):
+        for cell in row:
+            for token in split_emails(cell):
+                if '@' in token:
+                    yield token
+
+
+@transaction.atomic
+def enroll_students(course, emails):
+    """
+    Enroll every student account matching ``emails`` into ``course``.
+
+    Emails are resolved with batched ``IN`` lookups, diffed against the
+    existing enrollments and inserted with one ``bulk_create`` per batch,
+    all inside a single transaction. Rows are stamped with one ``joined_on``
+    so the ones actually inserted can be told apart from students another
+    request enrolled meanwhile, which ``ignore_conflicts`` drops silently.
+
+    Returns ``(added, skipped)`` lists of emails, where skipped covers
+    unknown addresses and students who were already enrolled.
+    """
+    emails = list(normalize_emails(emails))
+    student_ids = {}
+    for batch in batched(emails, LOOKUP_BATCH_SIZE):
+        student_ids.update(
+            User.objects.filter(email__in=batch, role='student').values_list('email', 'id')
+        )
+
+    enrolled = set()
+    for batch in batched(student_ids.values(), LOOKUP_BATCH_SIZE):
+        enrolled.update(
+            Enrollment.objects.filter(course=course, student_id__in=batch)
+            .values_list('student_id', flat=True)
+        )
+
+    candidates = [student_ids[email] for email in emails
+                  if email in student_ids and student_ids[email] not in enrolled]
+    joined_on = timezone.now()
+    Enrollment.objects.bulk_create(
+        [Enrollment(course=course, student_id=student_id, joined_on=joined_on) for student_id in candidates],
+        batch_size=LOOKUP_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    inserted = set()
+    for batch in batched(candidates, LOOKUP_BATCH_SIZE):
+        inserted.update(
+            Enrollment.objects.filter(course=course, student_id__in=batch, joined_on=joined_on)
+            .values_list('student_id', flat=True)
+        )
+
+    added, skipped = [], []
+    for email in emails:
+        if student_ids.get(email) in inserted:
+            added.append(email)
+        else:
+            skipped.append(email)
+    # bulk_create bypasses post_save, so keep the teacher rollup in step here.
+    stats.bump_course_teacher(course.id, total_students=len(added))
+    return added, skipped
@@ -0,0 +1,93 @@
+"""
+Plain-text extraction from uploaded materials.
+
+Text, DOCX and PPTX files are handled with the standard library. PDFs need
+the optional ``pypdf`` package; without it their text is left empty.
+"""
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - optional dependency
+    PdfReader = None
+
+
+MAX_TEXT_CHARS = 1_000_000
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.csv', '.tsv', '.json', '.html', '.htm', '.rtf'}
+
+# Text-bearing element of each Office Open XML format, and the zip members holding it.
+OFFICE_PARTS = {
+    '.docx': ('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t',
+              re.compile(r'word/document\.xml$')),
+    '.pptx': ('{http://schemas.openxmlformats.org/drawingml/2006/main}t',
+              re.compile(r'ppt/slides/slide\d+\.xml$')),
+}
+
+
+class ExtractionError(Exception):
+    """Raised when a file looks supported but cannot be read."""
+
+
+def read_text(file):
+    data = file.read(MAX_TEXT_CHARS * 4)
+    for encoding in ('utf-8-sig', 'cp1252'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+
+def read_office(file, extension):
+    tag, members = OFFICE_PARTS[extension]
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as exc:
+        raise ExtractionError(f"Not a valid {extension} file.") from exc
+
+    def natural(name):
+        return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+    paragraphs, size = [], 0
+    for name in sorted((n for n in archive.namelist() if members.match(n)), key=natural):
+        with archive.open(name) as part:
+            for _, element in ElementTree.iterparse(part):
+                if element.tag == tag and element.text:
+                    paragraphs.append(element.text)
+                    size += len(element.text)
+                element.clear()
+                if size >= MAX_TEXT_CHARS:
+                    return ' '.join(paragraphs)
+    return ' '.join(paragraphs)
+
+
+def read_pdf(file):
+    if PdfReader is None:
+        return ''
+    pages, size = [], 0
+    for page in PdfReader(file).pages:
+        text = page.extract_text() or ''
+        pages.append(text)
+        size += len(text)
+        if size >= MAX_TEXT_CHARS:
+            break
+    return '\n'.join(pages)
+
+
+def extract_text(file, name=None):
+    """Return the plain text of an uploaded file (a Django File or file object)."""
+    extension = os.path.splitext(name or getattr(file, 'name', ''))[1].lower()
+    if extension in TEXT_EXTENSIONS:
+        text = read_text(file)
+    elif extension in OFFICE_PARTS:
+        text = read_office(file, extension)
+    elif extension == '.pdf':
+        text = read_pdf(file)
+    else:
+        text = ''
+    text = re.sub(r'[ \t\r\f\v]+', ' ', text)
+    return re.sub(r'\n\s*\n+', '\n\n', text).strip()[:MAX_TEXT_CHARS]
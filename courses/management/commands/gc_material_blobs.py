@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from courses.models import Blob, Material, UploadSession
+from courses.storage import content_storage
+from courses.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = "Delete unreferenced material blobs and abandoned chunked uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help="Keep unreferenced blobs this long so re-uploads can reuse them.")
+        parser.add_argument('--upload-days', type=float, default=7,
+                            help="Drop chunked uploads untouched for this many days.")
+        parser.add_argument('--recount', action='store_true',
+                            help="Recompute reference counts from the Material table first.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        dry_run = options['dry_run']
+
+        if options['recount']:
+            counts = dict(
+                Material.objects.values_list('file').annotate(n=Count('id')).order_by())
+            fixed = 0
+            for blob in Blob.objects.only('id', 'name', 'ref_count').iterator():
+                actual = counts.get(blob.name, 0)
+                if blob.ref_count != actual:
+                    fixed += 1
+                    if not dry_run:
+                        Blob.objects.filter(id=blob.id).update(ref_count=actual, released_at=now)
+            self.stdout.write(f"Corrected {fixed} reference count(s).")
+
+        cutoff = now - timedelta(hours=options['grace_hours'])
+        orphans = Blob.objects.filter(ref_count__lte=0, created_at__lt=cutoff).exclude(
+            released_at__gte=cutoff)
+        freed = removed = 0
+        for blob in orphans.iterator():
+            removed += 1
+            freed += blob.size
+            if not dry_run:
+                # Re-check under the delete so a blob reused meanwhile survives.
+                if Blob.objects.filter(id=blob.id, ref_count__lte=0).delete()[0]:
+                    content_storage.delete(blob.name)
+
+        stale = UploadSession.objects.filter(
+            updated_at__lt=now - timedelta(days=options['upload_days']))
+        abandoned = 0
+        for session in stale.iterator():
+            abandoned += 1
+            if not dry_run:
+                discard_upload(session)
+
+        prefix = "Would remove" if dry_run else "Removed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {removed} blob(s) ({freed / 1024 ** 2:.1f} MB) "
+            f"and {abandoned} abandoned upload(s)."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.stats import rebuild_teacher_stats
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized TeacherStats rows from the source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--teacher', action='append', default=[],
+            help="Teacher email or id to rebuild (repeatable). Defaults to all teachers.",
+        )
+
+    def handle(self, *args, **options):
+        teacher_ids = None
+        if options['teacher']:
+            teacher_ids = []
+            for ref in options['teacher']:
+                lookup = {'id': ref} if ref.isdigit() else {'email': ref.lower()}
+                teacher = User.objects.filter(role='teacher', **lookup).first()
+                if teacher is None:
+                    raise CommandError(f"No teacher found for '{ref}'.")
+                teacher_ids.append(teacher.id)
+
+        written = rebuild_teacher_stats(teacher_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {written} teacher(s)."))
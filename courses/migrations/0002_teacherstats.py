@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 17:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_classes', models.IntegerField(default=0)),
+                ('total_students', models.IntegerField(default=0)),
+                ('total_quizzes', models.IntegerField(default=0)),
+                ('total_materials', models.IntegerField(default=0)),
+                ('attempt_count', models.IntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('teacher', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'teacher stats',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_teacherstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='material',
+            name='text',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
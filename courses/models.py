@@ -1,8 +1,15 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
 
+def material_storage():
+    from .storage import content_storage
+    return content_storage
+
+
 class Course(models.Model):
     """A course created and managed by a teacher."""
     teacher = models.ForeignKey(
@@ -16,6 +23,9 @@ class Course(models.Model):
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [models.Index(fields=['teacher', '-created_at'])]
+
     def __str__(self):
         return f"{self.title} ({self.code})"
 
@@ -33,6 +43,8 @@ class Enrollment(models.Model):
 
     class Meta:
         unique_together = ('student', 'course')
+        # Roster and gradebook pages read one course's students in id order.
+        indexes = [models.Index(fields=['course', 'student'])]
 
     def __str__(self):
         return f"{self.student.email} → {self.course.title}"
@@ -42,9 +54,81 @@ class Material(models.Model):
     """Learning materials uploaded by teachers."""
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='materials')
     title = models.CharField(max_length=150)
-    file = models.FileField(upload_to='materials/')
-    summary = models.TextField(blank=True, null=True)  # returned from n8n AI
+    file = models.FileField(upload_to='materials/', storage=material_storage)  # content-addressed, see courses.storage
+    text = models.TextField(blank=True, default='')  # extracted by courses.tasks
+    summary = models.TextField(blank=True, null=True)  # filled by the MATERIAL_SUMMARIZER backend
     uploaded_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [models.Index(fields=['course', '-uploaded_at'])]
+
     def __str__(self):
         return f"{self.title} - {self.course.title}"
+
+
+class TeacherStats(models.Model):
+    """Denormalized per-teacher counters read by the teacher dashboard.
+
+    Kept in step by the signal handlers in ``courses.signals``; the
+    ``rebuild_teacher_stats`` command recomputes it from scratch.
+    """
+    teacher = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='stats'
+    )
+    total_classes = models.IntegerField(default=0)
+    total_students = models.IntegerField(default=0)
+    total_quizzes = models.IntegerField(default=0)
+    total_materials = models.IntegerField(default=0)
+    attempt_count = models.IntegerField(default=0)  # submitted attempts only
+    score_sum = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'teacher stats'
+
+    @property
+    def avg_score(self):
+        if not self.attempt_count:
+            return 0
+        return round(self.score_sum / self.attempt_count, 1)
+
+    def __str__(self):
+        return f"Stats for {self.teacher.email}"
+
+
+class Blob(models.Model):
+    """One stored copy of a material file, shared by every Material with the same content.
+
+    ``ref_count`` is kept in step by the Material signal handlers; blobs that
+    drop to zero are removed by the ``gc_material_blobs`` command.
+    """
+    name = models.CharField(max_length=255, unique=True)  # storage path
+    digest = models.CharField(max_length=64, db_index=True)  # SHA-256 of the content
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    released_at = models.DateTimeField(null=True, blank=True)  # last time ref_count fell
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class UploadSession(models.Model):
+    """A resumable, chunked material upload in progress."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)  # digest announced by the client
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
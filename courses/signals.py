@@ -0,0 +1,138 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from quizzes.models import Quiz, QuizAttempt
+from users.models import User
+from .models import Course, Enrollment, Material
+from . import stats
+from .storage import release_blob, retain_blob
+
+
+# Handlers run inside the writer's transaction, so a rolled-back write
+# never leaves the TeacherStats counters out of step with the source rows.
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.bump_teacher(instance.teacher_id, total_classes=1)
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    stats.bump_teacher(instance.teacher_id, total_classes=-1)
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.bump_course_teacher(instance.course_id, total_students=1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    stats.bump_course_teacher(instance.course_id, total_students=-1)
+
+
+def stored_file_name(material):
+    value = material.__dict__.get('file')
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Material)
+def material_loaded(sender, instance, **kwargs):
+    instance._stored_file = stored_file_name(instance) if instance.pk else ''
+
+
+@receiver(post_save, sender=Material)
+def material_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.bump_course_teacher(instance.course_id, total_materials=1)
+
+    # Keep the shared blob's reference count in step with the file it points at.
+    name = stored_file_name(instance)
+    if name != instance._stored_file:
+        retain_blob(name)
+        release_blob(instance._stored_file)
+        instance._stored_file = name
+
+
+@receiver(post_delete, sender=Material)
+def material_deleted(sender, instance, **kwargs):
+    stats.bump_course_teacher(instance.course_id, total_materials=-1)
+    release_blob(stored_file_name(instance))
+
+
+@receiver(post_save, sender=Quiz)
+def quiz_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.bump_teacher(instance.created_by_id, total_quizzes=1)
+
+
+@receiver(post_delete, sender=Quiz)
+def quiz_deleted(sender, instance, **kwargs):
+    stats.bump_teacher(instance.created_by_id, total_quizzes=-1)
+
+
+# Attempts have no delete receivers, so deleting a quiz or a student
+# fast-deletes their attempts; the pre_delete receivers below subtract them
+# in one query. QuizAttempt.delete() does the same for a single attempt;
+# other code deleting attempts must call stats.forget_attempts itself.
+
+@receiver(pre_delete, sender=Quiz)
+def quiz_deleting(sender, instance, **kwargs):
+    stats.forget_attempts(QuizAttempt.objects.filter(quiz=instance))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    stats.forget_attempts(QuizAttempt.objects.filter(student=instance))
+
+
+ATTEMPT_FIELDS = ('is_submitted', 'score')
+
+
+def attempt_contribution(values):
+    """(attempt_count, score_sum) an attempt with these field values adds to its teacher's stats."""
+    if values['is_submitted']:
+        return 1, values['score'] or 0
+    return 0, 0
+
+
+def stored_contribution(attempt):
+    """attempt_contribution of the attempt as stored, (0, 0) if it is not."""
+    values = QuizAttempt.objects.filter(pk=attempt.pk).values(*ATTEMPT_FIELDS).first()
+    return attempt_contribution(values) if values else (0, 0)
+
+
+def loaded_fields(attempt):
+    values = attempt.__dict__
+    return values if all(field in values for field in ATTEMPT_FIELDS) else None
+
+
+@receiver(post_init, sender=QuizAttempt)
+def attempt_loaded(sender, instance, **kwargs):
+    if not instance.pk:
+        instance._stats_contribution = (0, 0)
+    else:
+        # Unknown (None) if a field is deferred; read from the database on save.
+        values = loaded_fields(instance)
+        instance._stats_contribution = attempt_contribution(values) if values else None
+
+
+@receiver(pre_save, sender=QuizAttempt)
+def attempt_saving(sender, instance, **kwargs):
+    if instance._stats_contribution is None:
+        instance._stats_contribution = stored_contribution(instance)
+
+
+@receiver(post_save, sender=QuizAttempt)
+def attempt_saved(sender, instance, **kwargs):
+    old_count, old_sum = instance._stats_contribution
+    values = loaded_fields(instance)
+    new_count, new_sum = attempt_contribution(values) if values else stored_contribution(instance)
+    stats.bump_quiz_teacher(
+        instance.quiz_id,
+        attempt_count=new_count - old_count,
+        score_sum=new_sum - old_sum,
+    )
+    instance._stats_contribution = (new_count, new_sum)
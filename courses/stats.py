@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from users.models import User
+from .models import Course, Enrollment, Material, TeacherStats
+
+
+COUNTER_FIELDS = (
+    'total_classes', 'total_students', 'total_quizzes',
+    'total_materials', 'attempt_count', 'score_sum',
+)
+
+
+def bump(stats_filter, **deltas):
+    """
+    Apply relative changes to the TeacherStats row(s) matching ``stats_filter``.
+
+    The update is a single ``UPDATE ... SET col = col + n`` so concurrent
+    writers never lose increments. A teacher without a stats row is left
+    alone; the row is built from the source tables on first read.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    TeacherStats.objects.filter(**stats_filter).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def bump_teacher(teacher_id, **deltas):
+    bump({'teacher_id': teacher_id}, **deltas)
+
+
+def bump_course_teacher(course_id, **deltas):
+    bump({'teacher__courses__id': course_id}, **deltas)
+
+
+def bump_quiz_teacher(quiz_id, **deltas):
+    bump({'teacher__created_quizzes__id': quiz_id}, **deltas)
+
+
+def forget_attempts(attempts):
+    """Subtract the submitted ones of ``attempts``, about to be deleted, from their teachers' stats."""
+    rows = (attempts.filter(is_submitted=True).values('quiz__created_by')
+            .annotate(count=Count('id'), total=Sum('score')).order_by())
+    for row in rows:
+        bump_teacher(row['quiz__created_by'], attempt_count=-row['count'], score_sum=-(row['total'] or 0))
+
+
+def compute_teacher_stats(teacher_ids=None):
+    """Return ``{teacher_id: {field: value}}`` computed from the source tables."""
+    from quizzes.models import Quiz, QuizAttempt
+
+    teachers = User.objects.filter(role='teacher')
+    if teacher_ids is not None:
+        teachers = teachers.filter(id__in=teacher_ids)
+    results = {
+        teacher_id: dict.fromkeys(COUNTER_FIELDS, 0)
+        for teacher_id in teachers.values_list('id', flat=True)
+    }
+
+    def collect(queryset, teacher_field, **aggregates):
+        if teacher_ids is not None:
+            queryset = queryset.filter(**{f'{teacher_field}__in': teacher_ids})
+        rows = queryset.values(teacher_field).annotate(**aggregates).order_by()
+        for row in rows:
+            target = results.get(row[teacher_field])
+            if target is not None:
+                for field in aggregates:
+                    target[field] = row[field] or 0
+
+    collect(Course.objects.all(), 'teacher', total_classes=Count('id'))
+    collect(Enrollment.objects.all(), 'course__teacher', total_students=Count('id'))
+    collect(Quiz.objects.all(), 'created_by', total_quizzes=Count('id'))
+    collect(Material.objects.all(), 'course__teacher', total_materials=Count('id'))
+    collect(
+        QuizAttempt.objects.filter(is_submitted=True), 'quiz__created_by',
+        attempt_count=Count('id'), score_sum=Sum('score'),
+    )
+    return results
+
+
+@transaction.atomic
+def rebuild_teacher_stats(teacher_ids=None):
+    """Recompute and store TeacherStats rows; returns the number written."""
+    computed = compute_teacher_stats(teacher_ids)
+    existing = {
+        stats.teacher_id: stats
+        for stats in TeacherStats.objects.filter(teacher_id__in=computed)
+    }
+
+    to_create, to_update = [], []
+    for teacher_id, values in computed.items():
+        stats = existing.get(teacher_id)
+        if stats is None:
+            to_create.append(TeacherStats(teacher_id=teacher_id, **values))
+            continue
+        for field, value in values.items():
+            setattr(stats, field, value)
+        stats.updated_at = timezone.now()
+        to_update.append(stats)
+
+    TeacherStats.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+    TeacherStats.objects.bulk_update(
+        to_update, list(COUNTER_FIELDS) + ['updated_at'], batch_size=500)
+    return len(to_create) + len(to_update)
+
+
+def get_teacher_stats(teacher):
+    """Fetch a teacher's stats row in one lookup, building it on first use."""
+    stats = TeacherStats.objects.filter(teacher=teacher).first()
+    if stats is None:
+        rebuild_teacher_stats([teacher.id])
+        stats = TeacherStats.objects.get(teacher=teacher)
+    return stats
@@ -0,0 +1,85 @@
+"""
+Content-addressed storage for material files.
+
+A file is stored once under ``blobs/<aa>/<bb>/<sha256><ext>`` however many
+materials reference it. Uploads are hashed while they stream in (see
+``courses.uploads``), so saving a file whose content is already stored only
+costs a lookup; the duplicate bytes are discarded instead of written.
+
+Each stored file has a ``Blob`` row whose ``ref_count`` follows the
+Material rows pointing at it. Unreferenced blobs are not deleted straight
+away, since a concurrent upload of the same content may be about to reuse
+them; ``gc_material_blobs`` removes them after a grace period.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+
+# Imported as a module: Material.file resolves this storage while models load.
+from . import models
+
+
+BLOB_PREFIX = 'blobs'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(content):
+    """SHA-256 hex digest of a Django File, read in chunks."""
+    hasher = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        hasher.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+def blob_name(digest, filename=''):
+    extension = os.path.splitext(filename)[1].lower()[:10]
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by their content hash."""
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None) or file_digest(content)
+        target = blob_name(digest, name)
+
+        if not self.exists(target):
+            saved = super()._save(target, content)
+            if saved != target:
+                # Lost a race with an identical upload; keep the first copy.
+                self.delete(saved)
+
+        models.Blob.objects.get_or_create(
+            name=target, defaults={'digest': digest, 'size': content.size})
+        return target
+
+
+content_storage = ContentAddressedStorage()
+
+
+def retain_blob(name):
+    if name:
+        models.Blob.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+
+def release_blob(name):
+    if name:
+        models.Blob.objects.filter(name=name).update(
+            ref_count=F('ref_count') - 1, released_at=timezone.now())
+
+
+def find_blob(digest, owner):
+    """
+    A stored blob with the given SHA-256 that ``owner`` already uses in one
+    of their courses, if any. Blobs of other teachers' materials are never
+    returned: knowing a file's digest must not grant access to its content.
+    """
+    names = models.Material.objects.filter(course__teacher=owner).values('file')
+    return models.Blob.objects.filter(digest=digest, name__in=names).order_by('id').first()
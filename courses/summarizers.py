@@ -0,0 +1,80 @@
+"""
+Summarizer backends for uploaded materials.
+
+``settings.MATERIAL_SUMMARIZER`` names the backend class. ``LocalSummarizer``
+is a dependency-free extractive stand-in; ``WebhookSummarizer`` posts the
+text to an external service (such as an n8n workflow) and reads back
+``{"summary": "..."}``.
+"""
+import json
+import re
+import urllib.request
+from collections import Counter
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class SummarizerError(Exception):
+    pass
+
+
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this '
+    'to was were will with which these those their there been not but can may'.split()
+)
+
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+WORD_RE = re.compile(r"[a-z][a-z'-]+")
+
+
+class LocalSummarizer:
+    """Pick the sentences whose words are most frequent in the whole text."""
+
+    def __init__(self, sentences=5, max_input_chars=200_000):
+        self.sentences = sentences
+        self.max_input_chars = max_input_chars
+
+    def summarize(self, text, title=''):
+        text = text[:self.max_input_chars]
+        sentences = [s.strip() for s in SENTENCE_RE.split(text) if len(s.split()) >= 4]
+        if len(sentences) <= self.sentences:
+            return ' '.join(sentences) or text[:500]
+
+        frequencies = Counter(
+            word for word in WORD_RE.findall(text.lower()) if word not in STOP_WORDS)
+
+        def weight(sentence):
+            words = [w for w in WORD_RE.findall(sentence.lower()) if w not in STOP_WORDS]
+            return sum(frequencies[w] for w in words) / (len(words) or 1)
+
+        best = sorted(range(len(sentences)), key=lambda i: weight(sentences[i]), reverse=True)
+        return ' '.join(sentences[i] for i in sorted(best[:self.sentences]))
+
+
+class WebhookSummarizer:
+    """Ask an external service (``settings.MATERIAL_SUMMARY_WEBHOOK``) for the summary."""
+
+    def __init__(self, url=None, timeout=120):
+        self.url = url or settings.MATERIAL_SUMMARY_WEBHOOK
+        self.timeout = timeout
+
+    def summarize(self, text, title=''):
+        if not self.url:
+            raise SummarizerError("MATERIAL_SUMMARY_WEBHOOK is not configured.")
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({'title': title, 'text': text}).encode(),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            body = json.load(response)
+        summary = body.get('summary') if isinstance(body, dict) else None
+        if not summary:
+            raise SummarizerError("The summarizer returned no summary.")
+        return summary
+
+
+def get_summarizer():
+    backend = getattr(settings, 'MATERIAL_SUMMARIZER', 'courses.summarizers.LocalSummarizer')
+    return import_string(backend)()
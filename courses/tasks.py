@@ -0,0 +1,60 @@
+"""Background processing of uploaded materials (see ``jobs.queue``)."""
+from jobs.queue import enqueue, task
+from quizzes.retrieval import get_index
+from search.index import index_materials
+
+from .extraction import extract_text
+from .models import Material
+from .summarizers import get_summarizer
+
+
+def material_ref(material_id):
+    return f"material:{material_id}"
+
+
+def queue_material_processing(material):
+    """Extract and summarize ``material`` off the request path."""
+    return enqueue('materials.extract_text', ref=material_ref(material.id), material_id=material.id)
+
+
+@task('materials.extract_text', max_attempts=3, backoff=10)
+def extract_material_text(material_id):
+    material = Material.objects.filter(id=material_id).first()
+    if material is None:
+        return {'skipped': 'material deleted'}
+
+    # Files are stored once per content, so another course may have processed this one.
+    done = (
+        Material.objects.filter(file=material.file.name, summary__isnull=False)
+        .exclude(id=material_id).exclude(text='')
+        .values('text', 'summary').first()
+    )
+    if done:
+        Material.objects.filter(id=material_id).update(**done)
+        index_materials([material_id])
+        get_index(material_id, done['text'])
+        return {'characters': len(done['text']), 'reused': True}
+
+    with material.file.open('rb') as file:
+        text = extract_text(file, material.file.name)
+    Material.objects.filter(id=material_id).update(text=text)
+    index_materials([material_id])
+
+    if text:
+        get_index(material_id, text)  # warm the passage index used by quiz generation
+        enqueue('materials.summarize', ref=material_ref(material_id), material_id=material_id)
+    return {'characters': len(text)}
+
+
+# Summaries may come from a remote service, so retry longer and cap parallel calls.
+@task('materials.summarize', max_attempts=5, backoff=60, concurrency=2)
+def summarize_material(material_id):
+    row = Material.objects.filter(id=material_id).values_list('title', 'text').first()
+    if row is None:
+        return {'skipped': 'material deleted'}
+    title, text = row
+
+    summary = get_summarizer().summarize(text, title=title)
+    Material.objects.filter(id=material_id).update(summary=summary)
+    index_materials([material_id])
+    return {'characters': len(summary)}
@@ -0,0 +1,182 @@
+"""
+Upload handling for material files.
+
+The hashing upload handlers compute the SHA-256 of a file while Django
+streams it to memory or to a temporary file, so the content-addressed
+storage never has to read an upload twice.
+
+Large files can instead be sent in chunks through an ``UploadSession``:
+each chunk is buffered in a file of its own and spliced in at its offset
+in a part file only once the request has advanced ``received``, so two
+requests sending the same range cannot overwrite each other's bytes. A
+dropped connection resumes from ``received``, and the finished part file
+is moved (not copied) into storage. A client that already knows the file's digest can
+skip the transfer entirely when one of their own materials already uses
+that content; anyone else has to send the bytes, which are hashed here.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import UploadSession
+from .storage import HASH_CHUNK_SIZE
+
+
+class HashingMemoryFileUploadHandler(MemoryFileUploadHandler):
+    # new_file() raises StopFutureHandlers once this handler takes the file,
+    # so the hasher is set up before calling it.
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.activated:
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.hasher.hexdigest()
+        return file
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        return file
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the session left off."""
+
+    def __init__(self, received):
+        super().__init__(f"Expected a chunk at offset {received}.")
+        self.received = received
+
+
+def upload_dir():
+    return getattr(settings, 'MATERIAL_UPLOAD_DIR', os.path.join(settings.MEDIA_ROOT, 'uploads'))
+
+
+def part_path(session):
+    return os.path.join(upload_dir(), f"{session.pk}.part")
+
+
+def start_upload(owner, filename, size, sha256=''):
+    max_size = getattr(settings, 'MATERIAL_MAX_UPLOAD_SIZE', None)
+    if size < 0 or (max_size and size > max_size):
+        raise UploadError("File is too large.")
+    return UploadSession.objects.create(
+        owner=owner, filename=os.path.basename(filename)[:255], size=size, sha256=sha256.lower())
+
+
+def append_chunk(session, offset, stream):
+    """
+    Write the bytes of ``stream`` at ``offset`` of the session's part file
+    and return the new ``received`` count.
+    """
+    if offset != session.received:
+        raise OffsetMismatch(session.received)
+
+    os.makedirs(upload_dir(), exist_ok=True)
+    # The chunk is read off the network before any lock is taken.
+    written = 0
+    with tempfile.TemporaryFile(dir=upload_dir()) as chunk:
+        while True:
+            block = stream.read(HASH_CHUNK_SIZE)
+            if not block:
+                break
+            if offset + written + len(block) > session.size:
+                raise UploadError("Chunk runs past the announced file size.")
+            chunk.write(block)
+            written += len(block)
+
+        with transaction.atomic():
+            # Only one writer may advance the session from a given offset; the
+            # winner holds the row until its bytes are in the part file, and a
+            # failed write rolls the advance back.
+            advanced = UploadSession.objects.filter(pk=session.pk, received=offset).update(
+                received=F('received') + written, updated_at=timezone.now())
+            if advanced:
+                chunk.seek(0)
+                splice(chunk, part_path(session), offset)
+
+    session.refresh_from_db(fields=['received', 'updated_at'])
+    if not advanced:
+        raise OffsetMismatch(session.received)
+    return session.received
+
+
+def splice(chunk, path, offset):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        for block in iter(lambda: chunk.read(HASH_CHUNK_SIZE), b''):
+            os.pwrite(fd, block, offset)
+            offset += len(block)
+    finally:
+        os.close(fd)
+
+
+class PartFile(File):
+    """A finished part file; storage moves it into place instead of copying."""
+
+    def __init__(self, path, name, sha256):
+        super().__init__(open(path, 'rb'), name=name)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def hash_part(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def finish_upload(session):
+    """Return a File for the completed upload; the caller saves it and calls ``discard``."""
+    if session.received != session.size:
+        raise UploadError(f"Upload incomplete: {session.received} of {session.size} bytes.")
+    path = part_path(session)
+    if not os.path.exists(path):
+        # A zero-byte file never had a chunk written.
+        open(path, 'wb').close()
+    digest = hash_part(path)
+    if session.sha256 and session.sha256 != digest:
+        raise UploadError("Uploaded content does not match the announced checksum.")
+    return PartFile(path, session.filename, digest)
+
+
+def discard_upload(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eduscore.settings')
+# Serve the hot student pages with the async views in eduscore.asviews.
+os.environ.setdefault('EDUSCORE_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,168 @@
+"""
+Async versions of the busiest student views, for ASGI deployments.
+
+Under exam load a sync worker holds a thread for the whole request,
+including every database round trip. These views await the async ORM
+instead, so a worker's event loop keeps serving other students while
+queries run, and cache reads and writes use the cache's async methods.
+The remaining sync calls (compiling a quiz on a cache miss, grading a
+submission in a transaction) go through ``sync_to_async``.
+
+``eduscore.urls`` routes to these views when ``settings.ASYNC_STUDENT_VIEWS``
+is on, which ``eduscore.asgi`` enables. They build the same context as
+their ``eduscore.sviews`` counterparts and render the same templates.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.db import IntegrityError
+from django.http import Http404
+from django.shortcuts import redirect, render
+
+from courses.models import Course, Enrollment
+from quizzes import autosave, deadlines
+from quizzes.cache import get_compiled_quiz, local_cache
+from quizzes.exam import apending_receipt, journal_submission
+from quizzes.grading import grade_submission
+from quizzes.models import Quiz, QuizAttempt
+from quizzes.ranking import ascore_distribution, standing
+from users.decorators import role
+from .sviews import (
+    PERFORMANCE_AGGREGATES, class_view_context, class_view_querysets, quiz_graded_response,
+    quiz_result_context, quiz_waiting_response,
+)
+
+
+async def aget_object_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+async def compiled_quiz(quiz):
+    """CompiledQuiz for ``quiz``; only a cache miss leaves the event loop."""
+    compiled = local_cache.get(quiz.id)
+    if compiled is not None and compiled.version == quiz.version:
+        return compiled
+    return await sync_to_async(get_compiled_quiz)(quiz)
+
+
+@role('student')
+async def std_classes(request):
+    """List all classes joined by the student and handle joining via class code."""
+    if request.method == 'POST':
+        class_code = request.POST.get('class_code', '').strip().upper()
+
+        if not class_code:
+            messages.warning(request, "Please enter a valid class code.")
+            return redirect('std_classes')
+
+        course = await Course.objects.filter(code=class_code).afirst()
+        if not course:
+            messages.error(request, f"No class found with code '{class_code}'.")
+            return redirect('std_classes')
+
+        if await Enrollment.objects.filter(course=course, student=request.user).aexists():
+            messages.info(request, f"You are already enrolled in {course.title}.")
+            return redirect('std_classes')
+
+        await Enrollment.objects.acreate(course=course, student=request.user)
+        messages.success(request, f"You have successfully joined '{course.title}'.")
+        return redirect('std_classes')
+
+    enrolled_classes = await alist(
+        Course.objects.filter(enrollments__student=request.user).select_related('teacher').distinct())
+    return render(request, 'student/classes.html', {'enrolled_classes': enrolled_classes})
+
+
+@role('student')
+async def class_view(request, class_id):
+    """Student class page (see ``sviews.class_view``)."""
+    course = await aget_object_or_404(Course.objects.select_related('teacher'), id=class_id)
+    if not await Enrollment.objects.filter(student=request.user, course=course).aexists():
+        raise Http404("No Enrollment matches the given query.")
+
+    queries = class_view_querysets(course, request.user)
+    context = class_view_context(
+        course,
+        materials=await alist(queries["materials"]),
+        classmates=await alist(queries["classmates"]),
+        quizzes=await alist(queries["quizzes"]),
+        stats=await queries["attempts"].aaggregate(**PERFORMANCE_AGGREGATES),
+        history=await alist(queries["history"]),
+    )
+    return render(request, "student/class_view.html", context)
+
+
+@role('student')
+async def std_take_quiz(request, quiz_id):
+    """Display quiz to student and evaluate answers."""
+    quiz = await aget_object_or_404(Quiz.objects.all(), id=quiz_id)
+
+    if not await Enrollment.objects.filter(course_id=quiz.course_id, student=request.user).aexists():
+        messages.error(request, "You are not enrolled in this class.")
+        return redirect("std_classes")
+
+    attempt = await QuizAttempt.objects.filter(
+        student=request.user, quiz=quiz).values('id', 'is_submitted', 'deadline').afirst()
+    if attempt and attempt['is_submitted']:
+        return redirect("std_quiz_result", attempt_id=attempt['id'])
+    if quiz.exam_mode and await apending_receipt(quiz.id, request.user.id):
+        return redirect("std_quiz_pending", quiz_id=quiz.id)
+
+    compiled = await compiled_quiz(quiz)
+
+    if request.method == "POST" or (attempt and deadlines.is_late(attempt['deadline'])):
+        key = compiled.key
+        answers, late = await sync_to_async(deadlines.submission_answers)(
+            attempt and attempt['id'], attempt and attempt['deadline'], key,
+            key.answers_from_post(request.POST))
+        if late:
+            messages.warning(request, "Time ran out; the answers saved before the time limit were submitted.")
+        if quiz.exam_mode:
+            # The journal append blocks on fsync; keep it off the event loop.
+            await sync_to_async(journal_submission, thread_sensitive=False)(quiz, request.user, answers)
+            return redirect("std_quiz_pending", quiz_id=quiz.id)
+        try:
+            attempt = await sync_to_async(grade_submission)(quiz, request.user, answers, key=key)
+        except IntegrityError:
+            # A concurrent submit from the same student won the race.
+            attempt = await QuizAttempt.objects.aget(student=request.user, quiz=quiz)
+        else:
+            await autosave.adiscard(quiz.id, request.user.id, attempt.id, key.positions)
+        return redirect("std_quiz_result", attempt_id=attempt.id)
+
+    if attempt is None:
+        started = await sync_to_async(deadlines.start_attempt)(quiz, request.user)
+        attempt = {'id': started.id, 'deadline': started.deadline}
+    return render(request, "student/take_quiz.html", {
+        "quiz": compiled,
+        "questions": compiled.questions,
+        "saved_answers": await sync_to_async(autosave.saved_answers)(
+            attempt['id'], compiled.key.positions),
+        "seconds_left": deadlines.seconds_left(attempt['deadline']),
+    })
+
+
+@role('student')
+async def std_quiz_pending(request, quiz_id):
+    attempt_id = await QuizAttempt.objects.filter(
+        student=request.user, quiz_id=quiz_id, is_submitted=True).values_list('id', flat=True).afirst()
+    return (quiz_graded_response(request, attempt_id)
+            or quiz_waiting_response(request, quiz_id, await apending_receipt(quiz_id, request.user.id)))
+
+
+@role('student')
+async def std_quiz_result(request, attempt_id):
+    attempt = await aget_object_or_404(
+        QuizAttempt.objects.select_related('quiz__course'), id=attempt_id, student=request.user)
+
+    ranking = None
+    if attempt.is_submitted:
+        distribution = await ascore_distribution(attempt.quiz_id)
+        ranking = standing(attempt.quiz_id, attempt.score, distribution)
+    return render(request, "student/quiz_result.html", quiz_result_context(attempt, ranking))
@@ -0,0 +1,171 @@
+"""
+Access-checked serving of uploaded media (replaces ``static()`` for MEDIA_URL).
+
+Material files are only served to the course's teacher and its enrolled
+students. Responses support single byte ranges (206), conditional requests
+(ETag / Last-Modified, 304) and are streamed with ``FileResponse``.
+
+With ``settings.MEDIA_ACCEL`` set to ``'x-sendfile'`` (Apache, lighttpd) or
+``'x-accel-redirect'`` (nginx), the view only does the permission check and
+hands the file to the front proxy, which then deals with ranges and caching
+without tying up a Python worker.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from courses.models import Material
+from courses.storage import BLOB_PREFIX, content_storage
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Blob paths embed the content hash, so their bytes never change.
+IMMUTABLE_CACHE = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'private, no-cache'
+
+
+def can_access(user, name):
+    """Whether ``user`` may read the media file stored as ``name``."""
+    if user.is_superuser:
+        return True
+    top = name.split('/', 1)[0]
+    if top in (BLOB_PREFIX, 'materials'):
+        return Material.objects.filter(file=name).filter(
+            Q(course__teacher=user) | Q(course__enrollments__student=user)
+        ).exists()
+    if top == 'profiles':
+        return True
+    return False
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single ``bytes=`` range,
+    ``None`` to serve the whole file, or raise ValueError if unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None  # absent, malformed or multi-range: send everything
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if not length:
+            raise ValueError
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+class RangeFile:
+    """File wrapper yielding only ``length`` bytes from ``start``."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def accel_response(name, path, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_ACCEL == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + name
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def serve_media(request, name, storage=content_storage):
+    """Serve ``name`` from ``storage`` with range and conditional support."""
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("File not found.")
+
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if getattr(settings, 'MEDIA_ACCEL', None):
+        return accel_response(name, path, content_type)
+
+    immutable = name.startswith(BLOB_PREFIX + '/')
+    etag = quote_etag(
+        os.path.splitext(os.path.basename(name))[0] if immutable
+        else f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    )
+    last_modified = int(stat.st_mtime)
+
+    def headers(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return headers(not_modified)
+
+    size = stat.st_size
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range in (etag, http_date(last_modified)):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return headers(response)
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+        return headers(response)
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(file, start, length), content_type=content_type, status=206)
+        response.block_size = STREAM_BLOCK_SIZE
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return headers(response)
+
+
+@require_safe
+@login_required
+def protected_media(request, path):
+    name = posixpath.normpath(path).lstrip('/')
+    if name.startswith('..') or not can_access(request.user, name):
+        raise Http404("File not found.")
+    return serve_media(request, name)
@@ -0,0 +1,346 @@
+"""
+Per-request instrumentation.
+
+``RequestMetricsMiddleware`` measures each request: total and view time,
+the number and duration of SQL queries (through
+``connection.execute_wrapper``), template render time and response size.
+The numbers go out in a ``Server-Timing`` header, so the browser's network
+panel shows where the time went. They are also added to in-process
+histograms per URL name, which the ``metrics`` view serves in the
+Prometheus text format.
+
+Render time is measured by ``TimedDjangoTemplates``, the template backend
+configured in ``settings.TEMPLATES``.
+
+Queries are counted by ``record_query``, an ``execute_wrapper`` installed
+once on every database connection, which reports to the request running
+in the current context. Connections are per thread, and under ASGI the
+async views' queries run in asgiref's shared sync thread, so a wrapper
+installed around each request on the event loop's connection would miss
+them (and could not be unwound safely with requests overlapping).
+
+The middleware is both sync and async capable, so under ASGI the async
+views keep running on the event loop.
+
+Requests slower than ``settings.SLOW_REQUEST_THRESHOLD`` seconds are logged
+with their most expensive SQL statements. ``/metrics`` is served to staff
+users, and to scrapers sending ``Authorization: Bearer
+<settings.METRICS_TOKEN>``.
+
+Histograms are kept per process. Under several workers, each one reports
+its own requests; Prometheus sums them over the scraped instances.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.crypto import constant_time_compare
+
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+SLOW_SQL_SHOWN = 5
+SLOW_SQL_LENGTH = 300
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request spent, filled in while it runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.view_started = None
+        self.view = 0.0
+        self.template = 0.0
+        self.rendering = False
+        self.queries = 0
+        self.sql = 0.0
+        self.statements = {}  # sql -> [count, seconds]
+        self.size = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql += elapsed
+            statement = self.statements.setdefault(sql, [0, 0.0])
+            statement[0] += 1
+            statement[1] += elapsed
+
+    def top_statements(self, limit=SLOW_SQL_SHOWN):
+        """``[(sql, count, seconds)]`` of the statements that took longest in total."""
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, count, seconds) for sql, (count, seconds) in ranked[:limit]]
+
+    def server_timing(self):
+        entries = [
+            f'app;dur={self.total * 1000:.1f}',
+            f'view;dur={self.view * 1000:.1f}',
+            f'db;dur={self.sql * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template * 1000:.1f}',
+        ]
+        if self.size is not None:
+            entries.append(f'size;desc="{self.size} bytes"')
+        return ', '.join(entries)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """``(le, cumulative count)`` pairs, ending with ``+Inf``."""
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+# name -> (help, buckets, RequestMetrics attribute)
+HISTOGRAMS = {
+    'eduscore_request_duration_seconds': ("Time to serve the request.", DURATION_BUCKETS, 'total'),
+    'eduscore_view_duration_seconds': ("Time spent in the view.", DURATION_BUCKETS, 'view'),
+    'eduscore_db_duration_seconds': ("Time spent running SQL.", DURATION_BUCKETS, 'sql'),
+    'eduscore_db_queries': ("SQL queries run per request.", QUERY_BUCKETS, 'queries'),
+    'eduscore_template_duration_seconds': ("Time spent rendering templates.", DURATION_BUCKETS, 'template'),
+    'eduscore_response_size_bytes': ("Size of the response body.", SIZE_BUCKETS, 'size'),
+}
+
+
+class Registry:
+    """Histograms per ``(metric, URL name)`` and response counts per status class."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.responses = {}
+
+    def record(self, view, status, metrics):
+        with self.lock:
+            for name, (_, buckets, attribute) in HISTOGRAMS.items():
+                value = getattr(metrics, attribute)
+                if value is None:
+                    continue
+                histogram = self.histograms.get((name, view))
+                if histogram is None:
+                    histogram = self.histograms[name, view] = Histogram(buckets)
+                histogram.observe(value)
+            key = (view, f'{status // 100}xx')
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.responses.clear()
+
+    def exposition(self):
+        """The metrics in the Prometheus text format."""
+        lines = []
+        with self.lock:
+            for name, (help_text, _, _) in HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (metric, view), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    label = f'view="{escape(view)}"'
+                    for bound, count in histogram.samples():
+                        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum:g}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+            name = 'eduscore_responses_total'
+            lines += [f'# HELP {name} Responses sent, by status class.', f'# TYPE {name} counter']
+            for (view, status), count in sorted(self.responses.items()):
+                lines.append(f'{name}{{view="{escape(view)}",status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def instrument(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_connections():
+    """Instrument the connections of the calling thread."""
+    for connection in connections.all():
+        instrument(connection)
+
+
+def connection_opened(sender, connection, **kwargs):
+    instrument(connection)
+
+
+connection_created.connect(connection_opened)
+
+
+class RequestMetricsMiddleware:
+    """Instrument every request; list it first in MIDDLEWARE to time the whole stack."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.instrumented = False
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # An async process_view runs on the event loop, without a thread hop.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        instrument_connections()
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not self.instrumented:
+            # Connections opened from now on are instrumented by the signal.
+            await sync_to_async(instrument_connections)()
+            self.instrumented = True
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        now = time.perf_counter()
+        metrics.total = now - metrics.started
+        if metrics.view_started is not None:
+            metrics.view = now - metrics.view_started
+        metrics.size = response_size(response)
+
+        match = request.resolver_match
+        view = (match.view_name if match else None) or 'unmatched'
+        registry.record(view, response.status_code, metrics)
+        if getattr(settings, 'SERVER_TIMING_HEADER', True):
+            response['Server-Timing'] = metrics.server_timing()
+
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', 1.0)
+        if threshold is not None and metrics.total >= threshold:
+            log_slow_request(request, view, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+
+def log_slow_request(request, view, metrics):
+    statements = '\n'.join(
+        f'  {seconds * 1000:.1f} ms x{count}: {sql[:SLOW_SQL_LENGTH]}'
+        for sql, count, seconds in metrics.top_statements()
+    )
+    logger.warning(
+        "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, templates %.0f ms\n%s",
+        request.method, request.path, view, metrics.total * 1000, metrics.queries,
+        metrics.sql * 1000, metrics.template * 1000, statements,
+    )
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None or metrics.rendering:
+            # Templates rendered while another one renders are part of its time.
+            return super().render(context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template += time.perf_counter() - started
+            metrics.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing renders for RequestMetricsMiddleware."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def scrape_allowed(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    scheme, _, given = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and constant_time_compare(given.strip(), token)
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, open to staff users and to requests with
+    ``Authorization: Bearer <METRICS_TOKEN>``. The client address is not
+    trusted: behind a proxy every request comes from it.
+    """
+    if not scrape_allowed(request):
+        raise Http404
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,62 @@
+"""
+Query-plan checks for the hot pages.
+
+``capture`` records the SQL and parameters of every query run inside it
+(through ``connection.execute_wrapper``); ``explain`` asks the database
+for each query's plan, with ``EXPLAIN QUERY PLAN`` on SQLite and
+``EXPLAIN`` on PostgreSQL; ``full_scans`` lists the tables a plan reads in
+full, so a test can fail when an index stops being used.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+class QueryLog(list):
+    """``[(sql, params), ...]`` of the queries run inside ``capture``."""
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many:
+            self.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def capture(using=connection):
+    log = QueryLog()
+    with using.execute_wrapper(log):
+        yield log
+
+
+def explain(sql, params, using=connection):
+    """The plan of one query as a list of text lines."""
+    with using.cursor() as cursor:
+        if using.vendor == 'sqlite':
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+        if using.vendor == 'postgresql':
+            cursor.execute(f"EXPLAIN {sql}", params)
+            return [row[0] for row in cursor.fetchall()]
+    raise NotImplementedError(f"No plan parser for {using.vendor}.")
+
+
+# "SCAN quizzes_quiz" or "SCAN quizzes_quiz AS U0" (SQLite, any index use is
+# spelled out after it), "Seq Scan on quizzes_quiz" (PostgreSQL).
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def full_scans(plan):
+    """Tables read in full, without an index, by a plan from ``explain``."""
+    tables = []
+    for line in plan:
+        match = SQLITE_SCAN.match(line.strip()) or POSTGRES_SCAN.search(line)
+        if match:
+            tables.append(match.group(1))
+    return tables
+
+
+def temp_sorts(plan):
+    """Lines of a SQLite plan that sort rows in a temporary B-tree."""
+    return [line for line in plan if 'USE TEMP B-TREE' in line]
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,11 +41,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'users',
     'courses',
-    'quizzes'
+    'quizzes',
+    'jobs',
+    'search',
 ]
 
 
 MIDDLEWARE = [
+    'eduscore.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,7 +62,8 @@ ROOT_URLCONF = 'eduscore.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing renders for the request metrics.
+        'BACKEND': 'eduscore.metrics.TimedDjangoTemplates',
         'DIRS': ['templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -123,6 +129,13 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media is served by eduscore.media after a permission check. Set to
+# 'x-accel-redirect' (nginx, internal location at MEDIA_ACCEL_PREFIX aliased
+# to MEDIA_ROOT) or 'x-sendfile' (Apache/lighttpd) to let the proxy send the
+# bytes instead of a Python worker.
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -130,4 +143,80 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 AUTH_USER_MODEL = 'users.User'
-LOGIN_URL = '/auth/login/'
\ No newline at end of file
+LOGIN_URL = '/auth/login/'
+
+
+# Route the busiest student pages to the async views in eduscore.asviews.
+# eduscore.asgi turns this on; under WSGI the sync views are faster.
+ASYNC_STUDENT_VIEWS = os.environ.get('EDUSCORE_ASYNC_VIEWS') == '1'
+
+
+# Compiled quiz cache (quizzes.cache)
+# Number of compiled quizzes each worker keeps in memory, and an optional
+# CACHES alias used to share them between workers (None disables it).
+# The rendered take-quiz question block is cached in the default cache, so
+# point CACHES at a shared backend (memcached/redis) when running several
+# workers to let one warm-up serve all of them.
+QUIZ_CACHE_SIZE = 256
+QUIZ_CACHE_ALIAS = None
+
+# Background jobs (see jobs.queue): threads used by `manage.py run_jobs`.
+JOB_WORKERS = 4
+
+# Backend used to summarize uploaded materials. Use
+# 'courses.summarizers.WebhookSummarizer' with MATERIAL_SUMMARY_WEBHOOK set
+# to hand the text to an external service such as an n8n workflow.
+MATERIAL_SUMMARIZER = 'courses.summarizers.LocalSummarizer'
+MATERIAL_SUMMARY_WEBHOOK = None
+
+# Backend that writes AI quizzes, run by the `quizzes.generate` job. The
+# local generator is an offline stub; 'quizzes.generators.WebhookGenerator'
+# posts to QUIZ_GENERATOR_WEBHOOK. Teachers may have AI_QUIZ_MAX_PENDING
+# generations queued at once, and each worker runs at most
+# AI_QUIZ_WORKER_CONCURRENCY of them in parallel.
+QUIZ_GENERATOR = 'quizzes.generators.LocalGenerator'
+QUIZ_GENERATOR_WEBHOOK = None
+AI_QUIZ_MAX_PENDING = 2
+AI_QUIZ_WORKER_CONCURRENCY = 2
+
+# Generated quizzes are kept as drafts (quizzes.drafts) until saved; drafts
+# untouched for this long expire and are deleted by `purge_quiz_drafts`.
+AI_QUIZ_DRAFT_TTL = timedelta(days=3)
+
+# Material uploads are hashed while they stream in and stored once per
+# content digest (see courses.storage). Large files are sent in resumable
+# chunks whose part files live in MATERIAL_UPLOAD_DIR until completed.
+FILE_UPLOAD_HANDLERS = [
+    'courses.uploads.HashingMemoryFileUploadHandler',
+    'courses.uploads.HashingTemporaryFileUploadHandler',
+]
+MATERIAL_UPLOAD_DIR = BASE_DIR / 'uploads'
+MATERIAL_MAX_UPLOAD_SIZE = 2 * 1024 ** 3
+
+# Per-material BM25 passage indexes used to pick the material excerpts sent
+# to the AI quiz generator (see quizzes.retrieval). Safe to delete; indexes
+# are rebuilt on demand.
+RETRIEVAL_CACHE_DIR = BASE_DIR / 'cache' / 'retrieval'
+
+# Submissions to quizzes in exam mode are appended to a local journal and
+# graded in batches by `flush_exam_submissions` (see quizzes.exam). Keep
+# this on durable local disk; turning fsync off trades durability for speed.
+EXAM_JOURNAL_DIR = BASE_DIR / 'exam-journal'
+EXAM_JOURNAL_FSYNC = True
+
+# Answers of a quiz in progress are autosaved to the default cache and
+# written to the database in one batch per interval (see quizzes.autosave).
+QUIZ_AUTOSAVE_INTERVAL = 5  # seconds
+
+# Quiz time limits are enforced server-side (see quizzes.deadlines); input
+# arriving up to this many seconds after the deadline is still accepted.
+QUIZ_SUBMIT_GRACE = 30
+
+# Request instrumentation (see eduscore.metrics). Each response carries a
+# Server-Timing header, per-view histograms are served at /metrics to staff
+# users and to scrapers sending "Authorization: Bearer <METRICS_TOKEN>"
+# (None: staff only), and requests slower than the threshold are logged
+# with their most expensive SQL (None disables it).
+SERVER_TIMING_HEADER = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+SLOW_REQUEST_THRESHOLD = 1.0  # seconds
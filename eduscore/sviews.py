@@ -12,6 +12,16 @@ from users.decorators import role
 from courses.models import Course, Enrollment, Material
 from quizzes.models import Quiz, Question, QuizAttempt
 from users.models import User
+from django.db import IntegrityError
+from django.db.models import Avg, Count, Max, Min, OuterRef, Subquery
+from quizzes import autosave, deadlines
+from quizzes.cache import get_compiled_quiz
+from quizzes.grading import grade_submission
+from quizzes.exam import journal_submission, pending_receipt
+from quizzes.ranking import standing
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 
 @login_required
 @role('student')
@@ -54,84 +64,98 @@ def std_classes(request):
 
 
 
-@login_required
-@role('student')
-def class_view(request, class_id):
-    """Student view for class details, materials, quizzes, performance, classmates."""
-
-    course = get_object_or_404(Course, id=class_id)
-
-    # Ensure student is part of the class
-    enrollment = get_object_or_404(Enrollment, student=request.user, course=course)
+def class_view_querysets(course, student):
+    """The (unevaluated) queries behind the student class page."""
+    own_attempt = QuizAttempt.objects.filter(student=student, quiz=OuterRef('pk'), is_submitted=True)
+    attempts = QuizAttempt.objects.filter(student=student, quiz__course=course, is_submitted=True)
+    return {
+        "materials": Material.objects.filter(course=course).order_by("-uploaded_at"),
+        "classmates": User.objects.filter(
+            enrollments__course=course,
+            role="student"
+        ).exclude(id=student.id).distinct(),
+        "quizzes": (
+            Quiz.objects.filter(course=course)
+            .annotate(
+                question_count=Count('questions'),
+                attempt_id=Subquery(own_attempt.values('id')[:1]),
+                attempt_score=Subquery(own_attempt.values('score')[:1]),
+            )
+            .values('id', 'title', 'question_count', 'attempt_id', 'attempt_score')
+            .order_by("-created_at")
+        ),
+        "attempts": attempts,
+        "history": attempts.values(
+            'quiz__title', 'submitted_at', 'started_at', 'score', 'feedback'
+        ).order_by("-started_at"),
+    }
 
-    # ---------- MATERIALS ----------
-    materials = Material.objects.filter(course=course).order_by("-uploaded_at")
 
-    # ---------- CLASSMATES ----------
-    classmates = User.objects.filter(
-        enrollments__course=course,
-        role="student"
-    ).exclude(id=request.user.id).distinct()
+PERFORMANCE_AGGREGATES = {'highest': Max('score'), 'lowest': Min('score'), 'average': Avg('score')}
 
-    # ---------- QUIZZES ----------
-    quizzes = Quiz.objects.filter(course=course).order_by("-created_at")
 
-    quiz_rows = []
-    for quiz in quizzes:
-        attempt = QuizAttempt.objects.filter(student=request.user, quiz=quiz).first()
+def class_view_context(course, materials, classmates, quizzes, stats, history):
+    """Template context for the student class page from evaluated query results."""
+    quiz_rows = [
+        {
+            "id": quiz["id"],
+            "title": quiz["title"],
+            "questions": quiz["question_count"],
+            "status": "Completed" if quiz["attempt_id"] else "Pending",
+            "score": quiz["attempt_score"],
+            "attempt_id": quiz["attempt_id"],
+        }
+        for quiz in quizzes
+    ]
 
-        if attempt:
-            status = "Completed"
-            score = attempt.score
-        else:
-            status = "Pending"
-            score = None
-
-        quiz_rows.append({
-            "id": quiz.id,
-            "title": quiz.title,
-            "questions": quiz.questions.count(),
-            "status": status,
-            "score": score,
-        })
-
-    # ---------- PERFORMANCE ----------
-    attempts = QuizAttempt.objects.filter(student=request.user, quiz__course=course)
-
-    if attempts.exists():
-        highest = attempts.order_by("-score").first().score
-        lowest = attempts.order_by("score").first().score
-        average = round(sum(a.score for a in attempts) / attempts.count(), 2)
-
-        history = [
+    performance = {
+        "highest": stats["highest"] or 0,
+        "lowest": stats["lowest"] or 0,
+        "average": round(stats["average"] or 0, 2),
+        "history": [
             {
-                "quiz": a.quiz.title,
-                "date": a.created_at.strftime("%b %d, %Y"),
-                "score": a.score,
-                "feedback": a.feedback or "No feedback"
+                "quiz": a["quiz__title"],
+                "date": (a["submitted_at"] or a["started_at"]).strftime("%b %d, %Y"),
+                "score": a["score"],
+                "feedback": a["feedback"] or "No feedback"
             }
-            for a in attempts.order_by("-created_at")
-        ]
-    else:
-        highest = 0
-        lowest = 0
-        average = 0
-        history = []
-
-    performance = {
-        "highest": highest,
-        "lowest": lowest,
-        "average": average,
-        "history": history,
+            for a in history
+        ],
     }
 
-    return render(request, "student/class_view.html", {
+    return {
         "course": course,
         "materials": materials,
         "classmates": classmates,
         "quizzes": quiz_rows,
         "performance": performance,
-    })
+    }
+
+
+@login_required
+@role('student')
+def class_view(request, class_id):
+    """Student view for class details, materials, quizzes, performance, classmates.
+
+    Every section is served by a fixed number of queries, however many
+    quizzes or attempts the course has.
+    """
+
+    course = get_object_or_404(Course.objects.select_related('teacher'), id=class_id)
+
+    # Ensure student is part of the class
+    enrollment = get_object_or_404(Enrollment, student=request.user, course=course)
+
+    queries = class_view_querysets(course, request.user)
+    context = class_view_context(
+        course,
+        materials=queries["materials"],
+        classmates=queries["classmates"],
+        quizzes=queries["quizzes"],
+        stats=queries["attempts"].aggregate(**PERFORMANCE_AGGREGATES),
+        history=queries["history"],
+    )
+    return render(request, "student/class_view.html", context)
 
 
 
@@ -167,49 +191,122 @@ def std_take_quiz(request, quiz_id):
 
     # Already attempted?
     attempt = QuizAttempt.objects.filter(student=request.user, quiz=quiz).first()
-    if attempt:
+    if attempt and attempt.is_submitted:
         return redirect("std_quiz_result", attempt_id=attempt.id)
+    if quiz.exam_mode and pending_receipt(quiz.id, request.user.id):
+        return redirect("std_quiz_pending", quiz_id=quiz.id)
+
+    # Questions, options and answer key come from the compiled-quiz cache.
+    compiled = get_compiled_quiz(quiz)
+
+    # -------- POST: Submit Quiz (or time ran out) -------- #
+    if request.method == "POST" or (attempt and deadlines.is_late(attempt.deadline)):
+        key = compiled.key
+        answers, late = deadlines.submission_answers(
+            attempt and attempt.id, attempt and attempt.deadline, key, key.answers_from_post(request.POST))
+        if late:
+            messages.warning(request, "Time ran out; the answers saved before the time limit were submitted.")
+        if quiz.exam_mode:
+            # Journaled now, graded in batches by `flush_exam_submissions`.
+            journal_submission(quiz, request.user, answers)
+            return redirect("std_quiz_pending", quiz_id=quiz.id)
+        try:
+            attempt = grade_submission(quiz, request.user, answers, key=key)
+        except IntegrityError:
+            # A concurrent submit from the same student won the race.
+            attempt = QuizAttempt.objects.get(student=request.user, quiz=quiz)
+        else:
+            autosave.discard(quiz.id, request.user.id, attempt.id, key.positions)
 
-    questions = quiz.questions.all()
+        return redirect("std_quiz_result", attempt_id=attempt.id)
 
-    # -------- POST: Submit Quiz -------- #
-    if request.method == "POST":
-        total_score = 0
-        obtained_score = 0
+    # The attempt is opened on first view, starting the clock and autosave.
+    if attempt is None:
+        attempt = deadlines.start_attempt(quiz, request.user)
+    return render(request, "student/take_quiz.html", {
+        "quiz": compiled,
+        "questions": compiled.questions,
+        "saved_answers": autosave.saved_answers(attempt.id, compiled.key.positions),
+        "seconds_left": deadlines.seconds_left(attempt.deadline),
+    })
 
-        for q in questions:
-            total_score += q.marks
-            selected = request.POST.get(f"q{q.id}")
 
-            if selected and selected == q.correct_option:
-                obtained_score += q.marks
+@login_required
+@role('student')
+@require_POST
+def std_quiz_autosave(request, quiz_id):
+    """Store answers changed since the last autosave of a quiz in progress."""
+    attempt = autosave.open_attempt(quiz_id, request.user.id)
+    if attempt is None:
+        return JsonResponse({"saved": 0, "error": "No quiz in progress."}, status=409)
+    attempt_id, deadline = attempt
+    if deadlines.is_late(deadline):
+        return JsonResponse({"saved": 0, "error": "Time is up."}, status=409)
+
+    # Fetched for its version: a cached quiz compiled before an edit is stale.
+    compiled = get_compiled_quiz(get_object_or_404(Quiz, id=quiz_id))
+    saved = autosave.record(attempt_id, compiled.key, compiled.key.answers_from_post(request.POST))
+    # Whichever request finds a closed bucket writes it for everyone.
+    autosave.maybe_flush()
+    return JsonResponse({"saved": saved})
 
-        # Save attempt
-        attempt = QuizAttempt.objects.create(
-            student=request.user,
-            quiz=quiz,
-            score=obtained_score,
-            total_marks=total_score,
-            feedback="Auto-evaluated."
-        )
 
-        return redirect("std_quiz_result", attempt_id=attempt.id)
+@login_required
+@role('student')
+def std_quiz_pending(request, quiz_id):
+    """"Grading" page shown after an exam-mode submit until the attempt is stored."""
+    attempt_id = QuizAttempt.objects.filter(
+        student=request.user, quiz_id=quiz_id, is_submitted=True).values_list('id', flat=True).first()
+    return (quiz_graded_response(request, attempt_id)
+            or quiz_waiting_response(request, quiz_id, pending_receipt(quiz_id, request.user.id)))
+
+
+def quiz_graded_response(request, attempt_id):
+    """The pending page's answer when it needs no receipt: JSON polls, or the graded attempt."""
+    result_url = reverse("std_quiz_result", args=[attempt_id]) if attempt_id else None
+    if request.GET.get("format") == "json":
+        response = JsonResponse({"graded": bool(attempt_id), "result_url": result_url})
+        response["Cache-Control"] = "no-store"
+        return response
+    if result_url:
+        return redirect(result_url)
+    return None
+
+
+def quiz_waiting_response(request, quiz_id, receipt):
+    if not receipt:
+        return redirect("std_take_quiz", quiz_id=quiz_id)
+    return render(request, "student/quiz_pending.html", {"quiz_id": quiz_id, "receipt": receipt})
 
-    return render(request, "student/take_quiz.html", {
-        "quiz": quiz,
-        "questions": questions,
-    })
 
 @login_required
 @role('student')
 def std_quiz_result(request, attempt_id):
-    attempt = get_object_or_404(QuizAttempt, id=attempt_id, student=request.user)
+    attempt = get_object_or_404(
+        QuizAttempt.objects.select_related('quiz__course'), id=attempt_id, student=request.user)
+
+    # Rank and percentile come from the quiz's score histogram, not a scan of attempts.
+    ranking = standing(attempt.quiz_id, attempt.score) if attempt.is_submitted else None
+    return render(request, "student/quiz_result.html", quiz_result_context(attempt, ranking))
+
+
+def quiz_result_context(attempt, ranking):
+    distribution = []
+    if ranking and ranking.total:
+        largest = max(count for _, count in ranking.distribution)
+        distribution = [
+            {'score': score, 'count': count, 'width': round(count / largest * 100),
+             'is_own': score == attempt.score}
+            for score, count in ranking.distribution
+        ]
 
-    return render(request, "student/quiz_result.html", {
+    return {
         "attempt": attempt,
         "quiz": attempt.quiz,
         "course": attempt.quiz.course,
-    })
+        "ranking": ranking,
+        "distribution": distribution,
+    }
 
 
 @login_required
@@ -0,0 +1,803 @@
+import csv
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import types
+import zipfile
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models.signals import post_delete, pre_delete
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.enrollment import enroll_students
+from benchmarks import endpoints
+from courses.models import Blob, Course, Enrollment, Material, TeacherStats, UploadSession
+from courses.stats import compute_teacher_stats, get_teacher_stats
+from courses.uploads import OffsetMismatch, append_chunk, discard_upload, finish_upload, start_upload
+from quizzes import deadlines, exam
+from quizzes.grading import grade_submissions
+from quizzes.models import Quiz, Question, QuizAttempt, StudentAnswer
+from users.models import User
+from . import metrics, queryplans
+
+
+class StudentClassViewQueryTests(TestCase):
+    """The student class page must not issue queries per quiz or attempt."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.student = User.objects.create_user(
+            email='student@edu.com', password='secret', first_name='Sam', role='student')
+        self.course = Course.objects.create(teacher=self.teacher, title='Algebra', code='ALG001')
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.student)
+
+    def add_quizzes(self, count, attempted=True):
+        for i in range(count):
+            quiz = Quiz.objects.create(
+                course=self.course, title=f'Quiz {i}', created_by=self.teacher)
+            Question.objects.bulk_create([
+                Question(quiz=quiz, text=f'Q{n}', option_a='a', option_b='b',
+                         option_c='c', option_d='d', correct_option='A')
+                for n in range(3)
+            ])
+            if attempted:
+                QuizAttempt.objects.create(
+                    quiz=quiz, student=self.student, score=i, total_marks=3, is_submitted=True)
+
+    def count_queries(self):
+        url = reverse('std_class_view', args=[self.course.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_is_flat(self):
+        self.add_quizzes(1)
+        small, _ = self.count_queries()
+
+        self.add_quizzes(25)
+        self.add_quizzes(10, attempted=False)
+        large, response = self.count_queries()
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.context['quizzes']), 36)
+
+    def test_rows_and_performance(self):
+        self.add_quizzes(3)
+        self.add_quizzes(1, attempted=False)
+        _, response = self.count_queries()
+
+        rows = response.context['quizzes']
+        self.assertEqual(sum(r['status'] == 'Completed' for r in rows), 3)
+        self.assertTrue(all(r['questions'] == 3 for r in rows))
+
+        performance = response.context['performance']
+        self.assertEqual(performance['highest'], 2)
+        self.assertEqual(performance['lowest'], 0)
+        self.assertEqual(performance['average'], 1)
+        self.assertEqual(len(performance['history']), 3)
+
+
+class TeacherStatsTests(TestCase):
+    """TeacherStats must track the source tables as rows come and go."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.student = User.objects.create_user(
+            email='student@edu.com', password='secret', first_name='Sam', role='student')
+        self.client.force_login(self.teacher)
+
+    def dashboard_context(self):
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_counters_follow_writes(self):
+        self.assertEqual(self.dashboard_context()['total_classes'], 0)
+
+        course = Course.objects.create(teacher=self.teacher, title='Algebra', code='ALG001')
+        Enrollment.objects.create(student=self.student, course=course)
+        quiz = Quiz.objects.create(course=course, title='Quiz', created_by=self.teacher)
+        attempt = QuizAttempt.objects.create(quiz=quiz, student=self.student, score=4)
+        attempt.is_submitted = True
+        attempt.save()
+
+        context = self.dashboard_context()
+        self.assertEqual(context['total_classes'], 1)
+        self.assertEqual(context['total_students'], 1)
+        self.assertEqual(context['total_quizzes'], 1)
+        self.assertEqual(context['avg_score'], 4)
+
+        quiz.delete()
+        context = self.dashboard_context()
+        self.assertEqual(context['total_quizzes'], 0)
+        self.assertEqual(context['avg_score'], 0)
+
+        stats = self.teacher.stats
+        stats.refresh_from_db()
+        expected = compute_teacher_stats([self.teacher.id])[self.teacher.id]
+        for field, value in expected.items():
+            self.assertEqual(getattr(stats, field), value)
+
+    def assert_stats_match_source(self):
+        stats = TeacherStats.objects.get(teacher=self.teacher)
+        expected = compute_teacher_stats([self.teacher.id])[self.teacher.id]
+        self.assertEqual({field: getattr(stats, field) for field in expected}, expected)
+
+    def test_attempts_follow_deletes_and_deferred_saves(self):
+        course = Course.objects.create(teacher=self.teacher, title='Algebra', code='ALG001')
+        quizzes = [Quiz.objects.create(course=course, title=f'Quiz {i}', created_by=self.teacher)
+                   for i in range(2)]
+        students = User.objects.bulk_create([
+            User(email=f'student{i}@edu.com', first_name=f'S{i}', role='student') for i in range(5)
+        ])
+        for quiz in quizzes:
+            grade_submissions(quiz, [(student, {}) for student in students])
+        QuizAttempt.objects.update(score=2)
+        self.dashboard_context()  # builds the stats row
+        TeacherStats.objects.filter(teacher=self.teacher).update(
+            attempt_count=10, score_sum=20)
+
+        attempt = QuizAttempt.objects.defer('score', 'is_submitted').filter(quiz=quizzes[0]).first()
+        attempt.score = 3
+        attempt.save()
+        self.assert_stats_match_source()
+
+        # Without delete receivers, cascades delete attempts without loading them.
+        self.assertFalse(pre_delete.has_listeners(QuizAttempt) or post_delete.has_listeners(QuizAttempt))
+        quizzes[0].delete()
+        self.assert_stats_match_source()
+
+        students[0].delete()
+        self.assert_stats_match_source()
+        QuizAttempt.objects.filter(quiz=quizzes[1]).first().delete()
+        self.assert_stats_match_source()
+
+
+class RosterEnrollmentTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.course = Course.objects.create(teacher=self.teacher, title='Algebra', code='ALG001')
+        User.objects.bulk_create([
+            User(email=f'student{i}@edu.com', first_name=f'S{i}', role='student')
+            for i in range(50)
+        ])
+        Enrollment.objects.create(
+            student=User.objects.get(email='student0@edu.com'), course=self.course)
+
+    def test_enroll_students_reports_added_and_skipped(self):
+        emails = ['Student1@edu.com', 'student1@edu.com', 'student0@edu.com',
+                  'nobody@edu.com', 'teacher@edu.com', 'student2@edu.com']
+        added, skipped = enroll_students(self.course, emails)
+
+        self.assertEqual(added, ['student1@edu.com', 'student2@edu.com'])
+        self.assertEqual(skipped, ['student0@edu.com', 'nobody@edu.com', 'teacher@edu.com'])
+        self.assertEqual(self.course.enrollments.count(), 3)
+
+    def test_conflicting_enrollments_are_skipped(self):
+        get_teacher_stats(self.teacher)
+        filter_enrollments = Enrollment.objects.filter
+
+        def racing_filter(*args, **kwargs):
+            if 'joined_on' in kwargs:
+                return filter_enrollments(*args, **kwargs)
+            # Another request enrolls student1 after the already-enrolled lookup.
+            Enrollment.objects.get_or_create(student=User.objects.get(email='student1@edu.com'), course=self.course)
+            return filter_enrollments(*args, **kwargs).exclude(student__email='student1@edu.com')
+
+        with mock.patch.object(Enrollment.objects, 'filter', side_effect=racing_filter):
+            added, skipped = enroll_students(self.course, ['student1@edu.com', 'student2@edu.com'])
+
+        self.assertEqual((added, skipped), (['student2@edu.com'], ['student1@edu.com']))
+        self.assertEqual(self.course.enrollments.count(), 3)
+        # student1 was counted by the other request's post_save, student2 by the roster.
+        self.assertEqual(TeacherStats.objects.get(teacher=self.teacher).total_students, 3)
+
+    def test_roster_upload_streams_csv(self):
+        rows = ['name,email'] + [f'Student {i},student{i}@edu.com' for i in range(50)]
+        roster = SimpleUploadedFile('roster.csv', '\n'.join(rows).encode())
+
+        self.client.force_login(self.teacher)
+        response = self.client.post(
+            reverse('class_roster_upload', args=[self.course.id]), {'roster': roster})
+
+        self.assertRedirects(response, reverse('class_view', args=[self.course.id]))
+        self.assertEqual(self.course.enrollments.count(), 50)
+
+
+class QuizResultPageTests(TestCase):
+
+    def test_item_analysis_page(self):
+        teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=teacher, title='Algebra', code='ALG001')
+        quiz = Quiz.objects.create(course=course, title='Quiz', created_by=teacher)
+        questions = Question.objects.bulk_create([
+            Question(quiz=quiz, text=f'Q{n}', option_a='a', option_b='b',
+                     option_c='c', option_d='d', correct_option='A')
+            for n in range(4)
+        ])
+        students = User.objects.bulk_create([
+            User(email=f'student{i}@edu.com', first_name=f'S{i}', role='student')
+            for i in range(6)
+        ])
+        grade_submissions(quiz, [
+            (student, {q.id: 'A' if n < i else 'B' for n, q in enumerate(questions)})
+            for i, student in enumerate(students[:5])
+        ])
+
+        self.client.force_login(teacher)
+        self.assertRedirects(
+            self.client.get(reverse('quiz_result')), reverse('quiz_result_detail', args=[quiz.id]))
+        response = self.client.get(reverse('quiz_result_detail', args=[quiz.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['submitted_count'], 5)
+        self.assertEqual(len(response.context['items']), 4)
+        self.assertEqual(response.context['highest'], 100)
+
+    def test_students_with_an_open_attempt_are_pending(self):
+        teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=teacher, title='Algebra', code='ALG001')
+        quiz = Quiz.objects.create(course=course, title='Quiz', created_by=teacher)
+        students = User.objects.bulk_create([
+            User(email=f'student{i}@edu.com', first_name=f'S{i}', role='student')
+            for i in range(3)
+        ])
+        Enrollment.objects.bulk_create([Enrollment(student=s, course=course) for s in students])
+        QuizAttempt.objects.create(
+            quiz=quiz, student=students[0], score=1, total_marks=1, is_submitted=True)
+        QuizAttempt.objects.create(quiz=quiz, student=students[1])
+
+        self.client.force_login(teacher)
+        response = self.client.get(reverse('quiz_result_detail', args=[quiz.id]))
+
+        self.assertEqual(response.context['submitted_count'], 1)
+        self.assertEqual(response.context['pending_count'], 2)
+        self.assertEqual(
+            sorted(e.student.email for e in response.context['pending']),
+            ['student1@edu.com', 'student2@edu.com'])
+
+
+class GradebookExportTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.course = Course.objects.create(teacher=self.teacher, title='Algebra', code='ALG001')
+        quizzes = [
+            Quiz.objects.create(course=self.course, title=f'Quiz {i}', created_by=self.teacher)
+            for i in range(2)
+        ]
+        students = User.objects.bulk_create([
+            User(email=f'student{i}@edu.com', first_name=f'S{i}', role='student')
+            for i in range(3)
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, course=self.course) for student in students
+        ])
+        QuizAttempt.objects.create(quiz=quizzes[0], student=students[0], score=3, total_marks=4,
+                                   is_submitted=True)
+        QuizAttempt.objects.create(quiz=quizzes[1], student=students[0], score=1, total_marks=4,
+                                   is_submitted=True)
+        QuizAttempt.objects.create(quiz=quizzes[1], student=students[2], score=2, total_marks=4,
+                                   is_submitted=True)
+        self.client.force_login(self.teacher)
+
+    def test_csv_pivots_scores(self):
+        response = self.client.get(reverse('class_gradebook', args=[self.course.id]))
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content)))
+
+        self.assertEqual(rows[0][3:], ['Quiz 0', 'Quiz 1', 'Total score', 'Total possible', 'Percent'])
+        self.assertEqual(rows[1], ['student0@edu.com', 'S0', '', '3.0', '1.0', '4.0', '8.0', '50.0'])
+        self.assertEqual(rows[2][3:5], ['', ''])
+        self.assertEqual(rows[3][3:5], ['', '2.0'])
+
+    def test_csv_neutralizes_formulas(self):
+        User.objects.filter(email='student0@edu.com').update(first_name='=HYPERLINK("http://x")')
+        Quiz.objects.filter(title='Quiz 0').update(title='@SUM(A1)')
+        response = self.client.get(reverse('class_gradebook', args=[self.course.id]))
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+
+        self.assertEqual(rows[0][3], "'@SUM(A1)")
+        self.assertEqual(rows[1][1], '\'=HYPERLINK("http://x")')
+
+    def test_xlsx_is_a_valid_workbook(self):
+        response = self.client.get(
+            reverse('class_gradebook', args=[self.course.id]), {'format': 'xlsx'})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 4)
+        self.assertIn('student2@edu.com', sheet)
+
+
+def use_temp_media(test):
+    """Point MEDIA_ROOT at a throwaway directory for the duration of ``test``."""
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media, ignore_errors=True)
+    settings = override_settings(
+        MEDIA_ROOT=media, MATERIAL_UPLOAD_DIR=os.path.join(media, 'uploads'))
+    settings.enable()
+    test.addCleanup(settings.disable)
+    return media
+
+
+class MaterialStorageTests(TestCase):
+
+    def setUp(self):
+        self.media = use_temp_media(self)
+
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.courses = [
+            Course.objects.create(teacher=self.teacher, title=f'Class {i}', code=f'CLS00{i}')
+            for i in range(3)
+        ]
+        self.client.force_login(self.teacher)
+        self.content = b'Syllabus: week one covers cells. ' * 1000
+
+    def stored_files(self):
+        return [files for _, _, files in os.walk(os.path.join(self.media, 'blobs')) if files]
+
+    def test_same_content_is_stored_once(self):
+        for course in self.courses[:2]:
+            self.client.post(reverse('upload_material'), {
+                'course': course.id, 'title': 'Syllabus',
+                'file': SimpleUploadedFile('syllabus.txt', self.content),
+            })
+
+        first, second = Material.objects.order_by('id')
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(len(self.stored_files()), 1)
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+
+        first.delete()
+        second.delete()
+        self.assertEqual(Blob.objects.get().ref_count, 0)
+        call_command('gc_material_blobs', grace_hours=-1, stdout=io.StringIO())
+        self.assertFalse(Blob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_chunked_upload_resumes_and_dedupes(self):
+        start = self.client.post(reverse('material_upload_start'), {
+            'filename': 'syllabus.txt', 'size': len(self.content)}).json()
+        url = reverse('material_upload_chunk', args=[start['upload_id']])
+
+        half = len(self.content) // 2
+        self.client.put(url, self.content[:half], content_type='application/octet-stream',
+                        headers={'Upload-Offset': '0'})
+        # A retried chunk at a stale offset is refused with the resume point.
+        stale = self.client.put(url, self.content[:half], content_type='application/octet-stream',
+                                headers={'Upload-Offset': '0'})
+        self.assertEqual((stale.status_code, stale.json()['received']), (409, half))
+        self.client.put(url, self.content[half:], content_type='application/octet-stream',
+                        headers={'Upload-Offset': str(half)})
+
+        self.client.post(reverse('material_upload_complete', args=[start['upload_id']]),
+                         {'course': self.courses[0].id, 'title': 'Syllabus'})
+        material = Material.objects.get()
+        self.assertEqual(material.file.read(), self.content)
+
+        # A client that announces a known digest skips the transfer.
+        digest = hashlib.sha256(self.content).hexdigest()
+        start = self.client.post(reverse('material_upload_start'), {
+            'filename': 'copy.txt', 'size': len(self.content), 'sha256': digest}).json()
+        self.assertTrue(start['exists'])
+        self.client.post(reverse('material_upload_complete', args=[start['upload_id']]),
+                         {'course': self.courses[1].id, 'title': 'Syllabus'})
+
+        self.assertEqual(Material.objects.filter(file=material.file.name).count(), 2)
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'uploads')), [])
+
+    def test_racing_chunks_do_not_overwrite_each_other(self):
+        session = start_upload(self.teacher, 'syllabus.txt', 8)
+        racing = UploadSession.objects.get(pk=session.pk)
+        UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now() - timedelta(days=30))
+
+        self.assertEqual(append_chunk(session, 0, io.BytesIO(b'aaaa')), 4)
+        with self.assertRaises(OffsetMismatch):
+            append_chunk(racing, 0, io.BytesIO(b'bbbb'))
+        append_chunk(session, 4, io.BytesIO(b'cccc'))
+
+        with finish_upload(session) as part:
+            self.assertEqual(part.read(), b'aaaacccc')
+        # Receiving chunks keeps the session away from gc_material_blobs.
+        self.assertGreater(session.updated_at, timezone.now() - timedelta(minutes=1))
+        discard_upload(session)
+
+    def test_digest_does_not_give_access_to_another_teachers_file(self):
+        self.client.post(reverse('upload_material'), {
+            'course': self.courses[0].id, 'title': 'Syllabus',
+            'file': SimpleUploadedFile('syllabus.txt', self.content),
+        })
+        other = User.objects.create_user(
+            email='other@edu.com', password='secret', first_name='Olga', role='teacher')
+        course = Course.objects.create(teacher=other, title='Elsewhere', code='OTH001')
+        self.client.force_login(other)
+
+        digest = hashlib.sha256(self.content).hexdigest()
+        start = self.client.post(reverse('material_upload_start'), {
+            'filename': 'copy.txt', 'size': len(self.content), 'sha256': digest}).json()
+        self.assertNotIn('exists', start)
+        # Without the bytes the upload cannot be completed.
+        response = self.client.post(reverse('material_upload_complete', args=[start['upload_id']]),
+                                    {'course': course.id, 'title': 'Stolen'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Material.objects.filter(course=course).exists())
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+
+
+class ProtectedMediaTests(TestCase):
+
+    def setUp(self):
+        use_temp_media(self)
+        teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=teacher, title='Physics', code='PHY001')
+        self.student = User.objects.create_user(
+            email='student@edu.com', password='secret', first_name='Sam', role='student')
+        Enrollment.objects.create(student=self.student, course=course)
+        self.content = bytes(range(256)) * 40
+        self.material = Material.objects.create(
+            course=course, title='Lecture', file=SimpleUploadedFile('lecture.pdf', self.content))
+        self.url = self.material.file.url
+        self.client.force_login(self.student)
+
+    def test_enrolled_student_gets_ranges_and_304s(self):
+        full = self.client.get(self.url)
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(b''.join(full.streaming_content), self.content)
+        self.assertEqual(full['Accept-Ranges'], 'bytes')
+
+        part = self.client.get(self.url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(part.status_code, 206)
+        self.assertEqual(part['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(part.streaming_content), self.content[100:200])
+
+        tail = self.client.get(self.url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(tail.streaming_content), self.content[-10:])
+
+        cached = self.client.get(self.url, headers={'If-None-Match': full['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+        beyond = self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'})
+        self.assertEqual(beyond.status_code, 416)
+
+    def test_outsiders_are_refused(self):
+        outsider = User.objects.create_user(
+            email='other@edu.com', password='secret', first_name='Oli', role='student')
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    @override_settings(MEDIA_ACCEL='x-accel-redirect')
+    def test_proxy_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/protected-media/{self.material.file.name}')
+        self.assertEqual(response.content, b'')
+
+
+def async_student_urls():
+    """The project URLconf with the student pages routed to eduscore.asviews."""
+    from django.urls import path
+    from . import asviews, urls
+    views = {
+        'std_classes': asviews.std_classes,
+        'std_class_view': asviews.class_view,
+        'std_take_quiz': asviews.std_take_quiz,
+        'std_quiz_result': asviews.std_quiz_result,
+        'std_quiz_pending': asviews.std_quiz_pending,
+    }
+    urlconf = types.ModuleType('async_student_urls')
+    urlconf.urlpatterns = [
+        path(str(p.pattern), views[p.name], name=p.name) if getattr(p, 'name', None) in views else p
+        for p in urls.urlpatterns
+    ]
+    return urlconf
+
+
+class AsyncStudentViewTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.course = Course.objects.create(teacher=self.teacher, title='Algebra', code='ALG001')
+        self.quiz = Quiz.objects.create(
+            course=self.course, title='Week 1', created_by=self.teacher, is_published=True)
+        self.questions = Question.objects.bulk_create([
+            Question(quiz=self.quiz, text=f'Q{n}', option_a='a', option_b='b',
+                     option_c='c', option_d='d', correct_option='A', marks=1)
+            for n in range(4)
+        ])
+        self.student = User.objects.create_user(
+            email='student@edu.com', password='secret', first_name='Sam', role='student')
+        Enrollment.objects.create(course=self.course, student=self.student)
+        settings = override_settings(ROOT_URLCONF=async_student_urls())
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    async def test_student_pages(self):
+        await sync_to_async(self.async_client.force_login)(self.student)
+
+        page = await self.async_client.get(reverse('std_class_view', args=[self.course.id]))
+        self.assertEqual(page.status_code, 200)
+        self.assertEqual([q['title'] for q in page.context['quizzes']], ['Week 1'])
+
+        url = reverse('std_take_quiz', args=[self.quiz.id])
+        self.assertContains(await self.async_client.get(url), 'Q3')
+        answers = {f'q{q.id}': 'A' if n < 3 else 'B' for n, q in enumerate(self.questions)}
+        response = await self.async_client.post(url, answers)
+        attempt = await QuizAttempt.objects.aget(student=self.student, quiz=self.quiz)
+        result_url = reverse('std_quiz_result', args=[attempt.id])
+        self.assertRedirects(response, result_url, fetch_redirect_response=False)
+        self.assertEqual(attempt.score, 3)
+
+        result = await self.async_client.get(result_url)
+        self.assertEqual((result.context['ranking'].rank, result.context['ranking'].total), (1, 1))
+        self.assertRedirects(
+            await self.async_client.get(url), result_url, fetch_redirect_response=False)
+
+        other = await Course.objects.acreate(teacher=self.teacher, title='Geometry', code='GEO001')
+        await self.async_client.post(reverse('std_classes'), {'class_code': 'geo001'})
+        self.assertTrue(await Enrollment.objects.filter(course=other, student=self.student).aexists())
+        classes = await self.async_client.get(reverse('std_classes'))
+        self.assertEqual(len(classes.context['enrolled_classes']), 2)
+
+    async def test_role_checks(self):
+        url = reverse('std_class_view', args=[self.course.id])
+        response = await self.async_client.get(url)
+        self.assertRedirects(response, f"{reverse('login')}?next={url}", fetch_redirect_response=False)
+
+        await sync_to_async(self.async_client.force_login)(self.teacher)
+        self.assertEqual((await self.async_client.get(url)).status_code, 302)
+
+    async def test_exam_mode_submission(self):
+        cache.clear()
+        journal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal, ignore_errors=True)
+        self.quiz.exam_mode = True
+        await self.quiz.asave()
+        await sync_to_async(self.async_client.force_login)(self.student)
+        url = reverse('std_take_quiz', args=[self.quiz.id])
+        pending = reverse('std_quiz_pending', args=[self.quiz.id])
+
+        with override_settings(EXAM_JOURNAL_DIR=journal, EXAM_JOURNAL_FSYNC=False):
+            await self.async_client.get(url)
+            response = await self.async_client.post(url, {f'q{self.questions[0].id}': 'A'})
+            self.assertRedirects(response, pending, fetch_redirect_response=False)
+            self.assertContains(await self.async_client.get(pending), 'Grading your quiz')
+            self.assertRedirects(await self.async_client.get(url), pending, fetch_redirect_response=False)
+
+            await sync_to_async(exam.flush)()
+        attempt = await QuizAttempt.objects.aget(student=self.student, quiz=self.quiz)
+        self.assertRedirects(await self.async_client.get(pending),
+                             reverse('std_quiz_result', args=[attempt.id]), fetch_redirect_response=False)
+
+
+class QueryPlanTests(TestCase):
+    """The hot pages must be served from indexes, without full table scans."""
+
+    # Pages whose listing of ``table`` should come out of an index in order.
+    INDEX_ORDERED = {
+        'classes': 'courses_course',
+        'class_view': 'courses_material',
+        'quiz_list': 'quizzes_quiz',
+        'quiz_result_detail': 'quizzes_quizattempt',
+        'std_class_view': 'courses_material',
+    }
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.student = User.objects.create_user(
+            email='student@edu.com', password='secret', first_name='Sam', role='student')
+        self.course = Course.objects.create(teacher=self.teacher, title='Algebra', code='ALG001')
+        Enrollment.objects.create(course=self.course, student=self.student)
+        Material.objects.create(course=self.course, title='Notes', file='materials/notes.txt')
+        self.quizzes = []
+        for i in range(2):
+            quiz = Quiz.objects.create(
+                course=self.course, title=f'Quiz {i}', created_by=self.teacher, is_published=True)
+            Question.objects.create(quiz=quiz, text='1 + 1?', option_a='1', option_b='2',
+                                    option_c='3', option_d='4', correct_option='B')
+            self.quizzes.append(quiz)
+        self.attempt = grade_submissions(self.quizzes[0], [(self.student, {})])[0]
+
+    def plans(self, user, name, *args):
+        self.client.force_login(user)
+        with queryplans.capture() as log:
+            response = self.client.get(reverse(name, args=args))
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, name)
+        return [(sql, queryplans.explain(sql, params)) for sql, params in log]
+
+    def test_hot_pages_use_indexes(self):
+        pages = [
+            (self.teacher, 'teacher_dashboard'),
+            (self.teacher, 'classes'),
+            (self.teacher, 'class_view', self.course.id),
+            (self.teacher, 'quiz_list'),
+            (self.teacher, 'quiz_result_detail', self.quizzes[0].id),
+            (self.teacher, 'class_gradebook', self.course.id),
+            (self.student, 'std_classes'),
+            (self.student, 'std_class_view', self.course.id),
+            (self.student, 'std_take_quiz', self.quizzes[1].id),
+            (self.student, 'std_quiz_result', self.attempt.id),
+        ]
+        for user, name, *args in pages:
+            for sql, plan in self.plans(user, name, *args):
+                with self.subTest(page=name, sql=sql[:120]):
+                    self.assertEqual(queryplans.full_scans(plan), [], plan)
+
+                main_table = re.search(r'FROM "(\w+)"', sql)
+                table = main_table and main_table.group(1)
+                if (connection.vendor == 'sqlite' and table == self.INDEX_ORDERED.get(name)
+                        and 'ORDER BY' in sql and 'GROUP BY' not in sql):
+                    with self.subTest(page=name, sorted=table):
+                        self.assertEqual(queryplans.temp_sorts(plan), [], plan)
+
+    def test_deadline_sweep_reads_only_open_attempts(self):
+        with queryplans.capture() as log:
+            deadlines.sweep_expired()
+        plan = queryplans.explain(*log[0])
+        self.assertEqual(queryplans.full_scans(plan), [])
+        if connection.vendor == 'sqlite':
+            self.assertIn('open_attempt_deadline_idx', ' '.join(plan))
+
+
+class SeedLoadTests(TestCase):
+    """``seed_load`` data and the per-endpoint benchmark run over it."""
+
+    SIZES = dict(teachers=2, courses_per_teacher=2, students=20, enrollments_per_student=2,
+                 materials_per_course=1, quizzes_per_course=2, questions_per_quiz=4,
+                 attempt_rate=0.7, seed=7)
+
+    def setUp(self):
+        use_temp_media(self)
+
+    def seed(self, **options):
+        call_command('seed_load', stdout=io.StringIO(), **self.SIZES, **options)
+
+    def snapshot(self):
+        return list(QuizAttempt.objects.order_by('quiz__course__code', 'quiz__title', 'student__email')
+                    .values_list('quiz__course__code', 'quiz__title', 'student__email', 'score'))
+
+    def test_seed_is_consistent_and_reproducible(self):
+        self.seed()
+        self.assertEqual(Course.objects.count(), 4)
+        self.assertEqual(Enrollment.objects.count(), 40)
+        self.assertEqual(Question.objects.count(), 32)
+        attempts = QuizAttempt.objects.count()
+        self.assertGreater(attempts, 0)
+        self.assertEqual(StudentAnswer.objects.count(), attempts * 4)
+        for attempt in QuizAttempt.objects.all():
+            earned = sum(answer.question.marks for answer in attempt.answers.filter(is_correct=True))
+            self.assertEqual(attempt.score, earned)
+        stats = {row.teacher_id: row.attempt_count for row in TeacherStats.objects.all()}
+        self.assertEqual(stats, {
+            teacher_id: row['attempt_count'] for teacher_id, row in compute_teacher_stats().items()})
+
+        first = self.snapshot()
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed(reset=True)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_benchmark_covers_every_route(self):
+        self.seed()
+        results = endpoints.run(requests=1, warmup=0)
+
+        self.assertEqual(results['uncovered'], [])
+        self.assertEqual(len(results['routes']), len(endpoints.routes()))
+        for key, row in results['routes'].items():
+            with self.subTest(route=key):
+                self.assertEqual(row['errors'], 0, row)
+        self.assertEqual(endpoints.compare(results, results), [])
+
+        slower = {'routes': {key: dict(row, queries=row['queries'] + 1)
+                             for key, row in results['routes'].items()}, 'uncovered': []}
+        self.assertEqual(len(endpoints.compare(slower, results)), len(results['routes']))
+
+
+class RequestMetricsTests(TestCase):
+    """Server-Timing header, /metrics histograms and the slow request log."""
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=self.teacher, title='Algebra', code='ALG001')
+        Quiz.objects.create(course=course, title='Quiz', created_by=self.teacher)
+        self.client.force_login(self.teacher)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('quiz_list'))
+        timing = dict(
+            (entry.split(';')[0], entry) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'app', 'view', 'db', 'tpl', 'size'})
+        queries = int(re.search(r'desc="(\d+) queries"', timing['db']).group(1))
+        self.assertGreater(queries, 0)
+        self.assertIn(f'desc="{len(response.content)} bytes"', timing['size'])
+        self.assertGreater(float(re.search(r'dur=([\d.]+)', timing['tpl']).group(1)), 0)
+
+    def test_metrics_endpoint(self):
+        self.teacher.is_staff = True
+        self.teacher.save()
+        self.client.get(reverse('quiz_list'))
+        self.client.get(reverse('quiz_list'))
+        body = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('# TYPE eduscore_request_duration_seconds histogram', body)
+        self.assertIn('eduscore_request_duration_seconds_count{view="quiz_list"} 2', body)
+        self.assertIn('eduscore_request_duration_seconds_bucket{view="quiz_list",le="+Inf"} 2', body)
+        self.assertIn('eduscore_responses_total{view="quiz_list",status="2xx"} 2', body)
+        self.assertRegex(body, r'eduscore_db_queries_sum\{view="quiz_list"\} [1-9]')
+
+    def test_metrics_access(self):
+        url = reverse('metrics')
+        # Behind the proxy every request comes from localhost: that gives no access.
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 404)
+        self.teacher.is_staff = True
+        self.teacher.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape').status_code, 404)
+        with override_settings(METRICS_TOKEN='scrape'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape').status_code, 200)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    async def test_async_requests_are_measured(self):
+        student = await User.objects.acreate(email='student@edu.com', first_name='Sam', role='student')
+        course = await Course.objects.aget(code='ALG001')
+        await Enrollment.objects.acreate(course=course, student=student)
+        await sync_to_async(self.async_client.force_login)(student)
+        with override_settings(ROOT_URLCONF=async_student_urls()):
+            response = await self.async_client.get(reverse('std_class_view', args=[course.id]))
+        self.assertEqual(response.status_code, 200)
+        queries = int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+        self.assertGreater(queries, 0)
+        self.assertEqual(metrics.registry.responses[('std_class_view', '2xx')], 1)
+
+    def test_middleware_follows_the_handler_mode(self):
+        async def handler(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(metrics.RequestMetricsMiddleware(handler)))
+        self.assertFalse(iscoroutinefunction(metrics.RequestMetricsMiddleware(lambda request: None)))
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_is_logged_with_its_sql(self):
+        with self.assertLogs('eduscore.metrics', 'WARNING') as logs:
+            self.client.get(reverse('quiz_list'))
+        self.assertIn('Slow request GET /quizzes/ (quiz_list)', logs.output[0])
+        self.assertIn('quizzes_quiz', logs.output[0])
@@ -1,11 +1,37 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods, require_POST
 from django.contrib import messages
 from users.models import User
 from django.utils.crypto import get_random_string
 from django.contrib.auth.decorators import login_required
 from users.decorators import role
+from django.db.models import Count, Q
 from courses.models import Course, Enrollment, Material
+from django.db import transaction
+from courses.enrollment import batched, enroll_students, parse_roster, split_emails
+from courses.stats import get_teacher_stats
+from courses.storage import find_blob
+from courses.uploads import (
+    OffsetMismatch, UploadError, append_chunk, discard_upload, finish_upload, start_upload,
+)
+from courses.tasks import material_ref, queue_material_processing
+from jobs.queue import latest_jobs
+from quizzes.analysis import analyze_quiz
+from quizzes.cache import get_compiled_quiz
+from quizzes.gradebook import EXPORT_FORMATS, export_gradebook
 from quizzes.models import Quiz, QuizAttempt
+from courses.models import UploadSession
+
+# Emails enrolled per bulk insert when importing an uploaded roster.
+ROSTER_BATCH_SIZE = 1000
+
+# Students listed per table on the quiz result page.
+RESULT_ROWS = 100
+
+# Chunk size suggested to the browser for resumable material uploads.
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
 
 
 @login_required
@@ -13,29 +39,19 @@ from quizzes.models import Quiz, QuizAttempt
 def teacher_dashboard(request):
     teacher = request.user
 
-    # All courses taught by teacher
-    courses = Course.objects.filter(teacher=teacher)
-
-    # Stats
-    total_classes = courses.count()
-    total_students = Enrollment.objects.filter(course__teacher=teacher).count()
-    total_quizzes = Quiz.objects.filter(created_by=teacher).count()
-    total_materials = Material.objects.filter(course__teacher=teacher).count()
-
-    # Average score (from quiz attempts)
-    attempts = QuizAttempt.objects.filter(
-        quiz__created_by=teacher, is_submitted=True)
-    if attempts:
-        avg_score = round(sum(a.score for a in attempts) / attempts.count(), 1)
-    else:
-        avg_score = 0
+    # Stats (denormalized, one indexed lookup)
+    stats = get_teacher_stats(teacher)
 
     # Recent classes (limit 4)
-    recent_classes = courses.order_by('-created_at')[:4]
+    recent_classes = Course.objects.filter(teacher=teacher).annotate(
+        student_count=Count('enrollments', distinct=True),
+        quiz_count=Count('quizzes', distinct=True),
+    ).order_by('-created_at')[:4]
 
     # Recent quizzes (limit 5)
     recent_quizzes = Quiz.objects.filter(
-        created_by=teacher).order_by('-created_at')[:5]
+        created_by=teacher).select_related('course').annotate(
+        attempt_count=Count('attempts', filter=Q(attempts__is_submitted=True))).order_by('-created_at')[:5]
 
     # Student activity (limit 5)
     recent_activity = QuizAttempt.objects.filter(
@@ -44,11 +60,11 @@ def teacher_dashboard(request):
     ).select_related('quiz', 'student').order_by('-submitted_at')[:5]
 
     context = {
-        "total_classes": total_classes,
-        "total_students": total_students,
-        "total_quizzes": total_quizzes,
-        "total_materials": total_materials,
-        "avg_score": avg_score,
+        "total_classes": stats.total_classes,
+        "total_students": stats.total_students,
+        "total_quizzes": stats.total_quizzes,
+        "total_materials": stats.total_materials,
+        "avg_score": stats.avg_score,
         "recent_classes": recent_classes,
         "recent_quizzes": recent_quizzes,
         "recent_activity": recent_activity,
@@ -92,33 +108,19 @@ def teacher_class_view(request, class_id):
     course = get_object_or_404(Course, id=class_id, teacher=request.user)
     students = Enrollment.objects.filter(
         course=course).select_related('student')
-    materials = Material.objects.filter(course=course).order_by('-uploaded_at')
-
-    # Add students by email (comma-separated)
+    materials = list(
+        Material.objects.filter(course=course).defer('text').order_by('-uploaded_at'))
+    # Background processing status of each material, newest job first.
+    jobs = latest_jobs(material_ref(material.id) for material in materials)
+    for material in materials:
+        material.job = jobs.get(material_ref(material.id))
+
+    # Add students by email (comma or newline separated)
     if request.method == 'POST':
         emails_raw = request.POST.get('emails')
         if emails_raw:
-            emails = [e.strip().lower()
-                      for e in emails_raw.split(',') if e.strip()]
-            added, skipped = [], []
-
-            for email in emails:
-                student = User.objects.filter(
-                    email=email, role='student').first()
-                if not student:
-                    skipped.append(email)
-                    continue
-                if Enrollment.objects.filter(student=student, course=course).exists():
-                    skipped.append(email)
-                    continue
-                Enrollment.objects.create(student=student, course=course)
-                added.append(email)
-
-            if added:
-                messages.success(request, f"Enrolled: {', '.join(added)}")
-            if skipped:
-                messages.warning(
-                    request, f"Skipped (not found or already added): {', '.join(skipped)}")
+            added, skipped = enroll_students(course, split_emails(emails_raw))
+            report_enrollment(request, added, skipped)
             return redirect('class_view', class_id=course.id)
 
     context = {
@@ -126,12 +128,65 @@ def teacher_class_view(request, class_id):
         'students': students,
         'materials': materials,
         'total_students': students.count(),
-        'total_materials': materials.count(),
+        'total_materials': len(materials),
         'pending_quizzes': 0,  # placeholder for quiz integration
     }
     return render(request, 'teacher/class_view.html', context)
 
 
+@login_required
+@role('teacher')
+def teacher_roster_upload(request, class_id):
+    """Enroll students from an uploaded CSV or plain-text roster file."""
+    course = get_object_or_404(Course, id=class_id, teacher=request.user)
+    roster = request.FILES.get('roster') if request.method == 'POST' else None
+
+    if not roster:
+        messages.error(request, "Please choose a roster file to upload.")
+        return redirect('class_view', class_id=course.id)
+
+    added, skipped = [], []
+    with transaction.atomic():
+        for batch in batched(parse_roster(roster), ROSTER_BATCH_SIZE):
+            batch_added, batch_skipped = enroll_students(course, batch)
+            added += batch_added
+            skipped += batch_skipped
+
+    report_enrollment(request, added, skipped)
+    return redirect('class_view', class_id=course.id)
+
+
+def report_enrollment(request, added, skipped, limit=20):
+    """Flash the added/skipped outcome of a roster import."""
+    def summarize(emails):
+        shown = ', '.join(emails[:limit])
+        if len(emails) > limit:
+            shown += f" and {len(emails) - limit} more"
+        return shown
+
+    if added:
+        messages.success(request, f"Enrolled: {summarize(added)}")
+    if skipped:
+        messages.warning(
+            request, f"Skipped (not found or already added): {summarize(skipped)}")
+
+
+@login_required
+@role('teacher')
+def teacher_gradebook_export(request, class_id):
+    """Stream the course gradebook (students x quizzes) as CSV or XLSX."""
+    course = get_object_or_404(Course, id=class_id, teacher=request.user)
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        messages.error(request, f"Unsupported export format '{fmt}'.")
+        return redirect('class_view', class_id=course.id)
+
+    chunks, content_type = export_gradebook(course, fmt)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="gradebook-{course.code}.{fmt}"'
+    return response
+
+
 @login_required
 @role('teacher')
 def upload_material(request):
@@ -146,14 +201,88 @@ def upload_material(request):
             return redirect('upload_material')
 
         course = get_object_or_404(Course, id=course_id, teacher=request.user)
-        Material.objects.create(course=course, title=title, file=file)
-        messages.success(request, f"Material '{title}' uploaded successfully!")
+        material = Material.objects.create(course=course, title=title, file=file)
+        # Text extraction and summarization run in the `run_jobs` worker.
+        queue_material_processing(material)
+        messages.success(
+            request, f"Material '{title}' uploaded. Its summary will appear once processing finishes.")
         return redirect('upload_material')
 
     courses = Course.objects.filter(teacher=request.user)
     return render(request, 'teacher/upload_material.html', {'courses': courses})
 
 
+@login_required
+@role('teacher')
+@require_POST
+def material_upload_start(request):
+    """Open a resumable upload; reports ``exists`` when the teacher already stores the content."""
+    try:
+        size = int(request.POST.get('size', ''))
+        session = start_upload(
+            request.user, request.POST.get('filename', 'upload'), size,
+            request.POST.get('sha256', ''))
+    except (ValueError, UploadError) as exc:
+        return JsonResponse({'error': str(exc) or "Invalid upload."}, status=400)
+
+    data = {
+        'upload_id': str(session.pk),
+        'received': session.received,
+        'chunk_size': UPLOAD_CHUNK_SIZE,
+    }
+    # Only reveal that content is stored to a teacher who already has it.
+    if session.sha256 and find_blob(session.sha256, request.user):
+        data['exists'] = True
+    return JsonResponse(data)
+
+
+@login_required
+@role('teacher')
+@require_http_methods(['GET', 'PUT'])
+def material_upload_chunk(request, upload_id):
+    """GET reports progress (to resume); PUT appends the chunk at ``Upload-Offset``."""
+    session = get_object_or_404(UploadSession, pk=upload_id, owner=request.user)
+    if request.method == 'PUT':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            append_chunk(session, offset, request)
+        except OffsetMismatch as exc:
+            return JsonResponse({'error': str(exc), 'received': exc.received}, status=409)
+        except (ValueError, UploadError) as exc:
+            return JsonResponse({'error': str(exc) or "Invalid chunk."}, status=400)
+    return JsonResponse({'received': session.received, 'size': session.size})
+
+
+@login_required
+@role('teacher')
+@require_POST
+def material_upload_complete(request, upload_id):
+    """Turn a finished upload (or an already stored digest) into a Material."""
+    session = get_object_or_404(UploadSession, pk=upload_id, owner=request.user)
+    course = get_object_or_404(Course, id=request.POST.get('course'), teacher=request.user)
+    title = request.POST.get('title') or session.filename
+
+    blob = find_blob(session.sha256, request.user) if session.sha256 and not session.received else None
+    if blob is not None:
+        # Same content already stored: point at it without transferring any bytes.
+        material = Material.objects.create(course=course, title=title, file=blob.name)
+    else:
+        try:
+            file = finish_upload(session)
+        except UploadError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        try:
+            material = Material.objects.create(course=course, title=title, file=file)
+        finally:
+            file.close()
+    discard_upload(session)
+
+    queue_material_processing(material)
+    messages.success(
+        request, f"Material '{title}' uploaded. Its summary will appear once processing finishes.")
+    return JsonResponse({'material_id': material.id, 'redirect': reverse('upload_material')})
+
+
 @login_required
 @role('teacher')
 def generate_quiz(request):
@@ -172,9 +301,44 @@ def generate_quiz(request):
 
 @login_required
 @role('teacher')
-def quiz_result(request):
-    """Placeholder for quiz results."""
-    return render(request, 'teacher/quiz_result.html')
+def quiz_result(request, quiz_id=None):
+    """Quiz results with per-question item analysis."""
+    if quiz_id is None:
+        latest = Quiz.objects.filter(
+            created_by=request.user).values_list('id', flat=True).first()
+        if latest is None:
+            messages.info(request, "Create a quiz to see its results.")
+            return redirect('quiz_list')
+        return redirect('quiz_result_detail', quiz_id=latest)
+
+    quiz = get_object_or_404(Quiz, id=quiz_id, created_by=request.user)
+    compiled = get_compiled_quiz(quiz)
+    summary, items = analyze_quiz(compiled)
+
+    def percent(marks):
+        return round(marks / compiled.total_marks * 100) if compiled.total_marks else 0
+
+    submitted = QuizAttempt.objects.filter(quiz=quiz, is_submitted=True)
+    # Students with an open attempt have not submitted yet: they stay pending.
+    pending = Enrollment.objects.filter(course_id=quiz.course_id).exclude(
+        student__in=submitted.values('student_id'))
+
+    context = {
+        'quiz': compiled,
+        'created_at': quiz.created_at,
+        'total_students': Enrollment.objects.filter(course_id=quiz.course_id).count(),
+        'submitted_count': submitted.count(),
+        'pending_count': pending.count(),
+        'submitted': submitted.select_related('student').order_by('-submitted_at')[:RESULT_ROWS],
+        'pending': pending.select_related('student').order_by('joined_on')[:RESULT_ROWS],
+        'average': percent(summary['mean']),
+        'highest': percent(summary['highest']),
+        'lowest': percent(summary['lowest']),
+        'median': percent(summary['median']),
+        'analyzed': summary['students'],
+        'items': items,
+    }
+    return render(request, 'teacher/quiz_result.html', context)
 
 
 @login_required
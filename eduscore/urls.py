@@ -1,22 +1,34 @@
 from django.conf import settings
-from django.conf.urls.static import static
 
 from django.contrib import admin
 from django.urls import path, include
+from .media import protected_media
+from .metrics import metrics
 from .tviews import *
 from .sviews import *
 
+if settings.ASYNC_STUDENT_VIEWS:
+    from .asviews import class_view, std_classes, std_quiz_pending, std_quiz_result, std_take_quiz
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     # path('', home, name='home'),
     path('quizzes/', include('quizzes.urls')),
+    path('search/', include('search.urls')),
 
     path('auth/', include('users.urls')),
     path('classes/', teacher_classes, name='classes'),
     path('classes/<int:class_id>/', teacher_class_view, name='class_view'),
+    path('classes/<int:class_id>/roster/', teacher_roster_upload, name='class_roster_upload'),
+    path('classes/<int:class_id>/gradebook/', teacher_gradebook_export, name='class_gradebook'),
     path('upload-material/', upload_material, name='upload_material'),
+    path('upload-material/chunked/', material_upload_start, name='material_upload_start'),
+    path('upload-material/chunked/<uuid:upload_id>/', material_upload_chunk, name='material_upload_chunk'),
+    path('upload-material/chunked/<uuid:upload_id>/complete/', material_upload_complete,
+         name='material_upload_complete'),
     path('generate-quiz/', generate_quiz, name='generate_quiz'),
     path('quiz-result/', quiz_result, name='quiz_result'),
+    path('quiz-result/<int:quiz_id>/', quiz_result, name='quiz_result_detail'),
     path('dashboard/', teacher_dashboard, name='teacher_dashboard'),
 
     path('', student_dashboard, name='student_dashboard'),
@@ -24,9 +36,16 @@ urlpatterns = [
     path('student/classes/<int:class_id>/', class_view, name='std_class_view'),
     path('student/classes/<int:class_id>/leave/', leave_class, name='std_leave_class'),
     path('student/take-quiz/<int:quiz_id>', std_take_quiz, name='std_take_quiz'),
+    path('student/take-quiz/<int:quiz_id>/autosave/', std_quiz_autosave, name='std_quiz_autosave'),
+    path('student/quiz-pending/<int:quiz_id>/', std_quiz_pending, name='std_quiz_pending'),
     path('student/quiz-result/<int:attempt_id>/', std_quiz_result, name='std_quiz_result'),
     path('student/profile/', profile, name='student_profile'),
     path('student/notifications/', notifications, name='std_notifications'),
     path('student/quizzes/', quizzes, name='std_quizzes'),
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Prometheus scrape endpoint (see eduscore.metrics).
+    path('metrics', metrics, name='metrics'),
+
+    # Uploaded files, with permission checks (see eduscore.media).
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", protected_media, name='media'),
+]
\ No newline at end of file
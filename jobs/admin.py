@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'ref', 'status', 'attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'ref')
+    ordering = ('-created_at',)
+    readonly_fields = ('created_at', 'finished_at', 'locked_by', 'locked_at')
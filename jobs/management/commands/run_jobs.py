@@ -0,0 +1,40 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.queue import Worker, run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (material processing and other post-request work)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'JOB_WORKERS', 4),
+                            help="Number of jobs run at the same time.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once no jobs are due instead of polling forever.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] <= 1 and options['burst']:
+            ran = run_pending()
+            self.stdout.write(self.style.SUCCESS(f"Ran {ran} job(s)."))
+            return
+
+        worker = Worker(concurrency=max(options['concurrency'], 1),
+                        poll_interval=options['poll_interval'])
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+        self.stdout.write(
+            f"Worker {worker.worker_id} started with {worker.concurrency} thread(s).")
+
+        def report(job):
+            job.refresh_from_db(fields=['status'])
+            self.stdout.write(f"  {job.task} #{job.pk}: {job.status}")
+
+        try:
+            worker.run(burst=options['burst'], on_job=report)
+        except KeyboardInterrupt:
+            worker.stop()
+        self.stdout.write(self.style.SUCCESS("Worker stopped."))
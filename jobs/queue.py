@@ -0,0 +1,252 @@
+"""
+Database-backed background job queue.
+
+Tasks are plain functions registered with ``@task`` in an app's ``tasks``
+module (discovered when the ``jobs`` app loads). ``enqueue`` stores a Job
+row; the ``run_jobs`` management command claims due jobs and runs them on a
+thread pool, outside the request/response cycle.
+
+Jobs are claimed with a conditional ``UPDATE`` (``WHERE status = 'queued'``)
+so several workers can poll the same table without running a job twice.
+Failures are retried with exponential backoff up to the task's
+``max_attempts``; a job left ``running`` by a crashed worker is picked up
+again once its lock is older than ``STALE_AFTER``. That reclaim counts as
+an attempt, and a job that has used them all is marked failed instead.
+
+A running task can report ``set_progress``, which also refreshes its lock
+(tasks running longer than ``STALE_AFTER`` must call it), and call
+``check_cancelled`` between steps; ``cancel`` marks a pending job cancelled, and whatever it
+returns afterwards is discarded.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import close_old_connections, connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = timedelta(minutes=30)
+MAX_BACKOFF = 60 * 60  # seconds
+
+TASKS = {}
+
+# The job being run by the current worker thread.
+_current = threading.local()
+
+
+class JobCancelled(Exception):
+    """Raised inside a task whose job was cancelled while it ran."""
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    func: object
+    max_attempts: int = 3
+    backoff: int = 30          # seconds before the first retry, doubled after each failure
+    concurrency: int = None    # per-worker cap on simultaneously running jobs of this task
+
+
+def task(name, max_attempts=3, backoff=30, concurrency=None):
+    """Register the decorated function as the background task ``name``."""
+    def decorator(func):
+        TASKS[name] = Task(name, func, max_attempts, backoff, concurrency)
+        return func
+    return decorator
+
+
+def enqueue(name, ref='', delay=0, **payload):
+    """Queue a run of task ``name`` with JSON-serializable keyword arguments."""
+    if name not in TASKS:
+        raise ValueError(f"Unknown task '{name}'.")
+    return Job.objects.create(
+        task=name,
+        payload=payload,
+        ref=ref,
+        max_attempts=TASKS[name].max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def latest_jobs(refs):
+    """Return ``{ref: Job}`` with the newest job for each of ``refs``."""
+    latest = {}
+    for job in Job.objects.filter(ref__in=list(refs)).order_by('ref', '-created_at', '-id'):
+        latest.setdefault(job.ref, job)
+    return latest
+
+
+def cancel(job_id):
+    """Cancel a queued or running job; returns False if it had already finished."""
+    return bool(Job.objects.filter(id=job_id, status__in=(Job.QUEUED, Job.RUNNING)).update(
+        status=Job.CANCELLED, finished_at=timezone.now(), locked_by=''))
+
+
+def current_job_id():
+    return getattr(_current, 'job_id', None)
+
+
+def set_progress(percent):
+    """Record the running job's progress (0-100) and renew its lock; a no-op outside a job."""
+    job_id = current_job_id()
+    if job_id is not None:
+        Job.objects.filter(id=job_id, status=Job.RUNNING).update(
+            progress=max(0, min(int(percent), 100)), locked_at=timezone.now())
+
+
+def check_cancelled():
+    """Raise JobCancelled if the running job has been cancelled."""
+    job_id = current_job_id()
+    if job_id is not None and Job.objects.filter(id=job_id, status=Job.CANCELLED).exists():
+        raise JobCancelled
+
+
+def backoff_delay(spec, attempts):
+    """Seconds to wait before retry number ``attempts``, with jitter."""
+    delay = min(spec.backoff * 2 ** (attempts - 1), MAX_BACKOFF)
+    return delay * random.uniform(0.75, 1.25)
+
+
+def stale_jobs(now):
+    return Q(status=Job.RUNNING, locked_at__lt=now - STALE_AFTER)
+
+
+def due_jobs(now):
+    return Q(status=Job.QUEUED, run_after__lte=now) | (stale_jobs(now) & Q(attempts__lt=F('max_attempts')))
+
+
+def fail_abandoned(now):
+    """Fail stale jobs whose worker died on their last attempt."""
+    return Job.objects.filter(stale_jobs(now), attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_by='',
+        last_error=f"Worker lost: no progress for {STALE_AFTER} on the last attempt.")
+
+
+def claim(worker_id, tasks=None):
+    """Lock and return the next due job, or ``None`` if there is nothing to do."""
+    now = timezone.now()
+    fail_abandoned(now)
+    candidates = Job.objects.filter(due_jobs(now))
+    if tasks is not None:
+        candidates = candidates.filter(task__in=tasks)
+
+    for job_id in candidates.order_by('run_after', 'id').values_list('id', flat=True)[:10]:
+        claimed = Job.objects.filter(due_jobs(now), id=job_id).update(
+            status=Job.RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+        # Another worker got there first; try the next candidate.
+    return None
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome."""
+    spec = TASKS.get(job.task)
+    # Only record outcomes while the job is still ours and not cancelled.
+    mine = Job.objects.filter(id=job.id, locked_by=job.locked_by, status=Job.RUNNING)
+    _current.job_id = job.id
+    try:
+        if spec is None:
+            raise LookupError(f"Unknown task '{job.task}'.")
+        result = spec.func(**job.payload)
+    except JobCancelled:
+        return False
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s failed (attempt %s/%s)", job, job.attempts, job.max_attempts)
+        if spec is not None and job.attempts < job.max_attempts:
+            retry_at = timezone.now() + timedelta(seconds=backoff_delay(spec, job.attempts))
+            mine.update(status=Job.QUEUED, run_after=retry_at, locked_by='', progress=0, last_error=error)
+        else:
+            mine.update(status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+        return False
+    finally:
+        _current.job_id = None
+
+    return bool(mine.update(
+        status=Job.DONE, result=result, progress=100, finished_at=timezone.now(), last_error=''))
+
+
+def run_pending(worker_id='inline', limit=None):
+    """Run due jobs one after another in this thread; returns how many ran."""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim(worker_id)
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+class Worker:
+    """Polls the queue and runs jobs on a pool of ``concurrency`` threads."""
+
+    def __init__(self, concurrency=4, poll_interval=1.0, worker_id=None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+
+    def allowed_tasks(self, running):
+        """Registered tasks that are below their concurrency cap."""
+        counts = {}
+        for job in running:
+            counts[job.task] = counts.get(job.task, 0) + 1
+        return [
+            name for name, spec in TASKS.items()
+            if spec.concurrency is None or counts.get(name, 0) < spec.concurrency
+        ]
+
+    def execute(self, job):
+        try:
+            run_job(job)
+        finally:
+            # Worker threads each hold their own connection.
+            connections.close_all()
+
+    def run(self, burst=False, on_job=None):
+        """Process jobs until stopped; with ``burst``, stop once the queue is empty."""
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self.stopping.is_set():
+                for future in [f for f in running if f.done()]:
+                    job = running.pop(future)
+                    if on_job:
+                        on_job(job)
+
+                claimed = False
+                while len(running) < self.concurrency:
+                    close_old_connections()
+                    job = claim(self.worker_id, self.allowed_tasks(running.values()))
+                    if job is None:
+                        break
+                    running[pool.submit(self.execute, job)] = job
+                    claimed = True
+
+                if running:
+                    wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                elif burst:
+                    break
+                elif not claimed:
+                    time.sleep(self.poll_interval)
+
+    def stop(self):
+        self.stopping.set()
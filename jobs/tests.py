@@ -0,0 +1,128 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.models import Course, Material
+from users.models import User
+from .models import Job
+from .queue import (
+    STALE_AFTER, TASKS, cancel, check_cancelled, enqueue, run_pending, set_progress, task,
+)
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.course = Course.objects.create(teacher=self.teacher, title='Biology', code='BIO001')
+
+    def test_upload_is_processed_in_background(self):
+        text = ' '.join(
+            f"Cells are the basic unit of life number {i}. Mitochondria produce energy for cells."
+            for i in range(10))
+        self.client.force_login(self.teacher)
+        with override_settings(MEDIA_ROOT=self.media, RETRIEVAL_CACHE_DIR=self.media + '/retrieval'):
+            self.client.post(reverse('upload_material'), {
+                'course': self.course.id,
+                'title': 'Cells',
+                'file': SimpleUploadedFile('cells.txt', text.encode()),
+            })
+            material = Material.objects.get()
+            self.assertEqual(material.summary, None)
+            self.assertEqual(Job.objects.get().status, Job.QUEUED)
+
+            self.assertEqual(run_pending(), 2)  # extraction, then summarization
+
+        material.refresh_from_db()
+        self.assertIn('Mitochondria', material.text)
+        self.assertTrue(material.summary)
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.DONE})
+
+        response = self.client.get(reverse('class_view', args=[self.course.id]))
+        self.assertContains(response, material.summary[:40])
+
+    def test_failures_are_retried_with_backoff(self):
+        calls = []
+
+        @task('tests.flaky', max_attempts=2, backoff=60)
+        def flaky():
+            calls.append(1)
+            raise RuntimeError("boom")
+        self.addCleanup(TASKS.pop, 'tests.flaky')
+
+        job = enqueue('tests.flaky')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=30))
+        self.assertIn('boom', job.last_error)
+
+        self.assertEqual(run_pending(), 0)  # not due yet
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, len(calls)), (Job.FAILED, 2, 2))
+
+    def test_cancelled_job_discards_its_result(self):
+        @task('tests.slow')
+        def slow():
+            set_progress(50)
+            cancel(job.id)  # as if the teacher pressed cancel mid-run
+            check_cancelled()
+            return {'never': 'stored'}
+        self.addCleanup(TASKS.pop, 'tests.slow')
+
+        job = enqueue('tests.slow')
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.result), (Job.CANCELLED, 50, None))
+        self.assertFalse(cancel(job.id))
+
+    def test_stale_jobs_are_reclaimed_within_their_attempts(self):
+        calls = []
+
+        @task('tests.crashy', max_attempts=2)
+        def crashy():
+            calls.append(1)
+            set_progress(10)
+        self.addCleanup(TASKS.pop, 'tests.crashy')
+
+        # A worker claimed the job, then died without a heartbeat.
+        abandoned = timezone.now() - STALE_AFTER - timedelta(minutes=1)
+        job = enqueue('tests.crashy')
+        Job.objects.filter(id=job.id).update(
+            status=Job.RUNNING, attempts=1, locked_by='dead', locked_at=abandoned)
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, len(calls)), (Job.DONE, 2, 1))
+
+        exhausted = enqueue('tests.crashy')
+        Job.objects.filter(id=exhausted.id).update(
+            status=Job.RUNNING, attempts=2, locked_by='dead', locked_at=abandoned)
+        self.assertEqual(run_pending(), 0)
+        exhausted.refresh_from_db()
+        self.assertEqual((exhausted.status, exhausted.attempts, len(calls)), (Job.FAILED, 2, 1))
+
+    def test_progress_renews_the_lock(self):
+        @task('tests.long')
+        def long():
+            Job.objects.filter(id=job.id).update(locked_at=timezone.now() - STALE_AFTER * 2)
+            set_progress(50)
+            stale = Job.objects.filter(id=job.id, locked_at__lt=timezone.now() - STALE_AFTER)
+            return {'stale': stale.exists()}
+        self.addCleanup(TASKS.pop, 'tests.long')
+
+        job = enqueue('tests.long')
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'stale': False})
@@ -0,0 +1,228 @@
+"""
+Item analysis (psychometrics) for quiz results.
+
+Submitted answers are loaded as a students x questions matrix of option
+codes and folded into additive sufficient statistics:
+
+* ``count_by_score[s]``            students whose total score is ``s``
+* ``correct_by_score[i, s]``       of those, how many got item ``i`` right
+* ``option_counts[i, c]``          how often option code ``c`` was chosen
+
+Difficulty, discrimination (upper/lower 27%), point-biserial correlation
+and the distractor breakdown are all derived from these arrays. Because
+they only ever add up, the state is cached per quiz version and new
+attempts are folded in incrementally instead of re-reading everything.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from django.core.cache import cache
+
+from .grading import CODE_OPTIONS, OPTION_CODES, OPTIONS
+from .models import StudentAnswer
+
+
+GROUP_FRACTION = 0.27  # Kelley's upper/lower group size
+CACHE_TIMEOUT = 60 * 60 * 24
+LOAD_CHUNK_SIZE = 10000
+
+
+@dataclass
+class AnalysisState:
+    """Additive statistics for one quiz version, up to ``last_attempt_id``."""
+    quiz_id: int
+    version: int
+    last_attempt_id: int
+    count_by_score: np.ndarray
+    correct_by_score: np.ndarray
+    option_counts: np.ndarray
+
+    @classmethod
+    def empty(cls, compiled):
+        max_score = int(round(compiled.total_marks))
+        questions = len(compiled.key)
+        return cls(
+            quiz_id=compiled.id,
+            version=compiled.version,
+            last_attempt_id=0,
+            count_by_score=np.zeros(max_score + 1, dtype=np.int64),
+            correct_by_score=np.zeros((questions, max_score + 1), dtype=np.int64),
+            option_counts=np.zeros((questions, len(CODE_OPTIONS)), dtype=np.int64),
+        )
+
+    @property
+    def students(self):
+        return int(self.count_by_score.sum())
+
+    def add(self, key, selected):
+        """Fold a ``students x questions`` matrix of option codes into the state."""
+        if not len(selected):
+            return
+        scores, correct = key.score_many(selected)
+        scores = np.rint(scores).astype(np.int64)
+
+        self.count_by_score += np.bincount(scores, minlength=len(self.count_by_score))
+        for item in range(selected.shape[1]):
+            self.correct_by_score[item] += np.bincount(
+                scores, weights=correct[:, item], minlength=self.correct_by_score.shape[1]
+            ).astype(np.int64)
+            self.option_counts[item] += np.bincount(
+                selected[:, item], minlength=len(CODE_OPTIONS))
+
+
+def load_matrix(key, quiz_id, after_attempt_id=0):
+    """
+    Read submitted answers of attempts newer than ``after_attempt_id`` as a
+    students x questions matrix. Returns ``(matrix, last_attempt_id)``.
+    """
+    rows = (
+        StudentAnswer.objects.filter(
+            attempt__quiz_id=quiz_id,
+            attempt__is_submitted=True,
+            attempt_id__gt=after_attempt_id,
+        )
+        .values_list('attempt_id', 'question_id', 'selected_option')
+        .order_by()
+        .iterator(chunk_size=LOAD_CHUNK_SIZE)
+    )
+    attempt_ids, positions, codes = [], [], []
+    for attempt_id, question_id, option in rows:
+        position = key.positions.get(question_id)
+        if position is not None:
+            attempt_ids.append(attempt_id)
+            positions.append(position)
+            codes.append(OPTION_CODES.get(option, 0))
+
+    if not attempt_ids:
+        return np.zeros((0, len(key)), dtype=np.int8), after_attempt_id
+
+    attempt_ids = np.array(attempt_ids, dtype=np.int64)
+    unique_ids, student_rows = np.unique(attempt_ids, return_inverse=True)
+    matrix = np.zeros((len(unique_ids), len(key)), dtype=np.int8)
+    matrix[student_rows, np.array(positions)] = np.array(codes, dtype=np.int8)
+    return matrix, int(unique_ids[-1])
+
+
+def cache_key(quiz_id, version):
+    return f"quiz:analysis:{quiz_id}:{version}"
+
+
+def discard_passed_state(quiz_id, version, attempt_ids):
+    """
+    Drop the cached state if it has already read past any of ``attempt_ids``.
+
+    The state only reads attempts newer than ``last_attempt_id``. Attempts
+    opened at quiz start are submitted out of id order, so one submitted
+    after a newer attempt was folded in would otherwise never be counted.
+    """
+    key = cache_key(quiz_id, version)
+    state = cache.get(key)
+    if state is not None and min(attempt_ids) <= state.last_attempt_id:
+        cache.delete(key)
+
+
+def get_analysis_state(compiled):
+    """Return up-to-date statistics for a compiled quiz, reading only new attempts."""
+    key = cache_key(compiled.id, compiled.version)
+    state = cache.get(key)
+    changed = state is None
+    if state is None:
+        state = AnalysisState.empty(compiled)
+
+    matrix, last_attempt_id = load_matrix(compiled.key, compiled.id, state.last_attempt_id)
+    if len(matrix):
+        state.add(compiled.key, matrix)
+        state.last_attempt_id = last_attempt_id
+        changed = True
+    if changed:
+        cache.set(key, state, CACHE_TIMEOUT)
+    return state
+
+
+def group_weights(counts, group_size, from_top):
+    """
+    Per-score weights (0..1) selecting ``group_size`` students from the top
+    or bottom of the score distribution, splitting ties at the boundary.
+    """
+    ordered = counts[::-1] if from_top else counts
+    before = np.concatenate(([0], np.cumsum(ordered)[:-1]))
+    taken = np.clip(group_size - before, 0, ordered)
+    weights = np.divide(taken, ordered, out=np.zeros(len(ordered)), where=ordered > 0)
+    return weights[::-1] if from_top else weights
+
+
+def item_statistics(state):
+    """
+    Compute per-item statistics. Returns ``(summary, items)`` where each item
+    is a dict with ``difficulty``, ``discrimination``, ``point_biserial`` and
+    an ``options`` breakdown.
+    """
+    counts = state.count_by_score.astype(np.float64)
+    n = counts.sum()
+    score_values = np.arange(len(counts), dtype=np.float64)
+
+    summary = {'students': int(n), 'mean': 0.0, 'median': 0.0, 'highest': 0, 'lowest': 0}
+    if not n:
+        return summary, []
+
+    mean = (counts @ score_values) / n
+    std = np.sqrt(max((counts @ score_values ** 2) / n - mean ** 2, 0.0))
+    present = np.flatnonzero(counts)
+    cumulative = np.cumsum(counts)
+    summary.update(
+        mean=float(mean),
+        median=float(np.searchsorted(cumulative, n / 2)),
+        highest=int(present[-1]),
+        lowest=int(present[0]),
+    )
+
+    correct = state.correct_by_score.astype(np.float64)
+    n_correct = correct.sum(axis=1)
+    difficulty = n_correct / n
+
+    # Discrimination index: p(upper 27%) - p(lower 27%).
+    group = max(GROUP_FRACTION * n, 1.0)
+    upper = correct @ group_weights(counts, group, from_top=True)
+    lower = correct @ group_weights(counts, group, from_top=False)
+    discrimination = (upper - lower) / group
+
+    # Point-biserial: (M1 - M0) / s * sqrt(p * q).
+    sum_correct = correct @ score_values
+    n_wrong = n - n_correct
+    mean_correct = np.divide(sum_correct, n_correct, out=np.zeros_like(n_correct), where=n_correct > 0)
+    mean_wrong = np.divide(
+        mean * n - sum_correct, n_wrong, out=np.zeros_like(n_wrong), where=n_wrong > 0)
+    valid = (n_correct > 0) & (n_wrong > 0) & (std > 0)
+    point_biserial = np.where(
+        valid,
+        (mean_correct - mean_wrong) / (std or 1.0) * np.sqrt(difficulty * (1 - difficulty)),
+        0.0,
+    )
+
+    items = []
+    for i in range(len(difficulty)):
+        option_counts = state.option_counts[i]
+        items.append({
+            'difficulty': float(difficulty[i]),
+            'discrimination': float(discrimination[i]),
+            'point_biserial': float(point_biserial[i]),
+            'options': [
+                {
+                    'option': option,
+                    'count': int(option_counts[code]),
+                    'percent': float(option_counts[code] / n * 100),
+                }
+                for code, option in enumerate(OPTIONS, start=1)
+            ],
+            'blank': int(option_counts[0]),
+        })
+    return summary, items
+
+
+def analyze_quiz(compiled):
+    """Item analysis for a compiled quiz: ``(summary, items)``, items paired with questions."""
+    summary, items = item_statistics(get_analysis_state(compiled))
+    for position, (item, question) in enumerate(zip(items, compiled.questions)):
+        item['question'] = question
+        item['correct_option'] = CODE_OPTIONS[compiled.key.correct[position]]
+    return summary, items
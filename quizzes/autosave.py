@@ -0,0 +1,223 @@
+"""
+Answer autosave for quizzes in progress.
+
+A student's QuizAttempt is opened (``is_submitted=False``) when they start
+the quiz (see ``quizzes.deadlines.start_attempt``). While they work, ``take_quiz.html`` posts each changed answer to
+``std_quiz_autosave``. Those deltas never touch the database directly:
+each answer is stored under its own key in the default cache, so
+overlapping autosave requests never overwrite each other's answers, and
+the attempt (with the questions it changed) is marked dirty in the current
+time bucket (``settings.QUIZ_AUTOSAVE_INTERVAL`` seconds long). Readers
+look the answers up by the quiz's question ids.
+
+Dirty buckets are flushed as one batched upsert of StudentAnswer rows. The
+flush runs inside an autosave request once its bucket has closed, and only
+the request that wins the bucket's ``cache.add`` lock does it, so however
+many students are writing, each cache sees one flush transaction per
+interval. A reload restores the stored answers with the cached, not yet
+flushed ones applied on top. The final submit replaces the autosaved rows
+with graded ones (see ``grading.grade_submissions``).
+
+Like the compiled-quiz fragments, this relies on the default cache being
+shared between workers (memcached/redis) when there are several of them.
+"""
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .grading import INSERT_BATCH_SIZE, OPTIONS
+from .models import Question, QuizAttempt, StudentAnswer
+
+
+logger = logging.getLogger(__name__)
+
+AUTOSAVE_TTL = 6 * 60 * 60
+# Buckets flushed per run at most; older ones have expired from the cache.
+MAX_FLUSH_BUCKETS = 100
+
+
+def interval():
+    return getattr(settings, 'QUIZ_AUTOSAVE_INTERVAL', 5)
+
+
+def bucket_at(now):
+    return int(now // interval())
+
+
+def attempt_key(quiz_id, student_id):
+    return f"autosave:attempt:{quiz_id}:{student_id}"
+
+
+def answer_key(attempt_id, question_id):
+    return f"autosave:answer:{attempt_id}:{question_id}"
+
+
+def dirty_key(bucket, slot=None):
+    return f"autosave:dirty:{bucket}" if slot is None else f"autosave:dirty:{bucket}:{slot}"
+
+
+def remember_attempt(quiz_id, student_id, attempt_id, deadline):
+    cache.set(attempt_key(quiz_id, student_id), (attempt_id, deadline), AUTOSAVE_TTL)
+
+
+def open_attempt(quiz_id, student_id):
+    """``(attempt_id, deadline)`` of the student's unsubmitted attempt, or None."""
+    attempt = cache.get(attempt_key(quiz_id, student_id))
+    if attempt is None:
+        attempt = QuizAttempt.objects.filter(
+            quiz_id=quiz_id, student_id=student_id, is_submitted=False
+        ).values_list('id', 'deadline').first()
+        if attempt is not None:
+            remember_attempt(quiz_id, student_id, *attempt)
+    return attempt
+
+
+def saved_answers(attempt_id, question_ids):
+    """``{question_id: option}`` saved so far, including unflushed changes."""
+    answers = dict(
+        StudentAnswer.objects.filter(attempt_id=attempt_id, selected_option__isnull=False)
+        .values_list('question_id', 'selected_option')
+    )
+    answers.update(cached_answers({attempt_id: question_ids})[attempt_id])
+    return {question_id: option for question_id, option in answers.items() if option}
+
+
+def cached_answers(questions):
+    """
+    ``{attempt_id: {question_id: option}}`` not flushed yet, for
+    ``{attempt_id: question_ids}``; '' is a cleared answer.
+    """
+    keys = {
+        answer_key(attempt_id, question_id): (attempt_id, question_id)
+        for attempt_id, question_ids in questions.items()
+        for question_id in question_ids
+    }
+    answers = {attempt_id: {} for attempt_id in questions}
+    for key, option in cache.get_many(list(keys)).items():
+        attempt_id, question_id = keys[key]
+        answers[attempt_id][question_id] = option
+    return answers
+
+
+def record(attempt_id, key, delta, now=None):
+    """
+    Cache ``{question_id: option}`` changes of the attempt, one key per
+    answer; an empty option clears the answer. Unknown questions and
+    options are ignored. Returns the number of changes kept.
+    """
+    changes = {
+        question_id: option or ''
+        for question_id, option in delta.items()
+        if question_id in key.positions and (not option or option in OPTIONS)
+    }
+    if not changes:
+        return 0
+    cache.set_many({
+        answer_key(attempt_id, question_id): option for question_id, option in changes.items()
+    }, AUTOSAVE_TTL)
+    mark_dirty(attempt_id, list(changes), now or time.time())
+    return len(changes)
+
+
+def mark_dirty(attempt_id, question_ids, now):
+    """Append the attempt and its changed questions to the current bucket's dirty list."""
+    bucket = bucket_at(now)
+    counter = dirty_key(bucket)
+    cache.add(counter, 0, AUTOSAVE_TTL)
+    try:
+        slot = cache.incr(counter)
+    except ValueError:
+        # The counter expired or was evicted between add() and incr().
+        cache.set(counter, 1, AUTOSAVE_TTL)
+        slot = 1
+    cache.set(dirty_key(bucket, slot), (attempt_id, question_ids), AUTOSAVE_TTL)
+
+
+def maybe_flush(now=None):
+    """
+    Flush closed buckets if no one else has. Returns the number of attempts
+    flushed, or None if this call was not the one to flush.
+
+    A bucket is flushed one interval after it closes, so a request that
+    marked it dirty just before the boundary has finished writing.
+    """
+    due = bucket_at(now or time.time()) - 2
+    if not cache.add(f"autosave:flush:{due}", 1, AUTOSAVE_TTL):
+        return None
+    last = cache.get('autosave:flushed')
+    first = due - MAX_FLUSH_BUCKETS + 1 if last is None else max(last + 1, due - MAX_FLUSH_BUCKETS + 1)
+    flushed = flush_buckets(range(first, due + 1))
+    cache.set('autosave:flushed', due, AUTOSAVE_TTL)
+    return flushed
+
+
+def flush_buckets(buckets):
+    changed, done = defaultdict(set), []
+    for bucket in buckets:
+        slots = cache.get(dirty_key(bucket)) or 0
+        if slots:
+            keys = [dirty_key(bucket, slot) for slot in range(1, slots + 1)]
+            for attempt_id, question_ids in cache.get_many(keys).values():
+                changed[attempt_id].update(question_ids)
+            done += keys + [dirty_key(bucket)]
+    if not changed:
+        return 0
+    flushed = write_answers({
+        attempt_id: answers for attempt_id, answers in cached_answers(changed).items() if answers
+    })
+    cache.delete_many(done)
+    return flushed
+
+
+def write_answers(pending):
+    """
+    Upsert ``{attempt_id: {question_id: option}}`` into StudentAnswer rows
+    in one transaction. Submitted attempts are skipped. Returns the number
+    of attempts written.
+    """
+    with transaction.atomic():
+        # Locked (where supported) so a concurrent submit waits for the upsert.
+        open_ids = set(
+            QuizAttempt.objects.select_for_update()
+            .filter(id__in=list(pending), is_submitted=False)
+            .values_list('id', flat=True)
+        )
+        answers = [
+            (attempt_id, question_id, option)
+            for attempt_id, attempt_answers in pending.items() if attempt_id in open_ids
+            for question_id, option in attempt_answers.items()
+        ]
+        # Skip questions deleted since they were answered.
+        questions = set(Question.objects.filter(
+            id__in={question_id for _, question_id, _ in answers}).values_list('id', flat=True))
+        rows = [
+            StudentAnswer(attempt_id=attempt_id, question_id=question_id,
+                          selected_option=option or None)
+            for attempt_id, question_id, option in answers if question_id in questions
+        ]
+        StudentAnswer.objects.bulk_create(
+            rows,
+            batch_size=INSERT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['attempt', 'question'],
+            update_fields=['selected_option'],
+        )
+    logger.debug("Autosaved %s answer(s) of %s attempt(s)", len(rows), len(open_ids))
+    return len(open_ids)
+
+
+def discarded_keys(quiz_id, student_id, attempt_id, question_ids):
+    return [attempt_key(quiz_id, student_id), *(answer_key(attempt_id, q) for q in question_ids)]
+
+
+def discard(quiz_id, student_id, attempt_id, question_ids):
+    """Forget the cached state of a submitted attempt."""
+    cache.delete_many(discarded_keys(quiz_id, student_id, attempt_id, question_ids))
+
+
+async def adiscard(quiz_id, student_id, attempt_id, question_ids):
+    await cache.adelete_many(discarded_keys(quiz_id, student_id, attempt_id, question_ids))
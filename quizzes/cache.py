@@ -0,0 +1,170 @@
+"""
+Compiled-quiz cache shared by quiz rendering and grading.
+
+A quiz's questions, options, marks and answer key are immutable between
+edits, so they are compiled once per ``Quiz.version`` and reused. The
+version is bumped by the signal handlers in ``quizzes.signals`` (and by
+``bump_quiz_version`` after bulk writes), which makes stale entries
+unreachable without any explicit invalidation.
+
+Two tiers are used: a bounded in-process LRU, and optionally a shared
+Django cache (``settings.QUIZ_CACHE_ALIAS``) so that workers can reuse
+each other's compiled quizzes.
+
+The rendered question block of ``student/take_quiz.html`` is cached
+separately as a template fragment keyed on the same id and version.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.template.loader import render_to_string
+
+from courses.models import Course
+from .grading import AnswerKey
+from .models import Quiz
+
+
+CachedQuestion = namedtuple(
+    'CachedQuestion', 'id text option_a option_b option_c option_d marks')
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledQuiz:
+    """Everything needed to render and grade one version of a quiz."""
+    id: int
+    version: int
+    title: str
+    description: str
+    time_limit: int
+    is_published: bool
+    course_id: int
+    course_title: str
+    teacher_name: str
+    created_by_id: int
+    questions: tuple
+    key: AnswerKey
+
+    @property
+    def question_count(self):
+        return len(self.questions)
+
+    @property
+    def total_marks(self):
+        return self.key.total_marks
+
+
+class LRUCache:
+    """A small thread-safe LRU map."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LRUCache(getattr(settings, 'QUIZ_CACHE_SIZE', 256))
+
+
+def shared_cache():
+    alias = getattr(settings, 'QUIZ_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def shared_key(quiz_id, version):
+    return f"quiz:compiled:{quiz_id}:{version}"
+
+
+def compile_quiz(quiz):
+    """Build a CompiledQuiz for the current version of ``quiz``."""
+    course_title, teacher_name = Course.objects.filter(pk=quiz.course_id).values_list(
+        'title', 'teacher__first_name').get()
+    rows = list(
+        quiz.questions.order_by('id').values_list(
+            'id', 'text', 'option_a', 'option_b', 'option_c', 'option_d',
+            'marks', 'correct_option')
+    )
+    return CompiledQuiz(
+        id=quiz.id,
+        version=quiz.version,
+        title=quiz.title,
+        description=quiz.description,
+        time_limit=quiz.time_limit,
+        is_published=quiz.is_published,
+        course_id=quiz.course_id,
+        course_title=course_title,
+        teacher_name=teacher_name,
+        created_by_id=quiz.created_by_id,
+        questions=tuple(CachedQuestion(*row[:7]) for row in rows),
+        key=AnswerKey.compile(quiz.id, [(row[0], row[7], row[6]) for row in rows]),
+    )
+
+
+def get_compiled_quiz(quiz):
+    """Return the CompiledQuiz for ``quiz``'s current version, compiling on a miss."""
+    compiled = local_cache.get(quiz.id)
+    if compiled is not None and compiled.version == quiz.version:
+        return compiled
+
+    shared = shared_cache()
+    if shared is not None:
+        compiled = shared.get(shared_key(quiz.id, quiz.version))
+
+    if compiled is None or compiled.version != quiz.version:
+        compiled = compile_quiz(quiz)
+        if shared is not None:
+            shared.set(shared_key(quiz.id, quiz.version), compiled)
+
+    local_cache.set(quiz.id, compiled)
+    return compiled
+
+
+def bump_quiz_version(*quiz_ids):
+    """Invalidate cached data for quizzes changed behind the ORM's signals."""
+    Quiz.objects.filter(pk__in=quiz_ids).update(version=F('version') + 1)
+    for quiz_id in quiz_ids:
+        local_cache.pop(quiz_id)
+
+
+QUESTION_FRAGMENT_TEMPLATE = 'student/_quiz_questions.html'
+
+
+def warm_quiz(quiz):
+    """
+    Compile ``quiz`` and render its cached question fragment ahead of time,
+    so the first wave of students at exam start is served from cache.
+    """
+    compiled = get_compiled_quiz(quiz)
+    render_to_string(QUESTION_FRAGMENT_TEMPLATE, {
+        'quiz': compiled,
+        'questions': compiled.questions,
+    })
+    return compiled
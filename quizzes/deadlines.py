@@ -0,0 +1,186 @@
+"""
+Server-side quiz time limits.
+
+``start_attempt`` opens a student's QuizAttempt with ``deadline`` set to
+its start time plus ``Quiz.time_limit`` minutes. Answers autosaved or
+submitted more than ``settings.QUIZ_SUBMIT_GRACE`` seconds after the
+deadline are not accepted: a late submit is graded on the answers saved
+before time ran out.
+
+Attempts that are never submitted are finalized by ``sweep_expired``,
+which reads them through the partial index on open attempts' deadlines,
+``batch_size`` at a time, and grades each batch with one
+``grade_submissions`` call per quiz. It runs as the
+``quizzes.sweep_deadlines`` job, queued as attempts start (at most one per
+``SWEEP_GRANULARITY`` of deadlines), and as the
+``sweep_expired_attempts`` command for cron.
+"""
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+
+from jobs.queue import enqueue
+from users.models import User
+from . import autosave
+from .cache import get_compiled_quiz
+from .exam import journaled_students, pending_key
+from .grading import grade_submissions
+from .models import Quiz, QuizAttempt, StudentAnswer
+
+
+SWEEP_BATCH_SIZE = 1000
+SWEEP_GRANULARITY = 60  # seconds of deadlines covered by one queued sweep
+SWEEP_REF = 'quiz-deadlines'
+AUTO_SUBMIT_FEEDBACK = "Auto-submitted when the time limit ran out."
+
+
+def grace():
+    return timedelta(seconds=getattr(settings, 'QUIZ_SUBMIT_GRACE', 30))
+
+
+def deadline_for(quiz, started_at):
+    """When an attempt started at ``started_at`` runs out of time; None if untimed."""
+    return started_at + timedelta(minutes=quiz.time_limit) if quiz.time_limit else None
+
+
+def is_late(deadline, now=None):
+    """Whether input arriving ``now`` is past ``deadline`` and its grace period."""
+    return deadline is not None and (now or timezone.now()) > deadline + grace()
+
+
+def seconds_left(deadline, now=None):
+    if deadline is None:
+        return None
+    return max(0, int((deadline - (now or timezone.now())).total_seconds()))
+
+
+def start_attempt(quiz, student):
+    """The student's attempt at ``quiz``, opened with its deadline on their first visit."""
+    now = timezone.now()
+    try:
+        attempt, created = QuizAttempt.objects.get_or_create(
+            quiz=quiz, student=student,
+            defaults={'started_at': now, 'deadline': deadline_for(quiz, now)})
+    except IntegrityError:
+        # Opened by a concurrent request of the same student.
+        attempt, created = QuizAttempt.objects.get(quiz=quiz, student=student), False
+    if created and attempt.deadline is not None:
+        schedule_sweep(attempt.deadline)
+    if not attempt.is_submitted:
+        autosave.remember_attempt(quiz.id, student.id, attempt.id, attempt.deadline)
+    return attempt
+
+
+def schedule_sweep(deadline):
+    """Queue a sweep for just after ``deadline``, once per SWEEP_GRANULARITY window."""
+    slot = int(deadline.timestamp() // SWEEP_GRANULARITY)
+    if cache.add(f"deadline-sweep:{slot}", 1, SWEEP_GRANULARITY * 4):
+        run_at = (slot + 1) * SWEEP_GRANULARITY + grace().total_seconds()
+        enqueue('quizzes.sweep_deadlines', ref=SWEEP_REF, delay=max(0, run_at - time.time()))
+
+
+def submission_answers(attempt_id, deadline, key, posted, now=None):
+    """
+    Answers to grade for a submit arriving ``now``: the posted ones, or, if
+    the submit is late, those saved before time ran out. Returns
+    ``(answers, late)``.
+    """
+    if attempt_id is None or not is_late(deadline, now):
+        return posted, False
+    return autosave.saved_answers(attempt_id, key.positions), True
+
+
+@dataclass
+class SweepResult:
+    attempts: int = 0
+    skipped: int = 0  # exam-mode submissions waiting in the journal
+    seconds: float = 0.0
+
+
+def saved_answers_many(attempt_ids, question_ids):
+    """``{attempt_id: {question_id: option}}`` stored or cached for the attempts."""
+    answers = defaultdict(dict)
+    rows = StudentAnswer.objects.filter(
+        attempt_id__in=attempt_ids, selected_option__isnull=False
+    ).values_list('attempt_id', 'question_id', 'selected_option')
+    for attempt_id, question_id, option in rows:
+        answers[attempt_id][question_id] = option
+    cached = autosave.cached_answers({attempt_id: question_ids for attempt_id in attempt_ids})
+    for attempt_id, changes in cached.items():
+        answers[attempt_id].update(changes)
+    return {
+        attempt_id: {question_id: option for question_id, option in answers[attempt_id].items() if option}
+        for attempt_id in attempt_ids
+    }
+
+
+def finalize(quiz, rows, result):
+    """Grade expired ``(attempt_id, student_id, deadline)`` rows of one quiz."""
+    if quiz.exam_mode:
+        # A submission journaled before the deadline is graded by the exam
+        # flusher. The cached receipts are only seen here with a shared cache.
+        pending = cache.get_many([pending_key(quiz.id, student_id) for _, student_id, _ in rows])
+        journaled = journaled_students(quiz.id)
+        waiting = [row for row in rows if row[1] in journaled or pending_key(quiz.id, row[1]) in pending]
+        result.skipped += len(waiting)
+        rows = [row for row in rows if row not in waiting]
+
+    key = get_compiled_quiz(quiz).key
+    for retry in (False, True):
+        if not rows:
+            return
+        answers = saved_answers_many([attempt_id for attempt_id, _, _ in rows], key.positions)
+        try:
+            grade_submissions(
+                quiz,
+                [(User(pk=student_id), answers[attempt_id]) for attempt_id, student_id, _ in rows],
+                key=key,
+                feedback=AUTO_SUBMIT_FEEDBACK,
+                submitted_at=[deadline for _, _, deadline in rows],
+            )
+        except IntegrityError:
+            if retry:
+                raise
+            # Some students submitted meanwhile; grade the rest.
+            still_open = set(QuizAttempt.objects.filter(
+                id__in=[attempt_id for attempt_id, _, _ in rows], is_submitted=False
+            ).values_list('id', flat=True))
+            rows = [row for row in rows if row[0] in still_open]
+            continue
+        result.attempts += len(rows)
+        for attempt_id, student_id, _ in rows:
+            autosave.discard(quiz.id, student_id, attempt_id, key.positions)
+        return
+
+
+def sweep_expired(now=None, batch_size=SWEEP_BATCH_SIZE):
+    """Finalize every open attempt whose deadline (plus grace) has passed."""
+    started = time.perf_counter()
+    cutoff = (now or timezone.now()) - grace()
+    result = SweepResult()
+    expired = QuizAttempt.objects.filter(is_submitted=False, deadline__lt=cutoff).order_by('deadline', 'id')
+    after = Q()
+    while True:
+        # Keyset pagination: skipped attempts stay open and must not be read again.
+        batch = list(expired.filter(after).values_list('id', 'quiz_id', 'student_id', 'deadline')[:batch_size])
+        if not batch:
+            break
+        by_quiz = defaultdict(list)
+        for attempt_id, quiz_id, student_id, deadline in batch:
+            by_quiz[quiz_id].append((attempt_id, student_id, deadline))
+        for quiz in Quiz.objects.filter(id__in=list(by_quiz)):
+            finalize(quiz, by_quiz[quiz.id], result)
+
+        last_id, last_deadline = batch[-1][0], batch[-1][3]
+        after = Q(deadline__gt=last_deadline) | Q(deadline=last_deadline, id__gt=last_id)
+        if len(batch) < batch_size:
+            break
+    result.seconds = time.perf_counter() - started
+    return result
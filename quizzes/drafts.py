@@ -0,0 +1,113 @@
+"""
+Store for AI-generated quizzes under review (``QuizDraft``).
+
+Drafts replace the copy of the generated quiz that used to live in the
+session, so ordinary page views no longer rewrite it. A teacher may keep
+several drafts open at once; each question is its own row, so editing one
+question is a single-row update. Every edit pushes ``expires_at`` forward
+by ``settings.AI_QUIZ_DRAFT_TTL``; ``purge_quiz_drafts`` deletes drafts
+nobody has touched for that long.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from jobs.models import Job
+
+from .models import DraftQuestion, QuizDraft
+
+
+PURGE_BATCH_SIZE = 500
+
+
+def draft_ttl():
+    return getattr(settings, 'AI_QUIZ_DRAFT_TTL', timedelta(days=3))
+
+
+def pack_question(question):
+    """Preview-format question -> compact stored form."""
+    return {
+        'q': question.get('question', ''),
+        'o': list(question.get('options', []))[:4],
+        'a': question.get('answer', ''),
+        'm': question.get('marks', 1),
+    }
+
+
+def unpack_question(data):
+    return {'question': data['q'], 'options': data['o'], 'answer': data['a'], 'marks': data['m']}
+
+
+def active_drafts(owner):
+    return QuizDraft.objects.filter(owner=owner, expires_at__gt=timezone.now())
+
+
+def create_draft(owner, course, quiz, job=None):
+    """Store a generated ``quiz`` (``{"title", "questions"}``) as a new draft."""
+    with transaction.atomic():
+        draft = QuizDraft.objects.create(
+            owner=owner, course=course, job=job, title=quiz['title'][:200],
+            expires_at=timezone.now() + draft_ttl(),
+        )
+        DraftQuestion.objects.bulk_create(
+            DraftQuestion(draft=draft, position=position, data=pack_question(question))
+            for position, question in enumerate(quiz['questions'])
+        )
+    return draft
+
+
+def draft_for_job(owner, course, job):
+    """
+    Move ``job``'s generated quiz into a new draft, or return the draft it
+    was already moved to (``None`` once that draft is saved or discarded).
+    """
+    if 'quiz' not in job.result:
+        return active_drafts(owner).filter(id=job.result.get('draft')).first()
+    try:
+        draft = create_draft(owner, course, job.result['quiz'], job=job)
+    except IntegrityError:
+        # Two tabs opened the preview at once; use the other one's draft.
+        return QuizDraft.objects.filter(job=job).first()
+    # The draft is now the only copy, so a saved draft is not revived from the job.
+    Job.objects.filter(id=job.id).update(
+        result={'course_id': course.id, 'draft': draft.id})
+    return draft
+
+
+def draft_quiz(draft):
+    """The draft in the preview format: ``{"title", "questions"}``."""
+    return {
+        'title': draft.title,
+        'questions': [
+            unpack_question(data)
+            for data in draft.questions.order_by('position').values_list('data', flat=True)
+        ],
+    }
+
+
+def touch(draft_id):
+    now = timezone.now()
+    QuizDraft.objects.filter(id=draft_id).update(updated_at=now, expires_at=now + draft_ttl())
+
+
+def update_question(draft, position, question):
+    """Replace one question of ``draft``; returns False if there is no such question."""
+    updated = DraftQuestion.objects.filter(draft=draft, position=position).update(
+        data=pack_question(question))
+    if updated:
+        touch(draft.id)
+    return bool(updated)
+
+
+def purge_expired(now=None, batch_size=PURGE_BATCH_SIZE):
+    """Delete expired drafts in batches; returns how many were removed."""
+    now = now or timezone.now()
+    removed = 0
+    while True:
+        ids = list(QuizDraft.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        DraftQuestion.objects.filter(draft_id__in=ids).delete()
+        removed += QuizDraft.objects.filter(id__in=ids).delete()[1].get(QuizDraft._meta.label, 0)
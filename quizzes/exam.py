@@ -0,0 +1,279 @@
+"""
+Write-behind submission journal for quizzes in exam mode.
+
+When a whole class submits at once, inserting each attempt from its own
+request makes every request queue for SQLite's write lock. For a quiz
+with ``exam_mode`` on, ``std_take_quiz`` only validates the submission,
+appends it as one JSON line to a local journal file (fsynced before the
+student is answered) and shows a "grading" page. ``flush`` later grades
+the journal in large ``grade_submissions`` batches.
+
+Journal files live in ``settings.EXAM_JOURNAL_DIR``. Writers append to
+``active.log`` under a shared ``flock``; the flusher renames it to a
+``segment-*.log``, takes an exclusive lock to wait out in-flight appends,
+and deletes a segment only once all of it is committed. Persistence is
+exactly-once: a replayed segment (after a crash) skips students who
+already have an attempt, relying on the ``(quiz, student)`` unique
+constraint, and duplicate submissions within the journal keep the first.
+Each host journals and flushes locally; run ``flush_exam_submissions``
+next to every web server.
+
+The deadline sweeper must not auto-submit an attempt whose submission is
+waiting here. The receipt kept in the default cache is per process unless
+that cache is shared, so ``journaled_students`` reads the journal files
+themselves.
+"""
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.models import User
+from .cache import get_compiled_quiz
+from .grading import grade_submissions
+from .models import Quiz, QuizAttempt
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = 'active.log'
+SEGMENT_GLOB = 'segment-*.log'
+FLUSH_BATCH_SIZE = 500
+PENDING_TTL = 60 * 60
+
+
+def journal_dir():
+    path = getattr(settings, 'EXAM_JOURNAL_DIR', os.path.join(settings.BASE_DIR, 'exam-journal'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def pending_key(quiz_id, student_id):
+    return f"exam:pending:{quiz_id}:{student_id}"
+
+
+def pending_receipt(quiz_id, student_id):
+    """Receipt id of a journaled, not yet graded submission (per ``cache``)."""
+    return cache.get(pending_key(quiz_id, student_id))
+
+
+async def apending_receipt(quiz_id, student_id):
+    return await cache.aget(pending_key(quiz_id, student_id))
+
+
+def journaled_students(quiz_id):
+    """Ids of students with a submission to ``quiz_id`` in this host's journal, not flushed yet."""
+    directory = journal_dir()
+    students, seen = set(), set()
+
+    def scan(paths):
+        for path in paths:
+            if path in seen:
+                continue
+            seen.add(path)
+            try:
+                with open(path, 'rb') as file:
+                    lines = file.readlines()
+            except FileNotFoundError:
+                continue  # flushed meanwhile
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn, or still being appended
+                if record.get('quiz') == quiz_id:
+                    students.add(record['student'])
+
+    def segments():
+        return sorted(glob.glob(os.path.join(directory, SEGMENT_GLOB)))
+
+    scan(segments())
+    scan([os.path.join(directory, ACTIVE)])
+    # The active file may have been rotated into a segment while it was read.
+    scan(segments())
+    return students
+
+
+def append(record):
+    """Durably append one record to the active journal file."""
+    data = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+    path = os.path.join(journal_dir(), ACTIVE)
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            try:
+                current = os.stat(path).st_ino
+            except FileNotFoundError:
+                current = None
+            if os.fstat(fd).st_ino != current:
+                continue  # rotated while we waited for the lock; append to the new file
+            os.write(fd, data)
+            if getattr(settings, 'EXAM_JOURNAL_FSYNC', True):
+                os.fdatasync(fd)
+            return
+        finally:
+            os.close(fd)
+
+
+def journal_submission(quiz, student, answers):
+    """Record a submission for write-behind grading; returns its receipt id."""
+    receipt = uuid.uuid4().hex
+    append({
+        'id': receipt,
+        'quiz': quiz.id,
+        'student': student.id,
+        'answers': {str(question_id): option for question_id, option in answers.items()},
+        'at': timezone.now().isoformat(),
+    })
+    cache.set(pending_key(quiz.id, student.id), receipt, PENDING_TTL)
+    return receipt
+
+
+def rotate():
+    """Seal the active file as a new segment; returns its path or None if empty."""
+    directory = journal_dir()
+    segment = os.path.join(directory, f"segment-{time.time_ns():020d}.log")
+    try:
+        os.rename(os.path.join(directory, ACTIVE), segment)
+    except FileNotFoundError:
+        return None
+    # Appenders that opened the file before the rename hold a shared lock.
+    fd = os.open(segment, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    finally:
+        os.close(fd)
+    return segment
+
+
+def read_segment(path):
+    records = []
+    with open(path, 'rb') as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn final line from a crash mid-append was never acknowledged.
+                logger.warning("Skipping unreadable journal line in %s", path)
+    return records
+
+
+@dataclass
+class FlushStats:
+    records: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self):
+        return self.inserted / self.seconds if self.seconds else 0.0
+
+
+def grade_quiz_records(quiz, records, stats, batch_size):
+    # First submission per student wins; later ones are duplicates.
+    by_student = {}
+    for record in sorted(records, key=lambda r: r['at']):
+        if record['student'] in by_student:
+            stats.duplicates += 1
+        else:
+            by_student[record['student']] = record
+
+    # Students deleted since they submitted cannot be graded.
+    known = set(User.objects.filter(id__in=list(by_student)).values_list('id', flat=True))
+    stats.dropped += len(by_student) - len(known)
+    key = get_compiled_quiz(quiz).key
+    students = [student_id for student_id in by_student if student_id in known]
+    for start in range(0, len(students), batch_size):
+        batch = students[start:start + batch_size]
+        for retry in (False, True):
+            done = set(QuizAttempt.objects.filter(quiz=quiz, student_id__in=batch, is_submitted=True)
+                       .values_list('student_id', flat=True))
+            todo = [by_student[student_id] for student_id in batch if student_id not in done]
+            try:
+                grade_submissions(
+                    quiz,
+                    [(User(pk=r['student']), {int(q): o for q, o in r['answers'].items()}) for r in todo],
+                    key=key,
+                    submitted_at=[parse_datetime(r['at']) for r in todo],
+                )
+            except IntegrityError:
+                if retry:
+                    raise
+                continue  # a student submitted outside the journal meanwhile; filter again
+            stats.inserted += len(todo)
+            stats.duplicates += len(batch) - len(todo)
+            for student_id in batch:
+                cache.delete(pending_key(quiz.id, student_id))
+            break
+
+
+def flush_segment(path, stats, batch_size=FLUSH_BATCH_SIZE):
+    records = read_segment(path)
+    stats.records += len(records)
+    by_quiz = defaultdict(list)
+    for record in records:
+        by_quiz[record['quiz']].append(record)
+
+    quizzes = Quiz.objects.in_bulk(list(by_quiz))
+    for quiz_id, quiz_records in by_quiz.items():
+        quiz = quizzes.get(quiz_id)
+        if quiz is None:
+            stats.dropped += len(quiz_records)  # quiz deleted since
+            continue
+        grade_quiz_records(quiz, quiz_records, stats, batch_size)
+    # Only now is every record of the segment committed.
+    os.remove(path)
+
+
+def flush(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Grade everything journaled so far. Returns FlushStats, or None if
+    another flusher holds the lock.
+    """
+    lock = os.open(os.path.join(journal_dir(), 'flusher.lock'), os.O_WRONLY | os.O_CREAT, 0o640)
+    try:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        started = time.perf_counter()
+        stats = FlushStats()
+        rotate()
+        # Older segments first: left behind by a crashed flusher, or just sealed.
+        for path in sorted(glob.glob(os.path.join(journal_dir(), SEGMENT_GLOB))):
+            flush_segment(path, stats, batch_size)
+        stats.seconds = time.perf_counter() - started
+        if stats.records:
+            logger.info(
+                "Flushed %s exam submission(s) in %.2fs (%.0f/s), %s duplicate(s), %s dropped",
+                stats.inserted, stats.seconds, stats.rate, stats.duplicates, stats.dropped)
+        return stats
+    finally:
+        os.close(lock)
+
+
+def backlog():
+    """Number of journaled submissions not flushed yet."""
+    total = 0
+    for path in glob.glob(os.path.join(journal_dir(), SEGMENT_GLOB)) + [
+            os.path.join(journal_dir(), ACTIVE)]:
+        try:
+            with open(path, 'rb') as file:
+                total += sum(1 for _ in file)
+        except FileNotFoundError:
+            pass
+    return total
@@ -0,0 +1,132 @@
+"""
+Quiz generator backends for AI quiz generation.
+
+``settings.QUIZ_GENERATOR`` names the backend class; generators run in the
+``quizzes.generate`` background task, never in a web request. Each takes a
+request dict (``course_title``, ``total_questions``, ``total_marks``,
+``difficulty`` and the ``passages`` chosen by ``quizzes.retrieval``) and
+returns ``{"title": ..., "questions": [{"question", "options", "answer",
+"marks"}, ...]}``.
+
+``LocalGenerator`` is a deterministic, offline stand-in that writes
+fill-in-the-blank questions from the passages; ``WebhookGenerator`` posts
+the request to an external service (such as an n8n workflow).
+"""
+import hashlib
+import json
+import random
+import re
+import urllib.request
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from courses.summarizers import SENTENCE_RE, STOP_WORDS
+
+
+class GeneratorError(Exception):
+    pass
+
+
+OPTION_LETTERS = 'ABCD'
+TERM_RE = re.compile(r"\b[A-Za-z][A-Za-z-]{3,}\b")
+
+# Shortest answer term considered, by difficulty.
+MIN_TERM_LENGTH = {'easy': 4, 'medium': 6, 'hard': 8}
+
+
+def split_marks(total_marks, count):
+    """Spread ``total_marks`` over ``count`` questions as evenly as possible."""
+    base, extra = divmod(max(total_marks, count), count)
+    return [base + (1 if i < extra else 0) for i in range(count)]
+
+
+def clean_quiz(data, title):
+    """Validate a generator's output into the preview format."""
+    if not isinstance(data, dict) or not isinstance(data.get('questions'), list):
+        raise GeneratorError("The generator returned no questions.")
+    questions = []
+    for item in data['questions']:
+        options = [str(option) for option in (item.get('options') or [])][:4]
+        answer = str(item.get('answer', '')).strip().upper()
+        if not item.get('question') or len(options) != 4 or answer not in OPTION_LETTERS:
+            continue
+        try:
+            marks = max(int(item.get('marks', 1)), 1)
+        except (TypeError, ValueError):
+            marks = 1
+        questions.append({
+            'question': str(item['question']), 'options': options, 'answer': answer, 'marks': marks})
+    if not questions:
+        raise GeneratorError("The generator returned no usable questions.")
+    return {'title': str(data.get('title') or title), 'questions': questions}
+
+
+class LocalGenerator:
+    """Blank out a key term of a passage sentence; distractors are other terms."""
+
+    def generate(self, spec):
+        count = max(int(spec['total_questions']), 1)
+        title = f"{spec['course_title']} – AI Generated Quiz"
+        # Seeded by the request, so the same request always gives the same quiz.
+        seed = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+        rng = random.Random(seed)
+        min_length = MIN_TERM_LENGTH.get(spec.get('difficulty'), 6)
+
+        sentences, terms = [], set()
+        for passage in spec.get('passages', []):
+            for sentence in SENTENCE_RE.split(passage['text']):
+                words = [w for w in TERM_RE.findall(sentence) if w.lower() not in STOP_WORDS]
+                terms.update(w.lower() for w in words)
+                candidates = [w for w in words if len(w) >= min_length] or words
+                if 6 <= len(sentence.split()) <= 40 and candidates:
+                    sentences.append((sentence.strip(), max(candidates, key=len)))
+
+        questions = []
+        rng.shuffle(sentences)
+        seen = set()
+        for sentence, answer in sentences:
+            if len(questions) == count:
+                break
+            pool = sorted(terms - {answer.lower()} - seen)
+            if answer.lower() in seen or len(pool) < 3:
+                continue
+            seen.add(answer.lower())
+            options = [answer.lower()] + rng.sample(pool, 3)
+            rng.shuffle(options)
+            blanked = re.sub(rf"\b{re.escape(answer)}\b", '_____', sentence, count=1)
+            questions.append({
+                'question': f"Fill in the blank: {blanked}",
+                'options': options,
+                'answer': OPTION_LETTERS[options.index(answer.lower())],
+            })
+
+        if not questions:
+            raise GeneratorError("Not enough material text to write questions from.")
+        for question, marks in zip(questions, split_marks(int(spec['total_marks']), len(questions))):
+            question['marks'] = marks
+        return {'title': title, 'questions': questions}
+
+
+class WebhookGenerator:
+    """Ask an external service (``settings.QUIZ_GENERATOR_WEBHOOK``) for the quiz."""
+
+    def __init__(self, url=None, timeout=300):
+        self.url = url or settings.QUIZ_GENERATOR_WEBHOOK
+        self.timeout = timeout
+
+    def generate(self, spec):
+        if not self.url:
+            raise GeneratorError("QUIZ_GENERATOR_WEBHOOK is not configured.")
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(spec).encode(),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+
+def get_generator():
+    backend = getattr(settings, 'QUIZ_GENERATOR', 'quizzes.generators.LocalGenerator')
+    return import_string(backend)()
@@ -0,0 +1,201 @@
+"""
+Course gradebook export.
+
+The gradebook is a student x quiz matrix of scores. Rows are produced by
+merge-joining two streams that are both ordered by student id (the
+course's enrollments and its quiz attempts), so only one student's row is
+held in memory at a time. The rows can be written out as CSV or as a
+minimal XLSX workbook, both as generators suitable for
+``StreamingHttpResponse``.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from courses.models import Enrollment
+from .models import Quiz, QuizAttempt
+
+
+CHUNK_SIZE = 2000
+
+FIXED_COLUMNS = ['Email', 'First name', 'Last name']
+TOTAL_COLUMNS = ['Total score', 'Total possible', 'Percent']
+
+
+def gradebook_rows(course, chunk_size=CHUNK_SIZE):
+    """Yield the header row, then one row per enrolled student."""
+    quizzes = list(
+        Quiz.objects.filter(course=course).order_by('created_at', 'id').values_list('id', 'title')
+    )
+    columns = {quiz_id: index for index, (quiz_id, _) in enumerate(quizzes)}
+    yield FIXED_COLUMNS + [title for _, title in quizzes] + TOTAL_COLUMNS
+
+    students = (
+        Enrollment.objects.filter(course=course)
+        .order_by('student_id')
+        .values_list('student_id', 'student__email', 'student__first_name', 'student__last_name')
+        .iterator(chunk_size=chunk_size)
+    )
+    attempts = (
+        QuizAttempt.objects.filter(quiz__course=course, is_submitted=True)
+        .order_by('student_id')
+        .values_list('student_id', 'quiz_id', 'score', 'total_marks')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    pending = next(attempts, None)
+    for student_id, email, first_name, last_name in students:
+        scores = [None] * len(quizzes)
+        score_total = possible_total = 0.0
+
+        # Skip attempts of students who have since left the course.
+        while pending is not None and pending[0] < student_id:
+            pending = next(attempts, None)
+        while pending is not None and pending[0] == student_id:
+            _, quiz_id, score, total_marks = pending
+            scores[columns[quiz_id]] = score
+            score_total += score
+            possible_total += total_marks
+            pending = next(attempts, None)
+
+        percent = round(score_total / possible_total * 100, 2) if possible_total else None
+        yield [email, first_name, last_name] + scores + [score_total, possible_total, percent]
+
+
+class Echo:
+    """File-like object that hands back whatever is written to it."""
+
+    def write(self, value):
+        return value
+
+
+# Text starting with these is run as a formula by spreadsheet applications.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value  # names and titles are user input; show them as text
+    return value
+
+
+def csv_stream(rows):
+    writer = csv.writer(Echo())
+    yield '\ufeff'  # lets Excel detect UTF-8
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+class StreamBuffer(io.RawIOBase):
+    """Unseekable sink that collects the bytes written by ``zipfile``."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+
+
+def xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(INVALID_XML_RE.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t>{text}</t></is></c>'
+
+
+def xlsx_stream(rows, sheet_name='Gradebook', flush_rows=500):
+    """
+    Yield a single-sheet XLSX workbook built from ``rows``.
+
+    Cells are written as inline strings and numbers, so no shared-strings
+    table has to be kept in memory; the zip is written to an unseekable
+    buffer that is drained every ``flush_rows`` rows.
+    """
+    buffer = StreamBuffer()
+    sheet_name = escape(re.sub(r'[\[\]:*?/\\]', '', sheet_name)[:31] or 'Gradebook')
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', WORKBOOK_XML.format(name=sheet_name))
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            for count, row in enumerate(rows, start=1):
+                cells = ''.join(xlsx_cell(value) for value in row)
+                sheet.write(f'<row>{cells}</row>'.encode())
+                if count % flush_rows == 0:
+                    yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8'),
+    'xlsx': (
+        xlsx_stream,
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    ),
+}
+
+
+def export_gradebook(course, fmt='csv'):
+    """Return ``(chunks, content_type)`` for streaming ``course``'s gradebook."""
+    writer, content_type = EXPORT_FORMATS[fmt]
+    return writer(gradebook_rows(course)), content_type
@@ -0,0 +1,304 @@
+"""
+Batch grading for quizzes.
+
+A quiz's answer key is compiled once into parallel NumPy arrays (question
+ids, correct options, marks). A submission is encoded into the same layout
+and scored with a single vectorized comparison; many submissions stack
+into a matrix and are scored together.
+"""
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from courses import stats
+from courses.enrollment import batched
+from . import ranking
+from .models import QuizAttempt, StudentAnswer
+
+
+OPTIONS = ('A', 'B', 'C', 'D')
+
+# Options are stored as small integer codes; 0 means "not answered".
+OPTION_CODES = {option: code for code, option in enumerate(OPTIONS, start=1)}
+CODE_OPTIONS = (None,) + OPTIONS
+
+INSERT_BATCH_SIZE = 500
+
+REGRADE_CHUNK_SIZE = 2000
+
+
+@dataclass(frozen=True, eq=False)
+class AnswerKey:
+    """Compiled answer key of a quiz, ordered by question id."""
+    quiz_id: int
+    question_ids: np.ndarray
+    correct: np.ndarray
+    marks: np.ndarray
+    positions: dict = field(repr=False)
+
+    @classmethod
+    def compile(cls, quiz_id, rows):
+        """Build a key from ``(question_id, correct_option, marks)`` rows."""
+        rows = sorted(rows)
+        return cls(
+            quiz_id=quiz_id,
+            question_ids=np.array([row[0] for row in rows], dtype=np.int64),
+            correct=np.array([OPTION_CODES.get(row[1], 0) for row in rows], dtype=np.int8),
+            marks=np.array([row[2] for row in rows], dtype=np.float64),
+            positions={row[0]: index for index, row in enumerate(rows)},
+        )
+
+    @classmethod
+    def for_quiz(cls, quiz):
+        rows = quiz.questions.values_list('id', 'correct_option', 'marks')
+        return cls.compile(quiz.id, rows)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    @property
+    def total_marks(self):
+        return float(self.marks.sum())
+
+    def encode(self, answers):
+        """Encode a ``{question_id: option}`` mapping as an option-code vector."""
+        selected = np.zeros(len(self), dtype=np.int8)
+        for question_id, option in answers.items():
+            position = self.positions.get(question_id)
+            if position is not None:
+                selected[position] = OPTION_CODES.get(option, 0)
+        return selected
+
+    def answers_from_post(self, data):
+        """Read the ``q<question_id>`` radio values of a submitted quiz form."""
+        answers = {}
+        for question_id in self.positions:
+            option = data.get(f"q{question_id}")
+            if option:
+                answers[question_id] = option
+        return answers
+
+    def score(self, selected):
+        """Return ``(score, is_correct)`` for one encoded submission."""
+        scores, correct = self.score_many(selected[np.newaxis, :])
+        return scores[0], correct[0]
+
+    def score_many(self, selected):
+        """
+        Score a ``submissions x questions`` matrix of option codes.
+
+        Returns a vector of scores and a boolean matrix of correct answers.
+        """
+        correct = (selected == self.correct) & (selected != 0)
+        return correct @ self.marks, correct
+
+
+def build_answers(key, attempt, selected, correct):
+    """Unsaved StudentAnswer rows for one attempt, one per question."""
+    return [
+        StudentAnswer(
+            attempt=attempt,
+            question_id=int(key.question_ids[position]),
+            selected_option=CODE_OPTIONS[selected[position]],
+            is_correct=bool(correct[position]),
+        )
+        for position in range(len(key))
+    ]
+
+
+@transaction.atomic
+def grade_submissions(quiz, submissions, key=None, feedback="Auto-evaluated.", submitted_at=None):
+    """
+    Grade ``[(student, {question_id: option}), ...]`` for ``quiz`` in one batch.
+
+    Attempts opened when the student started the quiz (see quizzes.autosave)
+    are finalized in place and their autosaved answers replaced; the other
+    attempts are inserted. Attempts and StudentAnswer rows are written with
+    bulk queries in a single transaction. Returns the saved attempts, in the
+    order of ``submissions``. ``submitted_at`` optionally gives each
+    submission's time (default: now). Raises IntegrityError if a student
+    already has a submitted attempt.
+    """
+    if not submissions:
+        return []
+    key = key or AnswerKey.for_quiz(quiz)
+    selected = np.vstack([key.encode(answers) for _, answers in submissions])
+    scores, correct = key.score_many(selected)
+
+    submitted_at = submitted_at or [timezone.now()] * len(submissions)
+    total_marks = key.total_marks
+    open_attempts = dict(
+        QuizAttempt.objects.filter(
+            quiz=quiz, is_submitted=False, student__in=[student.pk for student, _ in submissions]
+        ).values_list('student_id', 'id')
+    )
+    attempts = [
+        QuizAttempt(
+            id=open_attempts.get(student.pk),
+            quiz=quiz,
+            student=student,
+            score=float(score),
+            total_marks=total_marks,
+            feedback=feedback,
+            is_submitted=True,
+            submitted_at=when,
+        )
+        for (student, _), score, when in zip(submissions, scores, submitted_at)
+    ]
+    started = [attempt for attempt in attempts if attempt.pk]
+    new = [attempt for attempt in attempts if not attempt.pk]
+
+    if started:
+        from .analysis import discard_passed_state
+
+        started_ids = [attempt.pk for attempt in started]
+        # Claim the open attempts first, so a concurrent submit of the same
+        # attempt fails here instead of grading it twice.
+        claimed = QuizAttempt.objects.filter(id__in=started_ids, is_submitted=False).update(
+            is_submitted=True)
+        if claimed != len(started):
+            raise IntegrityError("Quiz attempt was already submitted.")
+        QuizAttempt.objects.bulk_update(
+            started, ['score', 'total_marks', 'feedback', 'submitted_at'], batch_size=INSERT_BATCH_SIZE)
+        StudentAnswer.objects.filter(attempt_id__in=started_ids).delete()
+        discard_passed_state(quiz.id, quiz.version, started_ids)
+
+    QuizAttempt.objects.bulk_create(new, batch_size=INSERT_BATCH_SIZE)
+
+    if any(attempt.pk is None for attempt in new):
+        # Backends that cannot return ids from a bulk insert.
+        ids = dict(
+            QuizAttempt.objects.filter(
+                quiz=quiz, student__in=[attempt.student_id for attempt in new]
+            ).values_list('student_id', 'id')
+        )
+        for attempt in new:
+            attempt.pk = ids[attempt.student_id]
+
+    answers = []
+    for row, attempt in enumerate(attempts):
+        answers += build_answers(key, attempt, selected[row], correct[row])
+    StudentAnswer.objects.bulk_create(answers, batch_size=INSERT_BATCH_SIZE)
+
+    # bulk_create bypasses post_save, so keep the teacher rollup and the
+    # score index in step here.
+    stats.bump_teacher(
+        quiz.created_by_id,
+        attempt_count=len(attempts),
+        score_sum=float(scores.sum()),
+    )
+    ranking.record_scores(quiz.id, added=scores)
+    return attempts
+
+
+def grade_submission(quiz, student, answers, key=None):
+    """Grade and store a single submission; returns the QuizAttempt."""
+    return grade_submissions(quiz, [(student, answers)], key=key)[0]
+
+
+@dataclass
+class RegradeResult:
+    """Summary of a regrade run."""
+    quiz_id: int
+    attempts: int = 0
+    rescored: int = 0
+    answers_changed: int = 0
+    skipped: int = 0  # attempts without stored answers, left untouched
+    seconds: float = 0.0
+
+
+def regrade_chunk(key, attempt_rows, result):
+    """
+    Regrade one chunk of ``(attempt_id, score, total_marks, is_submitted)``
+    rows, ordered by attempt id so their answers can be read as an id range.
+    """
+    index = {row[0]: i for i, row in enumerate(attempt_rows)}
+    answers = list(
+        StudentAnswer.objects.filter(
+            attempt__quiz_id=key.quiz_id,
+            attempt_id__gte=attempt_rows[0][0],
+            attempt_id__lte=attempt_rows[-1][0],
+        )
+        .values_list('id', 'attempt_id', 'question_id', 'selected_option', 'is_correct')
+    )
+    if answers:
+        answer_ids, attempt_ids, question_ids, options, was_correct = zip(*answers)
+    else:
+        answer_ids = attempt_ids = question_ids = options = was_correct = ()
+
+    rows = np.array([index[attempt_id] for attempt_id in attempt_ids], dtype=np.int64)
+    positions = np.array([key.positions.get(qid, -1) for qid in question_ids], dtype=np.int64)
+    codes = np.array([OPTION_CODES.get(option, 0) for option in options], dtype=np.int8)
+    known = positions >= 0
+
+    is_correct = np.zeros(len(answers), dtype=bool)
+    is_correct[known] = (codes[known] == key.correct[positions[known]]) & (codes[known] != 0)
+    earned = np.where(is_correct, key.marks[np.where(known, positions, 0)], 0.0)
+    scores = np.bincount(rows, weights=earned, minlength=len(attempt_rows))
+    answered = np.bincount(rows, minlength=len(attempt_rows)) > 0
+
+    changed_answers = [
+        StudentAnswer(id=answer_ids[i], is_correct=bool(is_correct[i]))
+        for i in np.flatnonzero(is_correct != np.array(was_correct, dtype=bool))
+    ]
+
+    total_marks = key.total_marks
+    changed_attempts, score_delta = [], 0.0
+    old_scores, new_scores = [], []
+    for i, (attempt_id, score, old_total, is_submitted) in enumerate(attempt_rows):
+        if not answered[i]:
+            result.skipped += 1
+            continue
+        new_score = float(scores[i])
+        if new_score != score or total_marks != old_total:
+            changed_attempts.append(
+                QuizAttempt(id=attempt_id, score=new_score, total_marks=total_marks))
+            if is_submitted:
+                score_delta += new_score - score
+                old_scores.append(score)
+                new_scores.append(new_score)
+
+    with transaction.atomic():
+        StudentAnswer.objects.bulk_update(changed_answers, ['is_correct'], batch_size=INSERT_BATCH_SIZE)
+        QuizAttempt.objects.bulk_update(
+            changed_attempts, ['score', 'total_marks'], batch_size=INSERT_BATCH_SIZE)
+        # bulk_update bypasses post_save, so keep the teacher rollup and the
+        # score index in step here.
+        stats.bump_quiz_teacher(key.quiz_id, score_sum=score_delta)
+        ranking.record_scores(key.quiz_id, added=new_scores, removed=old_scores)
+
+    result.attempts += len(attempt_rows)
+    result.rescored += len(changed_attempts)
+    result.answers_changed += len(changed_answers)
+
+
+def regrade_quiz(quiz, chunk_size=REGRADE_CHUNK_SIZE, progress=None):
+    """
+    Recompute ``StudentAnswer.is_correct`` and ``QuizAttempt.score`` for every
+    attempt of ``quiz`` against its current answer key.
+
+    Attempts are streamed with a server-side cursor and processed
+    ``chunk_size`` at a time, so memory stays bounded however many attempts
+    the quiz has. ``progress(result)`` is called after each chunk.
+    """
+    started = time.monotonic()
+    key = AnswerKey.for_quiz(quiz)
+    result = RegradeResult(quiz_id=quiz.id)
+
+    attempts = (
+        QuizAttempt.objects.filter(quiz=quiz)
+        .order_by('id')
+        .values_list('id', 'score', 'total_marks', 'is_submitted')
+        .iterator(chunk_size=chunk_size)
+    )
+    for chunk in batched(attempts, chunk_size):
+        regrade_chunk(key, chunk, result)
+        result.seconds = time.monotonic() - started
+        if progress:
+            progress(result)
+
+    result.seconds = time.monotonic() - started
+    return result
@@ -0,0 +1,257 @@
+"""
+Bulk question import for quizzes.
+
+Question banks arrive as JSON, CSV or Aiken-style text. Each parser turns
+an uploaded file into a stream of plain ``dict`` records without reading
+the whole file into memory; ``import_questions`` then validates the full
+batch and writes it with ``bulk_create`` in one transaction.
+"""
+import codecs
+import csv
+import json
+import os
+import re
+
+from django.db import transaction
+from django.db.models import Sum
+
+from search.index import index_questions
+from .cache import bump_quiz_version
+from .models import Quiz, Question
+
+
+OPTION_LETTERS = ('A', 'B', 'C', 'D')
+OPTION_FIELDS = ('option_a', 'option_b', 'option_c', 'option_d')
+
+OPTION_MAX_LENGTH = Question._meta.get_field('option_a').max_length
+
+INSERT_BATCH_SIZE = 500
+
+
+class QuestionImportError(ValueError):
+    """Raised when a batch contains invalid questions; nothing is written."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors[:5]))
+
+
+# -------------------------------
+# VALIDATION & WRITE
+# -------------------------------
+def build_question(quiz, record):
+    """Turn one import record into an unsaved Question, or raise ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError("expected a question object")
+    text = (record.get('text') or record.get('question') or '').strip()
+    if not text:
+        raise ValueError("question text is missing")
+
+    options = record.get('options')
+    if options is None:
+        options = [record.get(field) for field in OPTION_FIELDS]
+    options = [str(option or '').strip() for option in options]
+    if len(options) != 4 or not all(options):
+        raise ValueError("exactly four non-empty options are required")
+    if any(len(option) > OPTION_MAX_LENGTH for option in options):
+        raise ValueError(f"options are limited to {OPTION_MAX_LENGTH} characters")
+
+    answer = str(record.get('correct_option') or record.get('answer') or '').strip().upper()
+    if answer not in OPTION_LETTERS:
+        raise ValueError("correct option must be one of A, B, C or D")
+
+    marks = record.get('marks') or 1
+    try:
+        marks = int(marks)
+    except (TypeError, ValueError):
+        raise ValueError(f"marks must be a whole number, got '{marks}'")
+    if marks < 1:
+        raise ValueError("marks must be at least 1")
+
+    return Question(
+        quiz=quiz, text=text, correct_option=answer, marks=marks,
+        **dict(zip(OPTION_FIELDS, options))
+    )
+
+
+def recompute_total_marks(quiz):
+    """Store the sum of the quiz's question marks on ``Quiz.total_marks``."""
+    total = quiz.questions.aggregate(total=Sum('marks'))['total'] or 0
+    Quiz.objects.filter(pk=quiz.pk).update(total_marks=total)
+    quiz.total_marks = total
+    return total
+
+
+@transaction.atomic
+def import_questions(quiz, records):
+    """
+    Validate every record, then insert them all in one transaction.
+
+    If any record is invalid a ``QuestionImportError`` listing every bad
+    record is raised and nothing is written. Returns the number of
+    questions created.
+    """
+    questions, errors = [], []
+    for number, record in enumerate(records, start=1):
+        try:
+            questions.append(build_question(quiz, record))
+        except ValueError as exc:
+            errors.append(f"Question {number}: {exc}")
+
+    if errors:
+        raise QuestionImportError(errors)
+    if not questions:
+        raise QuestionImportError(["No questions found."])
+
+    Question.objects.bulk_create(questions, batch_size=INSERT_BATCH_SIZE)
+    recompute_total_marks(quiz)
+    # bulk_create bypasses the Question signals that retire cached copies
+    # and keep the search index current.
+    bump_quiz_version(quiz.pk)
+    if all(question.pk for question in questions):
+        index_questions([question.pk for question in questions])
+    else:
+        index_questions(list(quiz.questions.values_list('id', flat=True)))
+    return len(questions)
+
+
+# -------------------------------
+# PARSERS
+# -------------------------------
+def decode_lines(file):
+    return codecs.iterdecode(file, 'utf-8-sig', errors='replace')
+
+
+def parse_json(file):
+    """
+    Stream records from a JSON array, JSON Lines, or an object with a
+    ``questions`` list (the shape returned by the AI generator).
+
+    Values are decoded incrementally from the file's chunks, so only the
+    current record is held in memory for arrays and JSON Lines. A value
+    spanning several chunks is only decoded again once the buffered text
+    has doubled, which keeps a large object (one ``questions`` list) linear
+    in the file size.
+    """
+    decoder = json.JSONDecoder()
+    buffer, array_opened = '', False
+    pending, pending_size, retry_at = [], 0, 0
+
+    def drain():
+        nonlocal buffer, array_opened, retry_at
+        while True:
+            buffer = buffer.lstrip()
+            if not array_opened and buffer.startswith('['):
+                array_opened, buffer = True, buffer[1:]
+                continue
+            if buffer[:1] in (',', ']'):
+                buffer = buffer[1:]
+                continue
+            if not buffer:
+                return
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                retry_at = 2 * len(buffer)  # incomplete value, wait for more chunks
+                return
+            buffer = buffer[end:]
+            if isinstance(value, dict) and 'questions' in value:
+                yield from value['questions']
+            else:
+                yield value
+
+    for chunk in codecs.iterdecode(file.chunks(), 'utf-8-sig', errors='replace'):
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if len(buffer) + pending_size >= retry_at:
+            buffer += ''.join(pending)
+            pending, pending_size, retry_at = [], 0, 0
+            yield from drain()
+    buffer += ''.join(pending)
+    yield from drain()
+
+    if buffer.strip():
+        raise QuestionImportError(["The JSON file is malformed or truncated."])
+
+
+CSV_ALIASES = {
+    'question': 'text',
+    'a': 'option_a', 'b': 'option_b', 'c': 'option_c', 'd': 'option_d',
+    'answer': 'correct_option', 'correct': 'correct_option',
+}
+
+
+def parse_csv(file):
+    """Stream records from a CSV file with a header row."""
+    reader = csv.DictReader(decode_lines(file))
+    for row in reader:
+        yield {
+            CSV_ALIASES.get(key.strip().lower(), key.strip().lower()): value
+            for key, value in row.items() if key
+        }
+
+
+AIKEN_OPTION_RE = re.compile(r'^([A-D])[.)]\s*(.*)$')
+AIKEN_ANSWER_RE = re.compile(r'^ANSWER:\s*([A-D])\s*$', re.IGNORECASE)
+AIKEN_MARKS_RE = re.compile(r'^MARKS:\s*(\d+)\s*$', re.IGNORECASE)
+
+
+def parse_aiken(file):
+    """
+    Stream records from Aiken-format text::
+
+        What is 2 + 2?
+        A. 3
+        B. 4
+        C. 5
+        D. 22
+        ANSWER: B
+        MARKS: 2        (optional)
+
+    Questions are separated by the ANSWER line (and optionally a blank line).
+    """
+    record = None
+    for line in decode_lines(file):
+        line = line.strip()
+        if not line:
+            continue
+
+        answer = AIKEN_ANSWER_RE.match(line)
+        marks = AIKEN_MARKS_RE.match(line)
+        option = AIKEN_OPTION_RE.match(line)
+
+        if answer and record is not None:
+            record['answer'] = answer.group(1)
+        elif marks and record is not None and 'answer' in record:
+            record['marks'] = marks.group(1)
+        elif option and record is not None and 'answer' not in record:
+            record['options'].append(option.group(2))
+        else:
+            if record is not None:
+                yield record
+            record = {'text': line, 'options': []}
+    if record is not None:
+        yield record
+
+
+PARSERS = {
+    'json': parse_json,
+    'csv': parse_csv,
+    'aiken': parse_aiken,
+}
+
+EXTENSION_FORMATS = {
+    '.json': 'json', '.jsonl': 'json',
+    '.csv': 'csv',
+    '.txt': 'aiken', '.aiken': 'aiken',
+}
+
+
+def import_question_file(quiz, file, fmt=None):
+    """Parse an uploaded question bank and import it into ``quiz``."""
+    if not fmt:
+        fmt = EXTENSION_FORMATS.get(os.path.splitext(file.name)[1].lower())
+    parser = PARSERS.get(fmt)
+    if parser is None:
+        raise QuestionImportError([f"Unsupported question file format '{fmt or file.name}'."])
+    return import_questions(quiz, parser(file))
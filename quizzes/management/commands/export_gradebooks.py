@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from courses.models import Course
+from quizzes.gradebook import EXPORT_FORMATS, export_gradebook
+
+
+class Command(BaseCommand):
+    help = "Export the gradebook of every course (or the given ones) to files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', default=[],
+                            help="Course id to export (repeatable). Defaults to all courses.")
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output-dir', default='gradebooks',
+                            help="Directory the files are written to (created if missing).")
+
+    def handle(self, *args, **options):
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        fmt = options['format']
+
+        courses = Course.objects.order_by('id')
+        if options['course']:
+            courses = courses.filter(id__in=options['course'])
+
+        exported = 0
+        for course in courses.iterator():
+            path = output_dir / f"gradebook-{course.code}.{fmt}"
+            chunks, _ = export_gradebook(course, fmt)
+            with open(path, 'wb') as handle:
+                for chunk in chunks:
+                    handle.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            exported += 1
+            self.stdout.write(f"  {course.title} -> {path}")
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {exported} gradebook(s) to {output_dir}."))
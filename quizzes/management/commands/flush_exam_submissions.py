@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quizzes.exam import FLUSH_BATCH_SIZE, backlog, flush
+
+
+class Command(BaseCommand):
+    help = "Grade and store quiz submissions journaled in exam mode (see quizzes.exam)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep flushing until interrupted.")
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help="Seconds between flushes with --loop (default 1).",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=FLUSH_BATCH_SIZE,
+            help=f"Attempts graded per transaction (default {FLUSH_BATCH_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = flush(batch_size=options['batch_size'])
+            if stats is None:
+                self.stderr.write("Another flusher is running; skipping.")
+            elif stats.records or not options['loop']:
+                self.stdout.write(
+                    f"{stats.inserted} attempt(s) stored in {stats.seconds:.2f}s "
+                    f"({stats.rate:.0f}/s), {stats.duplicates} duplicate(s), "
+                    f"{stats.dropped} dropped, {backlog()} waiting"
+                )
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from quizzes.drafts import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete AI quiz drafts that have passed their expiry time."
+
+    def handle(self, *args, **options):
+        removed = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired draft(s)."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.models import Quiz
+from quizzes.ranking import rebuild_score_index
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-quiz score histograms used for ranks and percentiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int,
+                            help="Quizzes to rebuild. Defaults to all quizzes.")
+
+    def handle(self, *args, **options):
+        quiz_ids = options['quiz_ids'] or None
+        if quiz_ids:
+            missing = set(quiz_ids) - set(
+                Quiz.objects.filter(id__in=quiz_ids).values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown quiz id(s): {', '.join(map(str, sorted(missing)))}.")
+
+        written = rebuild_score_index(quiz_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt score index ({written} bucket(s))."))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.grading import REGRADE_CHUNK_SIZE, regrade_quiz
+from quizzes.models import Quiz
+
+
+class Command(BaseCommand):
+    help = "Recompute attempt scores and answer correctness after an answer-key change."
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int, help="Quiz ids to regrade.")
+        parser.add_argument('--course', type=int, help="Regrade every quiz of this course id.")
+        parser.add_argument(
+            '--chunk-size', type=int, default=REGRADE_CHUNK_SIZE,
+            help=f"Attempts processed per batch (default {REGRADE_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.none()
+        if options['quiz_ids']:
+            quizzes = Quiz.objects.filter(id__in=options['quiz_ids'])
+        if options['course']:
+            quizzes = quizzes | Quiz.objects.filter(course_id=options['course'])
+        quizzes = list(quizzes.order_by('id'))
+
+        if not quizzes:
+            raise CommandError("Give at least one existing quiz id or --course.")
+
+        for quiz in quizzes:
+            total = quiz.attempts.count()
+            self.stdout.write(f"Regrading '{quiz.title}' (#{quiz.id}): {total} attempts")
+
+            def progress(result):
+                rate = result.attempts / result.seconds if result.seconds else 0
+                self.stdout.write(
+                    f"  {result.attempts}/{total} attempts, {result.rescored} rescored "
+                    f"({rate:.0f}/s)"
+                )
+
+            result = regrade_quiz(quiz, chunk_size=options['chunk_size'], progress=progress)
+            self.stdout.write(self.style.SUCCESS(
+                f"  Done in {result.seconds:.2f}s: {result.rescored} attempts rescored, "
+                f"{result.answers_changed} answers changed, {result.skipped} skipped "
+                f"(no stored answers)."
+            ))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.seeding import SEED_DOMAIN, SEED_PASSWORD, reset_seed, seed_load, seed_users
+
+
+class Command(BaseCommand):
+    help = "Fill the database with deterministic synthetic data for load testing and benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teachers', type=int, default=50)
+        parser.add_argument('--courses-per-teacher', type=int, default=4)
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--enrollments-per-student', type=int, default=5)
+        parser.add_argument('--materials-per-course', type=int, default=5)
+        parser.add_argument('--quizzes-per-course', type=int, default=5)
+        parser.add_argument('--questions-per-quiz', type=int, default=10)
+        parser.add_argument(
+            '--attempt-rate', type=float, default=0.8,
+            help="Share of a course's students with a graded attempt at each quiz (default 0.8).",
+        )
+        parser.add_argument('--seed', type=int, default=1, help="Random seed (default 1).")
+        parser.add_argument(
+            '--reset', action='store_true',
+            help=f"Delete previously seeded data (users @{SEED_DOMAIN} and what they own) first.",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options['attempt_rate'] <= 1:
+            raise CommandError("--attempt-rate must be between 0 and 1.")
+        if options['teachers'] < 1 or options['courses_per_teacher'] < 1:
+            raise CommandError("Seed at least one teacher with one course.")
+
+        if seed_users().exists():
+            if not options['reset']:
+                raise CommandError("Seed data already exists; pass --reset to replace it.")
+            self.stdout.write(f"Deleted {reset_seed()} seeded rows.")
+
+        def progress(result):
+            rate = result.total / result.seconds if result.seconds else 0
+            self.stdout.write(f"  {result.total} rows ({rate:.0f}/s)")
+
+        try:
+            result = seed_load(
+                teachers=options['teachers'],
+                courses_per_teacher=options['courses_per_teacher'],
+                students=options['students'],
+                enrollments_per_student=options['enrollments_per_student'],
+                materials_per_course=options['materials_per_course'],
+                quizzes_per_course=options['quizzes_per_course'],
+                questions_per_quiz=options['questions_per_quiz'],
+                attempt_rate=options['attempt_rate'],
+                seed=options['seed'],
+                progress=progress if options['verbosity'] > 1 else None,
+            )
+        except NotImplementedError as exc:
+            raise CommandError(str(exc))
+
+        for model, count in result.rows.items():
+            self.stdout.write(f"  {model}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {result.total} rows in {result.seconds:.1f}s. "
+            f"Users sign in as teacher0@{SEED_DOMAIN} / student0@{SEED_DOMAIN} "
+            f"with password '{SEED_PASSWORD}'."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from quizzes.deadlines import SWEEP_BATCH_SIZE, sweep_expired
+
+
+class Command(BaseCommand):
+    help = "Submit quiz attempts whose time limit has run out, grading the answers saved so far."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=SWEEP_BATCH_SIZE,
+            help=f"Attempts read and graded per batch (default {SWEEP_BATCH_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        result = sweep_expired(batch_size=options['batch_size'])
+        rate = result.attempts / result.seconds if result.seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Submitted {result.attempts} expired attempt(s) in {result.seconds:.2f}s ({rate:.0f}/s); "
+            f"{result.skipped} waiting in the exam journal."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0005_quizdraft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='exam_mode',
+            field=models.BooleanField(default=False),
+        ),
+    ]
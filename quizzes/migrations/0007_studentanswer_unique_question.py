@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 17:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0006_quiz_exam_mode'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='studentanswer',
+            unique_together={('attempt', 'question')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0009_attempt_and_quiz_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(condition=models.Q(('is_submitted', True)), fields=['quiz', '-score'], name='ranked_attempt_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from users.models import User
 from courses.models import Course
@@ -13,12 +14,18 @@ class Quiz(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_quizzes')
     created_at = models.DateTimeField(auto_now_add=True)
     is_published = models.BooleanField(default=False)
+    exam_mode = models.BooleanField(default=False)  # journal submissions, grade in batches (quizzes.exam)
+    version = models.PositiveIntegerField(default=1)  # bumped on quiz/question changes, see quizzes.cache
 
     def __str__(self):
         return f"{self.title} ({self.course.title})"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_by', '-created_at']),
+            models.Index(fields=['course', 'created_at']),
+        ]
 
 
 class Question(models.Model):
@@ -51,6 +58,7 @@ class QuizAttempt(models.Model):
 
     started_at = models.DateTimeField(default=timezone.now)
     submitted_at = models.DateTimeField(null=True, blank=True)
+    deadline = models.DateTimeField(null=True, blank=True)  # started_at + time limit, see quizzes.deadlines
 
     score = models.FloatField(default=0)
     total_marks = models.FloatField(default=0)        # ✅ added
@@ -61,10 +69,34 @@ class QuizAttempt(models.Model):
     class Meta:
         unique_together = ('quiz', 'student')
         ordering = ['-started_at']
+        indexes = [
+            # Submitted results of a quiz, newest first, and a student's history.
+            models.Index(fields=['quiz', '-submitted_at'], condition=models.Q(is_submitted=True),
+                         name='submitted_attempt_idx'),
+            models.Index(fields=['student', '-started_at']),
+            # Best submitted attempts of a quiz, for quizzes.ranking.top_attempts.
+            models.Index(fields=['quiz', '-score'], condition=models.Q(is_submitted=True),
+                         name='ranked_attempt_idx'),
+            # Only open attempts are indexed: what the deadline sweeper scans.
+            models.Index(fields=['deadline'], condition=models.Q(is_submitted=False),
+                         name='open_attempt_deadline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.email} → {self.quiz.title}"
 
+    def delete(self, *args, **kwargs):
+        # Attempts have no delete receivers so that cascades fast-delete them;
+        # deleting one directly adjusts the aggregates it fed here.
+        from courses.stats import forget_attempts
+        from .ranking import forget_attempts as forget_scores
+
+        with transaction.atomic():
+            attempts = QuizAttempt.objects.filter(pk=self.pk)
+            forget_attempts(attempts)
+            forget_scores(attempts)
+            return super().delete(*args, **kwargs)
+
 
 class StudentAnswer(models.Model):
     attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='answers')
@@ -83,4 +115,72 @@ class StudentAnswer(models.Model):
         return f"{self.attempt.student.email} - {self.question.text[:30]}"
 
     class Meta:
+        unique_together = ('attempt', 'question')  # target of the autosave upsert
         ordering = ['question__id']
+
+
+class ScoreBucket(models.Model):
+    """
+    Histogram of submitted scores for one quiz: ``count`` attempts scored
+    exactly ``score``. Maintained by ``quizzes.ranking``; rebuild with the
+    ``rebuild_score_index`` command.
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='score_buckets')
+    score = models.FloatField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('quiz', 'score')
+        ordering = ['quiz', '-score']
+
+    def __str__(self):
+        return f"{self.quiz_id}: {self.score} x{self.count}"
+
+
+class CompactJSONEncoder(DjangoJSONEncoder):
+    """JSON without the default separator whitespace."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs['separators'] = (',', ':')
+        super().__init__(*args, **kwargs)
+
+
+class QuizDraft(models.Model):
+    """
+    An AI-generated quiz being reviewed before it is saved as a Quiz.
+
+    Questions are stored one row each so edits touch a single small row.
+    Drafts expire ``AI_QUIZ_DRAFT_TTL`` after their last edit; the
+    ``purge_quiz_drafts`` command deletes expired ones.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_drafts')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='quiz_drafts')
+    job = models.OneToOneField(
+        'jobs.Job', on_delete=models.SET_NULL, null=True, blank=True, related_name='quiz_draft')
+    title = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return f"Draft: {self.title}"
+
+
+class DraftQuestion(models.Model):
+    """
+    One question of a QuizDraft as compact JSON:
+    ``{"q": text, "o": [a, b, c, d], "a": "A".."D", "m": marks}``.
+    """
+    draft = models.ForeignKey(QuizDraft, on_delete=models.CASCADE, related_name='questions')
+    position = models.PositiveSmallIntegerField()
+    data = models.JSONField(encoder=CompactJSONEncoder)
+
+    class Meta:
+        unique_together = ('draft', 'position')
+        ordering = ['draft', 'position']
+
+    def __str__(self):
+        return f"{self.draft_id}#{self.position}"
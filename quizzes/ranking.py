@@ -0,0 +1,157 @@
+"""
+Per-quiz score index for ranks and percentiles.
+
+Each quiz keeps a histogram of its submitted scores in ``ScoreBucket``
+rows. Scores are whole marks, so a quiz has at most ``total_marks + 1``
+buckets however many students attempt it; rank, percentile, top-N and the
+score distribution are all read from that small table instead of counting
+or sorting ``QuizAttempt`` rows.
+
+The histogram is adjusted with relative ``UPDATE ... SET count = count + n``
+statements inside the writer's transaction, so concurrent submissions
+never lose an increment and a rolled-back write never leaves it out of
+step. Writers that bypass model signals (bulk grading and regrading) call
+``record_scores`` themselves.
+"""
+from collections import Counter
+from dataclasses import dataclass
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import QuizAttempt, ScoreBucket
+
+
+@dataclass(frozen=True)
+class Standing:
+    """Where one score stands among a quiz's submitted attempts."""
+    score: float
+    rank: int          # 1 + number of strictly higher scores (ties share a rank)
+    total: int
+    percentile: float  # share of attempts below, counting ties as half
+    distribution: tuple  # ((score, count), ...) highest score first
+
+    @property
+    def top_percent(self):
+        return round(self.rank / self.total * 100, 1) if self.total else 0.0
+
+
+def record_scores(quiz_id, added=(), removed=()):
+    """Add the ``added`` scores to the quiz's histogram and drop the ``removed`` ones."""
+    deltas = Counter(float(score) for score in added)
+    deltas.subtract(float(score) for score in removed)
+
+    # A fixed order keeps concurrent writers from deadlocking on bucket rows.
+    for score in sorted(deltas):
+        delta = deltas[score]
+        if not delta:
+            continue
+        buckets = ScoreBucket.objects.filter(quiz_id=quiz_id, score=score)
+        if buckets.update(count=F('count') + delta) or delta < 0:
+            continue
+        try:
+            with transaction.atomic():
+                ScoreBucket.objects.create(quiz_id=quiz_id, score=score, count=delta)
+        except IntegrityError:
+            # Another submission created the bucket first.
+            buckets.update(count=F('count') + delta)
+
+
+def forget_attempts(attempts):
+    """Drop the submitted ones of ``attempts``, about to be deleted, from their quizzes' histograms."""
+    removed = {}
+    rows = attempts.filter(is_submitted=True).values('quiz_id', 'score').annotate(count=Count('id')).order_by()
+    for row in rows:
+        removed.setdefault(row['quiz_id'], []).extend([row['score']] * row['count'])
+    for quiz_id, scores in removed.items():
+        record_scores(quiz_id, removed=scores)
+
+
+def score_distribution(quiz_id):
+    """``((score, count), ...)`` of submitted attempts, highest score first."""
+    return tuple(
+        ScoreBucket.objects.filter(quiz_id=quiz_id, count__gt=0)
+        .order_by('-score')
+        .values_list('score', 'count')
+    )
+
+
+async def ascore_distribution(quiz_id):
+    """``score_distribution`` for async views."""
+    return tuple([
+        row async for row in ScoreBucket.objects.filter(quiz_id=quiz_id, count__gt=0)
+        .order_by('-score')
+        .values_list('score', 'count')
+    ])
+
+
+def standing(quiz_id, score, distribution=None):
+    """Rank and percentile of ``score`` on ``quiz_id``."""
+    if distribution is None:
+        distribution = score_distribution(quiz_id)
+    above = tied = total = 0
+    for bucket_score, count in distribution:
+        total += count
+        if bucket_score > score:
+            above += count
+        elif bucket_score == score:
+            tied += count
+
+    below = total - above - tied
+    percentile = round((below + tied / 2) / total * 100, 1) if total else 0.0
+    return Standing(
+        score=score,
+        rank=above + 1,
+        total=total,
+        percentile=percentile,
+        distribution=distribution,
+    )
+
+
+def top_attempts(quiz_id, limit=10, distribution=None):
+    """The ``limit`` best submitted attempts, best first (ties by submission time)."""
+    if distribution is None:
+        distribution = score_distribution(quiz_id)
+    cutoff, seen = None, 0
+    for cutoff, count in distribution:
+        seen += count
+        if seen >= limit:
+            break
+    if cutoff is None or limit <= 0:
+        return []
+    # The histogram gives the lowest score that makes the cut, so the query
+    # reads only the attempts at or above it from ranked_attempt_idx.
+    return list(
+        QuizAttempt.objects.filter(quiz_id=quiz_id, is_submitted=True, score__gte=cutoff)
+        .select_related('student')
+        .order_by('-score', 'submitted_at', 'id')[:limit]
+    )
+
+
+def compute_score_index(quiz_ids=None):
+    """Return ``{quiz_id: {score: count}}`` computed from QuizAttempt rows."""
+    attempts = QuizAttempt.objects.filter(is_submitted=True)
+    if quiz_ids is not None:
+        attempts = attempts.filter(quiz_id__in=quiz_ids)
+    index = {}
+    rows = attempts.values('quiz_id', 'score').annotate(count=Count('id')).order_by()
+    for row in rows:
+        index.setdefault(row['quiz_id'], {})[row['score']] = row['count']
+    return index
+
+
+@transaction.atomic
+def rebuild_score_index(quiz_ids=None):
+    """Recompute the ScoreBucket rows; returns the number of buckets written."""
+    buckets = ScoreBucket.objects.all()
+    if quiz_ids is not None:
+        buckets = buckets.filter(quiz_id__in=quiz_ids)
+    buckets.delete()
+
+    rows = [
+        ScoreBucket(quiz_id=quiz_id, score=score, count=count)
+        for quiz_id, histogram in compute_score_index(quiz_ids).items()
+        for score, count in histogram.items()
+    ]
+    ScoreBucket.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
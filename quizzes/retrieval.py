@@ -0,0 +1,316 @@
+"""
+Passage retrieval over material text for AI quiz generation.
+
+Rather than sending whole documents to the quiz generator, each material's
+extracted text is split into overlapping passages and indexed with BM25.
+The index is a term-major sparse matrix in CSC layout (``indptr``,
+``passages``, ``tf``) plus per-term document frequencies, built with NumPy
+and saved as ``.npz`` under ``settings.RETRIEVAL_CACHE_DIR``. Files are
+named by a fingerprint of the text, so an index is only rebuilt when the
+material's text changes; loaded indexes are also kept in a small
+in-process LRU.
+
+``select_passages`` picks passages for a generation request: relevance is
+BM25 against the material's most salient terms (plus an optional topic),
+skewed towards core or specialised passages by difficulty, and
+de-duplicated with maximal marginal relevance. Everything runs offline.
+"""
+import glob
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+
+from courses.models import Material
+from courses.summarizers import STOP_WORDS
+from .cache import LRUCache
+
+
+INDEX_VERSION = 2
+PASSAGE_WORDS = 120
+PASSAGE_OVERLAP = 30
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SALIENT_TERMS = 40
+MMR_LAMBDA = 0.7
+TOPIC_WEIGHT = 0.7
+PASSAGES_PER_QUESTION = 1.5
+MAX_CONTEXT_WORDS = 3000
+
+# Weight of term specificity (mean idf) in the score, by difficulty.
+DIFFICULTY_SPECIFICITY = {'easy': -0.5, 'medium': 0.0, 'hard': 0.5}
+
+# Letters and digits of any script, joined by inner apostrophes or hyphens.
+TOKEN_RE = re.compile(r"[^\W_]+(?:['-][^\W_]+)*", re.UNICODE)
+WORD_RE = re.compile(r'\S+')
+
+loaded_indexes = LRUCache(64)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def split_passages(text, size=PASSAGE_WORDS, overlap=PASSAGE_OVERLAP):
+    """
+    Return ``(start, end)`` character spans of overlapping passages of about
+    ``size`` words, preferring to end a passage at a paragraph break.
+    """
+    words = [match.span() for match in WORD_RE.finditer(text)]
+    spans, first = [], 0
+    while first < len(words):
+        last = min(first + size, len(words))
+        if last < len(words):
+            # Pull the end back to a paragraph break in the last third, if any.
+            for i in range(last - 1, first + size * 2 // 3, -1):
+                if '\n\n' in text[words[i][1]:words[i + 1][0]]:
+                    last = i + 1
+                    break
+        spans.append((words[first][0], words[last - 1][1]))
+        if last == len(words):
+            break
+        first = max(last - overlap, first + 1)
+    return spans
+
+
+@dataclass(eq=False)
+class PassageIndex:
+    """BM25 index over the passages of one material's text."""
+    material_id: int
+    fingerprint: str
+    spans: np.ndarray      # (passages, 2) character offsets into the text
+    lengths: np.ndarray    # tokens per passage
+    terms: np.ndarray      # vocabulary, column order
+    indptr: np.ndarray     # CSC column pointers, len(terms) + 1
+    rows: np.ndarray       # passage index of each non-zero
+    tf: np.ndarray         # term frequency of each non-zero
+
+    def __post_init__(self):
+        self.columns = {term: column for column, term in enumerate(self.terms.tolist())}
+        df = np.diff(self.indptr)
+        n = len(self.lengths)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5))
+
+    @classmethod
+    def build(cls, material_id, text, fingerprint):
+        spans = split_passages(text)
+        passage_tokens = [tokenize(text[start:end]) for start, end in spans]
+        vocabulary = sorted({token for tokens in passage_tokens for token in tokens})
+        columns = {term: column for column, term in enumerate(vocabulary)}
+
+        rows, cols, counts = [], [], []
+        for row, tokens in enumerate(passage_tokens):
+            # An empty list would come back as float64 and break bincount below.
+            ids, freq = np.unique(np.array([columns[t] for t in tokens], dtype=np.int64), return_counts=True)
+            rows.append(np.full(len(ids), row, dtype=np.int32))
+            cols.append(ids)
+            counts.append(freq)
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int32)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+
+        order = np.argsort(cols, kind='stable')
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=len(vocabulary)), out=indptr[1:])
+        return cls(
+            material_id=material_id,
+            fingerprint=fingerprint,
+            spans=np.array(spans, dtype=np.int64).reshape(-1, 2),
+            lengths=np.array([len(tokens) for tokens in passage_tokens], dtype=np.int32),
+            terms=np.array(vocabulary, dtype=str),
+            indptr=indptr,
+            rows=rows[order],
+            tf=counts[order].astype(np.float32),
+        )
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=directory, suffix='.npz')
+        with os.fdopen(fd, 'wb') as handle:
+            np.savez(handle, spans=self.spans, lengths=self.lengths, terms=self.terms,
+                     indptr=self.indptr, rows=self.rows, tf=self.tf)
+        os.replace(temp, path)  # readers never see a half-written index
+
+    @classmethod
+    def load(cls, material_id, fingerprint, path):
+        with np.load(path) as data:
+            return cls(material_id, fingerprint, **{key: data[key] for key in data.files})
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def bm25(self, query_terms, weights=None):
+        """BM25 score of every passage for ``query_terms``."""
+        scores = np.zeros(len(self), dtype=np.float64)
+        if not len(self):
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.lengths.mean(), 1))
+        for i, term in enumerate(query_terms):
+            column = self.columns.get(term)
+            if column is None:
+                continue
+            start, end = self.indptr[column], self.indptr[column + 1]
+            rows, tf = self.rows[start:end], self.tf[start:end]
+            weight = self.idf[column] * (1 if weights is None else weights[i])
+            scores[rows] += weight * tf * (BM25_K1 + 1) / (tf + norm[rows])
+        return scores
+
+    def salient_terms(self, limit=SALIENT_TERMS):
+        """The material's most characteristic terms: total tf x idf."""
+        totals = np.add.reduceat(self.tf, self.indptr[:-1]) if len(self.tf) else np.zeros(0)
+        totals[np.diff(self.indptr) == 0] = 0
+        weights = totals * self.idf
+        top = np.argsort(weights)[::-1][:limit]
+        return self.terms[top].tolist(), weights[top]
+
+    def specificity(self):
+        """Mean idf of each passage's terms; higher means more specialised."""
+        sums = np.bincount(self.rows, weights=self.idf[np.repeat(
+            np.arange(len(self.terms)), np.diff(self.indptr))], minlength=len(self))
+        counts = np.bincount(self.rows, minlength=len(self))
+        return np.divide(sums, counts, out=np.zeros(len(self)), where=counts > 0)
+
+    def vectors(self, passages):
+        """L2-normalised tf-idf rows of the given passages (dense, for MMR)."""
+        mask = np.isin(self.rows, passages)
+        position = {p: i for i, p in enumerate(passages)}
+        columns = np.repeat(np.arange(len(self.terms)), np.diff(self.indptr))[mask]
+        _, local = np.unique(columns, return_inverse=True)
+        matrix = np.zeros((len(passages), local.max(initial=-1) + 1))
+        rows = np.array([position[p] for p in self.rows[mask]], dtype=np.int64)
+        matrix[rows, local] = self.tf[mask] * self.idf[columns]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def fingerprint(text):
+    digest = hashlib.sha256(text.encode('utf-8', errors='replace')).hexdigest()[:20]
+    return f"v{INDEX_VERSION}-{digest}"
+
+
+def cache_dir():
+    return getattr(settings, 'RETRIEVAL_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'retrieval'))
+
+
+def index_path(material_id, digest):
+    return os.path.join(cache_dir(), f"material-{material_id}-{digest}.npz")
+
+
+def discard_index(material_id):
+    """Remove every cached index file of a material."""
+    for path in glob.glob(os.path.join(cache_dir(), f"material-{material_id}-*.npz")):
+        os.remove(path)
+    loaded_indexes.pop(material_id)
+
+
+def get_index(material_id, text):
+    """Return the passage index for the current text, building it on a miss."""
+    digest = fingerprint(text)
+    index = loaded_indexes.get(material_id)
+    if index is not None and index.fingerprint == digest:
+        return index
+
+    path = index_path(material_id, digest)
+    if os.path.exists(path):
+        index = PassageIndex.load(material_id, digest, path)
+    else:
+        discard_index(material_id)  # the text changed; drop the stale files
+        index = PassageIndex.build(material_id, text, digest)
+        index.save(path)
+    loaded_indexes.set(material_id, index)
+    return index
+
+
+def unit(scores):
+    """Scale non-negative scores so the best is 1."""
+    top = scores.max(initial=0)
+    return scores / top if top > 0 else scores
+
+
+@dataclass
+class Passage:
+    material_id: int
+    material_title: str
+    text: str
+    score: float
+
+
+def select_passages(material_ids, question_count, difficulty='medium', topic='',
+                    max_words=MAX_CONTEXT_WORDS):
+    """
+    Pick the passages to send to the quiz generator from ``material_ids``.
+
+    Returns passages in document order per material, at most ``max_words``
+    words in total, about ``PASSAGES_PER_QUESTION`` per requested question.
+    """
+    want = max(int(np.ceil(max(question_count, 1) * PASSAGES_PER_QUESTION)), 1)
+    skew = DIFFICULTY_SPECIFICITY.get(difficulty, 0.0)
+    topic_terms = tokenize(topic)
+
+    candidates = []  # (score, material id, title, index, passage, text)
+    for material_id, title, text in (
+        Material.objects.filter(id__in=material_ids).exclude(text='').values_list('id', 'title', 'text')
+    ):
+        index = get_index(material_id, text)
+        if not len(index):
+            continue
+        terms, weights = index.salient_terms()
+        weights = weights / (weights.max() or 1)
+        scores = unit(index.bm25(terms, weights))
+        if topic_terms:
+            # An explicit topic outweighs the material's general salience.
+            scores = (1 - TOPIC_WEIGHT) * scores + TOPIC_WEIGHT * unit(index.bm25(topic_terms))
+
+        specificity = index.specificity()
+        spread = np.ptp(specificity) or 1
+        scores *= 1 + skew * (specificity - specificity.mean()) / spread
+        scores = unit(scores)  # comparable across materials
+
+        for passage in np.argsort(scores)[::-1][:want * 3]:
+            candidates.append((float(scores[passage]), material_id, title, index, int(passage), text))
+
+    chosen = maximal_marginal_relevance(candidates, want, max_words)
+    chosen.sort(key=lambda c: (c[1], c[4]))
+    return [
+        Passage(material_id, title, text[slice(*index.spans[passage])], round(score, 4))
+        for score, material_id, title, index, passage, text in chosen
+    ]
+
+
+def maximal_marginal_relevance(candidates, want, max_words):
+    """Greedy MMR: trade relevance against similarity to passages already chosen."""
+    candidates = sorted(candidates, key=lambda c: c[0], reverse=True)
+    vectors = {}
+    for material_id in {c[1] for c in candidates}:
+        group = [c for c in candidates if c[1] == material_id]
+        index = group[0][3]
+        matrix = index.vectors([c[4] for c in group])
+        for c, row in zip(group, matrix):
+            vectors[(material_id, c[4])] = row
+
+    chosen, words = [], 0
+    while candidates and len(chosen) < want:
+        def mmr(candidate):
+            vector = vectors[(candidate[1], candidate[4])]
+            redundancy = max(
+                (float(vector @ vectors[(c[1], c[4])]) for c in chosen if c[1] == candidate[1]),
+                default=0.0,
+            )
+            return MMR_LAMBDA * candidate[0] - (1 - MMR_LAMBDA) * redundancy
+
+        best = max(candidates, key=mmr)
+        candidates.remove(best)
+        start, end = best[3].spans[best[4]]
+        length = len(best[5][start:end].split())
+        if chosen and words + length > max_words:
+            continue
+        chosen.append(best)
+        words += length
+    return chosen
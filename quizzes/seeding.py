@@ -0,0 +1,286 @@
+"""
+Synthetic load data for local performance work.
+
+``seed_load`` fills the database with teachers, courses, enrollments,
+materials, quizzes, questions and graded attempts (with their answers),
+all written through ``bulk_create``. The data only depends on ``seed``
+and the sizes asked for: the same arguments give the same users, courses,
+answers and scores on every run, so benchmark numbers taken on two
+machines (or before and after a change) describe the same workload.
+
+Seeded users have ``@SEED_DOMAIN`` addresses and the password
+``SEED_PASSWORD``. ``reset_seed`` deletes them and everything they own.
+
+Bulk inserts skip the model signals, so the TeacherStats rows, the score
+histograms and the search index are rebuilt once at the end instead.
+Attempts and answers are generated a course at a time and committed with
+it, which keeps memory flat however many rows are written.
+"""
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F
+
+from courses.models import Blob, Course, Enrollment, Material
+from courses.stats import rebuild_teacher_stats
+from courses.storage import content_storage
+from search.index import rebuild_index
+from users.models import User
+from .grading import CODE_OPTIONS, INSERT_BATCH_SIZE, OPTIONS, AnswerKey, build_answers
+from .models import Question, Quiz, QuizAttempt, StudentAnswer
+from .ranking import rebuild_score_index
+
+
+SEED_DOMAIN = 'seed.eduscore.test'
+SEED_PASSWORD = 'seed-load'
+# Timestamps are laid out from a fixed date so they are reproducible too.
+SEED_EPOCH = datetime(2025, 1, 6, 8, 0, tzinfo=dt_timezone.utc)
+
+SUBJECTS = (
+    'Algebra', 'Biology', 'Chemistry', 'Economics', 'Geography', 'Geometry',
+    'History', 'Literature', 'Physics', 'Statistics', 'Computing', 'Philosophy',
+)
+WORDS = (
+    'energy', 'cell', 'equation', 'market', 'river', 'angle', 'empire', 'poem',
+    'force', 'sample', 'loop', 'argument', 'function', 'protein', 'reaction',
+    'supply', 'climate', 'triangle', 'treaty', 'novel', 'velocity', 'variance',
+    'array', 'ethics', 'graph', 'membrane', 'molecule', 'demand', 'delta',
+    'circle', 'revolution', 'metaphor', 'mass', 'median', 'compiler', 'logic',
+)
+
+
+@dataclass
+class SeedResult:
+    rows: dict = field(default_factory=dict)  # model name -> rows inserted
+    seconds: float = 0.0
+
+    @property
+    def total(self):
+        return sum(self.rows.values())
+
+    def add(self, model, count):
+        self.rows[model.__name__] = self.rows.get(model.__name__, 0) + count
+
+
+def seed_users():
+    return User.objects.filter(email__endswith=f'@{SEED_DOMAIN}')
+
+
+def reset_seed():
+    """Delete the seeded users and, by cascade, everything they own."""
+    deleted, _ = seed_users().delete()
+    return deleted
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS, size=words)).capitalize() + '.'
+
+
+def create_users(role, count, password, result):
+    users = User.objects.bulk_create(
+        (
+            User(
+                email=f'{role}{n}@{SEED_DOMAIN}',
+                first_name=role.capitalize(),
+                last_name=str(n),
+                role=role,
+                password=password,
+                date_joined=SEED_EPOCH + timedelta(minutes=n),
+            )
+            for n in range(count)
+        ),
+        batch_size=INSERT_BATCH_SIZE,
+    )
+    result.add(User, len(users))
+    return users
+
+
+def create_courses(rng, teachers, per_teacher, result):
+    courses = Course.objects.bulk_create(
+        (
+            Course(
+                teacher=teacher,
+                title=f'{SUBJECTS[(t + c) % len(SUBJECTS)]} {100 + c} (section {t})',
+                code=f'SEED{t * per_teacher + c:06d}',
+                description=sentence(rng, 12),
+                created_at=SEED_EPOCH + timedelta(hours=t * per_teacher + c),
+            )
+            for t, teacher in enumerate(teachers)
+            for c in range(per_teacher)
+        ),
+        batch_size=INSERT_BATCH_SIZE,
+    )
+    result.add(Course, len(courses))
+    return courses
+
+
+def create_enrollments(rng, courses, students, per_student, result):
+    """Enroll each student in ``per_student`` distinct courses; returns ``{course_id: [student]}``."""
+    per_student = min(per_student, len(courses))
+    rosters = {course.id: [] for course in courses}
+    enrollments = []
+    for n, student in enumerate(students):
+        for index in rng.choice(len(courses), size=per_student, replace=False):
+            course = courses[index]
+            rosters[course.id].append(student)
+            enrollments.append(Enrollment(
+                course=course, student=student, joined_on=course.created_at + timedelta(days=1, minutes=n)))
+    Enrollment.objects.bulk_create(enrollments, batch_size=INSERT_BATCH_SIZE)
+    result.add(Enrollment, len(enrollments))
+    return rosters
+
+
+def create_materials(rng, courses, per_course, result):
+    """Materials sharing one stored file, so seeding writes no per-row files."""
+    if not per_course:
+        return
+    name = content_storage.save('seed-material.txt', ContentFile(b'Seeded course material.\n'))
+    materials = Material.objects.bulk_create(
+        (
+            Material(
+                course=course,
+                title=f'{course.title.split()[0]} notes {m + 1}',
+                file=name,
+                text=' '.join(sentence(rng, 15) for _ in range(8)),
+                uploaded_at=course.created_at + timedelta(days=m + 1),
+            )
+            for course in courses
+            for m in range(per_course)
+        ),
+        batch_size=INSERT_BATCH_SIZE,
+    )
+    # bulk_create skips the signal that counts references to the blob.
+    Blob.objects.filter(name=name).update(ref_count=F('ref_count') + len(materials))
+    result.add(Material, len(materials))
+
+
+def create_quizzes(rng, course, per_course, questions_per_quiz, result):
+    """Published quizzes of ``course`` with their questions; returns ``[(quiz, key)]``."""
+    quizzes = Quiz.objects.bulk_create(
+        Quiz(
+            course=course,
+            title=f'{course.title.split()[0]} quiz {q + 1}',
+            description=sentence(rng, 10),
+            total_marks=0,
+            time_limit=int(rng.choice((10, 20, 30))),
+            created_by_id=course.teacher_id,
+            is_published=True,
+        )
+        for q in range(per_course)
+    )
+    questions = Question.objects.bulk_create(
+        (
+            Question(
+                quiz=quiz,
+                text=f'{sentence(rng, 8)[:-1]}?',
+                option_a=str(rng.choice(WORDS)),
+                option_b=str(rng.choice(WORDS)),
+                option_c=str(rng.choice(WORDS)),
+                option_d=str(rng.choice(WORDS)),
+                correct_option=str(rng.choice(OPTIONS)),
+                marks=int(rng.integers(1, 4)),
+            )
+            for quiz in quizzes
+            for _ in range(questions_per_quiz)
+        ),
+        batch_size=INSERT_BATCH_SIZE,
+    )
+    keys = {quiz.id: [] for quiz in quizzes}
+    for question in questions:
+        keys[question.quiz_id].append((question.id, question.correct_option, question.marks))
+    for quiz in quizzes:
+        quiz.total_marks = sum(marks for _, _, marks in keys[quiz.id])
+    Quiz.objects.bulk_update(quizzes, ['total_marks'])
+    result.add(Quiz, len(quizzes))
+    result.add(Question, len(questions))
+    return [(quiz, AnswerKey.compile(quiz.id, keys[quiz.id])) for quiz in quizzes]
+
+
+def create_attempts(rng, quiz, key, roster, attempt_rate, result):
+    """Graded attempts of about ``attempt_rate`` of the roster, with one answer per question."""
+    chosen = rng.random(len(roster)) < attempt_rate
+    students = [student for student, take in zip(roster, chosen) if take]
+    if not students:
+        return
+    # Each student answers right with their own probability; the rest are
+    # random options or left blank (code 0).
+    ability = rng.uniform(0.3, 0.95, size=(len(students), 1))
+    guesses = rng.integers(0, len(CODE_OPTIONS), size=(len(students), len(key)), dtype=np.int8)
+    selected = np.where(rng.random((len(students), len(key))) < ability, key.correct, guesses).astype(np.int8)
+    scores, correct = key.score_many(selected)
+
+    opened = quiz.course.created_at + timedelta(days=7)
+    started = [opened + timedelta(minutes=int(minute)) for minute in rng.integers(0, 7 * 24 * 60, len(students))]
+    took = rng.uniform(0.2, 1.0, len(students)) * quiz.time_limit
+    attempts = QuizAttempt.objects.bulk_create(
+        (
+            QuizAttempt(
+                quiz=quiz,
+                student=student,
+                started_at=started[i],
+                deadline=started[i] + timedelta(minutes=quiz.time_limit),
+                submitted_at=started[i] + timedelta(minutes=float(took[i])),
+                score=float(scores[i]),
+                total_marks=key.total_marks,
+                feedback="Auto-evaluated.",
+                is_submitted=True,
+            )
+            for i, student in enumerate(students)
+        ),
+        batch_size=INSERT_BATCH_SIZE,
+    )
+    answers = []
+    for row, attempt in enumerate(attempts):
+        answers += build_answers(key, attempt, selected[row], correct[row])
+    StudentAnswer.objects.bulk_create(answers, batch_size=INSERT_BATCH_SIZE)
+    result.add(QuizAttempt, len(attempts))
+    result.add(StudentAnswer, len(answers))
+
+
+def seed_load(teachers=50, courses_per_teacher=4, students=10000, enrollments_per_student=5,
+              materials_per_course=5, quizzes_per_course=5, questions_per_quiz=10,
+              attempt_rate=0.8, seed=1, progress=None):
+    """
+    Generate the load data set; returns a SeedResult. ``progress(result)``
+    is called after each course's quizzes and attempts are committed.
+
+    Needs a database that returns the ids of bulk-inserted rows (SQLite
+    3.35+, PostgreSQL, MariaDB 10.5+).
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        raise NotImplementedError(
+            f"{connection.vendor} does not return ids from bulk inserts.")
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    result = SeedResult()
+    # One hash for every seeded user; a fixed salt keeps the rows reproducible.
+    password = make_password(SEED_PASSWORD, salt='seedload')
+
+    with transaction.atomic():
+        teacher_users = create_users('teacher', teachers, password, result)
+        student_users = create_users('student', students, password, result)
+        courses = create_courses(rng, teacher_users, courses_per_teacher, result)
+        rosters = create_enrollments(rng, courses, student_users, enrollments_per_student, result)
+        create_materials(rng, courses, materials_per_course, result)
+
+    quiz_ids = []
+    for course in courses:
+        with transaction.atomic():
+            for quiz, key in create_quizzes(rng, course, quizzes_per_course, questions_per_quiz, result):
+                quiz.course = course
+                create_attempts(rng, quiz, key, rosters[course.id], attempt_rate, result)
+                quiz_ids.append(quiz.id)
+        if progress:
+            result.seconds = time.perf_counter() - started
+            progress(result)
+
+    rebuild_teacher_stats([teacher.id for teacher in teacher_users])
+    rebuild_score_index(quiz_ids)
+    rebuild_index()
+    result.seconds = time.perf_counter() - started
+    return result
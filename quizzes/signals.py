@@ -0,0 +1,159 @@
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from courses.models import Course, Material
+from users.models import User
+from . import ranking, retrieval
+from .cache import bump_quiz_version, local_cache, warm_quiz
+from .models import Quiz, Question, QuizAttempt
+
+
+# Every change that alters what a student sees or how answers are graded
+# bumps Quiz.version, which retires the compiled copy in quizzes.cache.
+
+# The Quiz fields copied into a CompiledQuiz.
+COMPILED_FIELDS = ('title', 'description', 'time_limit', 'is_published', 'course_id', 'created_by_id')
+
+
+def compiled_fields(quiz):
+    return {name: quiz.__dict__[name] for name in COMPILED_FIELDS if name in quiz.__dict__}
+
+
+@receiver(post_init, sender=Quiz)
+def quiz_loaded(sender, instance, **kwargs):
+    instance._compiled_fields = compiled_fields(instance)
+
+
+@receiver(pre_save, sender=Quiz)
+def quiz_saving(sender, instance, **kwargs):
+    if instance._state.adding:
+        return
+    instance._compiled_changed = compiled_fields(instance) != instance._compiled_fields
+    # Written back as an expression even when unchanged, so a stale copy of
+    # the version can't undo a bump made since the quiz was loaded.
+    instance.version = F('version') + 1 if instance._compiled_changed else F('version')
+
+
+@receiver(post_save, sender=Quiz)
+def quiz_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        instance._compiled_fields = compiled_fields(instance)
+        return
+    changed = instance._compiled_changed
+    if changed and update_fields is not None and 'version' not in update_fields:
+        bump_quiz_version(instance.pk)
+    instance.refresh_from_db(fields=['version'])
+    instance._compiled_fields = compiled_fields(instance)
+    if not changed:
+        return
+    local_cache.pop(instance.pk)
+    # Warm on publishing and on edits to a published quiz, not on every save.
+    if instance.is_published:
+        transaction.on_commit(lambda: warm_quiz(instance))
+
+
+@receiver(post_delete, sender=Quiz)
+def quiz_deleted(sender, instance, **kwargs):
+    local_cache.pop(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    bump_quiz_version(instance.quiz_id)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, origin=None, **kwargs):
+    if not (isinstance(origin, Question) or isinstance(origin, QuerySet) and origin.model is Question):
+        return  # deleted along with its quiz
+    # A bulk delete bumps each quiz once, not once per question.
+    bumped = origin.__dict__.setdefault('_bumped_quizzes', set())
+    if instance.quiz_id not in bumped:
+        bumped.add(instance.quiz_id)
+        bump_quiz_version(instance.quiz_id)
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, **kwargs):
+    # Compiled quizzes embed the course title.
+    if not created:
+        quiz_ids = list(instance.quizzes.values_list('id', flat=True))
+        if quiz_ids:
+            bump_quiz_version(*quiz_ids)
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._compiled_name = instance.__dict__.get('first_name')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # Compiled quizzes embed the teacher's first name.
+    name = instance.__dict__.get('first_name')
+    if created or name is None or name == instance._compiled_name:
+        return
+    instance._compiled_name = name
+    quiz_ids = list(Quiz.objects.filter(course__teacher=instance).values_list('id', flat=True))
+    if quiz_ids:
+        bump_quiz_version(*quiz_ids)
+
+
+# Submitted scores feed the per-quiz rank index in quizzes.ranking. A
+# deleted quiz takes its ScoreBucket rows along; a deleted student's scores
+# are removed in one query, letting their attempts fast-delete (see
+# QuizAttempt.delete for single attempts).
+
+def ranked_score(values):
+    return values['score'] if values['is_submitted'] else None
+
+
+def stored_score(attempt):
+    values = QuizAttempt.objects.filter(pk=attempt.pk).values('is_submitted', 'score').first()
+    return ranked_score(values) if values else None
+
+
+def loaded_fields(attempt):
+    values = attempt.__dict__
+    return values if 'is_submitted' in values and 'score' in values else None
+
+
+@receiver(post_init, sender=QuizAttempt)
+def attempt_loaded(sender, instance, **kwargs):
+    values = loaded_fields(instance) if instance.pk else None
+    # Without both fields loaded the old score is read from the database on save.
+    instance._ranked_score = ranked_score(values) if values else None
+    instance._ranked_score_known = values is not None or not instance.pk
+
+
+@receiver(pre_save, sender=QuizAttempt)
+def attempt_saving(sender, instance, **kwargs):
+    if not instance._ranked_score_known:
+        instance._ranked_score = stored_score(instance)
+        instance._ranked_score_known = True
+
+
+@receiver(post_save, sender=QuizAttempt)
+def attempt_saved(sender, instance, **kwargs):
+    values = loaded_fields(instance)
+    old, new = instance._ranked_score, ranked_score(values) if values else stored_score(instance)
+    if old != new:
+        ranking.record_scores(
+            instance.quiz_id,
+            added=[new] if new is not None else [],
+            removed=[old] if old is not None else [],
+        )
+        instance._ranked_score = new
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    ranking.forget_attempts(QuizAttempt.objects.filter(student=instance))
+
+
+@receiver(post_delete, sender=Material)
+def material_deleted(sender, instance, **kwargs):
+    material_id = instance.pk
+    transaction.on_commit(lambda: retrieval.discard_index(material_id))
@@ -0,0 +1,110 @@
+"""Background quiz jobs: AI quiz generation, regrading and deadline sweeps (see ``jobs.queue``)."""
+from django.conf import settings
+
+from courses.models import Course
+from jobs.models import Job
+from jobs.queue import check_cancelled, enqueue, set_progress, task
+
+from .deadlines import sweep_expired
+from .generators import clean_quiz, get_generator
+from .grading import regrade_quiz
+from .models import Quiz
+from .retrieval import select_passages
+
+
+class GenerationLimitReached(Exception):
+    pass
+
+
+def ai_quiz_ref(teacher_id):
+    return f"ai-quiz:{teacher_id}"
+
+
+def pending_generations(teacher_id):
+    return Job.objects.filter(
+        ref=ai_quiz_ref(teacher_id), status__in=(Job.QUEUED, Job.RUNNING))
+
+
+def queue_quiz_generation(teacher, course, material_ids, total_questions, total_marks, difficulty):
+    """
+    Queue an AI quiz generation for ``teacher``; raises GenerationLimitReached
+    if they already have ``AI_QUIZ_MAX_PENDING`` generations in progress.
+    """
+    limit = getattr(settings, 'AI_QUIZ_MAX_PENDING', 2)
+    if pending_generations(teacher.id).count() >= limit:
+        raise GenerationLimitReached(
+            f"You already have {limit} quizzes being generated. "
+            "Wait for one to finish or cancel it.")
+    return enqueue(
+        'quizzes.generate',
+        ref=ai_quiz_ref(teacher.id),
+        course_id=course.id,
+        material_ids=list(material_ids),
+        total_questions=total_questions,
+        total_marks=total_marks,
+        difficulty=difficulty,
+    )
+
+
+# Generators may call a slow remote model, so cap how many run at once per worker.
+@task('quizzes.generate', max_attempts=2, backoff=30,
+      concurrency=getattr(settings, 'AI_QUIZ_WORKER_CONCURRENCY', 2))
+def generate_quiz(course_id, material_ids, total_questions, total_marks, difficulty):
+    course_title = Course.objects.filter(id=course_id).values_list('title', flat=True).first()
+    if course_title is None:
+        return {'skipped': 'course deleted'}
+
+    passages = select_passages(material_ids, total_questions, difficulty)
+    set_progress(20)
+    check_cancelled()
+
+    spec = {
+        'course_title': course_title,
+        'total_questions': total_questions,
+        'total_marks': total_marks,
+        'difficulty': difficulty,
+        'passages': [{'material': p.material_title, 'text': p.text} for p in passages],
+    }
+    quiz = clean_quiz(get_generator().generate(spec), f"{course_title} – AI Generated Quiz")
+    check_cancelled()
+    return {'course_id': course_id, 'quiz': quiz}
+
+
+def regrade_ref(quiz_id):
+    return f"regrade:{quiz_id}"
+
+
+def queue_regrade(quiz):
+    """Queue a regrade of ``quiz``, unless one is already waiting to start."""
+    # A regrade that is already running may have read the old answer key, so
+    # only a queued one makes another request redundant.
+    pending = Job.objects.filter(ref=regrade_ref(quiz.id), status=Job.QUEUED).first()
+    return pending or enqueue('quizzes.regrade', ref=regrade_ref(quiz.id), quiz_id=quiz.id)
+
+
+@task('quizzes.regrade', max_attempts=3, backoff=30, concurrency=1)
+def regrade(quiz_id):
+    """Rescore every attempt of a quiz against its current answer key."""
+    quiz = Quiz.objects.filter(id=quiz_id).first()
+    if quiz is None:
+        return {'skipped': 'quiz deleted'}
+
+    total = quiz.attempts.count()
+
+    def progress(result):
+        set_progress(result.attempts * 100 // total if total else 100)
+
+    result = regrade_quiz(quiz, progress=progress)
+    return {
+        'attempts': result.attempts,
+        'rescored': result.rescored,
+        'answers_changed': result.answers_changed,
+        'seconds': round(result.seconds, 3),
+    }
+
+
+@task('quizzes.sweep_deadlines', max_attempts=3, backoff=10, concurrency=1)
+def sweep_deadlines():
+    """Finalize attempts whose time limit ran out (see quizzes.deadlines)."""
+    result = sweep_expired()
+    return {'attempts': result.attempts, 'skipped': result.skipped, 'seconds': round(result.seconds, 3)}
@@ -1,3 +1,816 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.base import File
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.models import Course, Enrollment, Material
+from jobs.models import Job
+from jobs.queue import run_pending
+from users.models import User
+from .analysis import AnalysisState, item_statistics
+from .cache import get_compiled_quiz, local_cache
+from .grading import AnswerKey, grade_submissions, regrade_quiz
+from .importers import QuestionImportError, import_question_file
+from .models import DraftQuestion, Quiz, QuizDraft, Question, QuizAttempt, StudentAnswer
+from .ranking import compute_score_index, rebuild_score_index, score_distribution, standing, top_attempts
+from . import autosave, deadlines, drafts, exam, retrieval
+
+
+class QuestionImportTests(TestCase):
+
+    def setUp(self):
+        teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=teacher, title='Algebra', code='ALG001')
+        self.quiz = Quiz.objects.create(course=course, title='Quiz', created_by=teacher)
+
+    def upload(self, name, content):
+        return SimpleUploadedFile(name, content.encode())
+
+    def test_json_array(self):
+        content = '[' + ','.join(
+            '{"question": "Q%d", "options": ["a", "b", "c", "d"], "answer": "b", "marks": 2}' % i
+            for i in range(300)
+        ) + ']'
+        created = import_question_file(self.quiz, self.upload('bank.json', content))
+
+        self.assertEqual(created, 300)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.total_marks, 600)
+
+    def test_large_json_object_is_decoded_a_few_times(self):
+        content = json.dumps({'title': 'Bank', 'questions': [
+            {'question': f'Q{i}', 'options': ['a', 'b', 'c', 'd'], 'answer': 'a'} for i in range(2000)
+        ]})
+        # Read in 1 KB chunks, as a large upload spooled to disk would be in 64 KB ones.
+        upload = File(io.BytesIO(content.encode()), name='bank.json')
+        upload.DEFAULT_CHUNK_SIZE = 1024
+        raw_decode = json.JSONDecoder.raw_decode
+        with mock.patch.object(json.JSONDecoder, 'raw_decode', autospec=True,
+                               side_effect=raw_decode) as decode:
+            created = import_question_file(self.quiz, upload)
+
+        self.assertEqual(created, 2000)
+        self.assertLess(decode.call_count, 20)  # not once per chunk
+        self.assertGreater(len(content) // 1024, 100)
+
+    def test_csv(self):
+        content = "question,a,b,c,d,answer,marks\nWhat?,1,2,3,4,C,3\nWhy?,1,2,3,4,A,\n"
+        import_question_file(self.quiz, self.upload('bank.csv', content))
+
+        self.assertEqual(
+            list(self.quiz.questions.order_by('id').values_list('correct_option', 'marks')),
+            [('C', 3), ('A', 1)])
+
+    def test_aiken(self):
+        content = "2 + 2?\nA. 3\nB. 4\nC. 5\nD. 6\nANSWER: B\nMARKS: 2\n\nCapital of France?\nA) Paris\nB) Rome\nC) Oslo\nD) Bern\nANSWER: A\n"
+        created = import_question_file(self.quiz, self.upload('bank.txt', content))
+
+        self.assertEqual(created, 2)
+        self.assertEqual(self.quiz.questions.get(text='2 + 2?').option_b, '4')
+
+    def test_invalid_batch_writes_nothing(self):
+        content = "question,a,b,c,d,answer\nOk?,1,2,3,4,A\nBad?,1,2,3,4,E\n"
+        with self.assertRaises(QuestionImportError) as ctx:
+            import_question_file(self.quiz, self.upload('bank.csv', content))
+
+        self.assertIn('Question 2', ctx.exception.errors[0])
+        self.assertFalse(self.quiz.questions.exists())
+
+
+class GradingTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=self.teacher, title='Algebra', code='ALG001')
+        self.quiz = Quiz.objects.create(course=course, title='Quiz', created_by=self.teacher)
+        self.questions = Question.objects.bulk_create([
+            Question(quiz=self.quiz, text=f'Q{i}', option_a='a', option_b='b',
+                     option_c='c', option_d='d', correct_option=answer, marks=marks)
+            for i, (answer, marks) in enumerate([('A', 1), ('B', 2), ('C', 3)])
+        ])
+        self.students = User.objects.bulk_create([
+            User(email=f'student{i}@edu.com', first_name=f'S{i}', role='student')
+            for i in range(3)
+        ])
+        local_cache.clear()
+
+    def test_grade_submissions_in_one_batch(self):
+        q1, q2, q3 = (q.id for q in self.questions)
+        attempts = grade_submissions(self.quiz, [
+            (self.students[0], {q1: 'A', q2: 'B', q3: 'C'}),
+            (self.students[1], {q1: 'B', q3: 'C'}),
+            (self.students[2], {}),
+        ])
+
+        self.assertEqual([a.score for a in attempts], [6, 3, 0])
+        self.assertTrue(all(a.total_marks == 6 and a.is_submitted for a in attempts))
+        self.assertEqual(StudentAnswer.objects.count(), 9)
+        self.assertEqual(
+            list(attempts[1].answers.values_list('selected_option', 'is_correct')),
+            [('B', False), (None, False), ('C', True)])
+
+    def test_take_quiz_persists_answers(self):
+        student = self.students[0]
+        Enrollment.objects.create(student=student, course=self.quiz.course)
+        self.client.force_login(student)
+        q1, q2, _ = (q.id for q in self.questions)
+
+        response = self.client.post(
+            reverse('std_take_quiz', args=[self.quiz.id]), {f'q{q1}': 'A', f'q{q2}': 'C'})
+
+        attempt = QuizAttempt.objects.get(student=student, quiz=self.quiz)
+        self.assertRedirects(response, reverse('std_quiz_result', args=[attempt.id]))
+        self.assertEqual(attempt.score, 1)
+        self.assertEqual(attempt.answers.filter(is_correct=True).count(), 1)
+
+    def test_regrade_after_answer_key_fix(self):
+        q1, q2, q3 = (q.id for q in self.questions)
+        attempts = grade_submissions(self.quiz, [
+            (self.students[0], {q1: 'A', q2: 'B', q3: 'D'}),
+            (self.students[1], {q1: 'B', q2: 'B', q3: 'D'}),
+        ])
+        Question.objects.filter(id=q3).update(correct_option='D')
+
+        result = regrade_quiz(self.quiz, chunk_size=1)
+
+        self.assertEqual((result.attempts, result.rescored, result.answers_changed), (2, 2, 2))
+        scores = dict(QuizAttempt.objects.values_list('id', 'score'))
+        self.assertEqual([scores[a.id] for a in attempts], [6, 5])
+        self.assertTrue(StudentAnswer.objects.get(attempt=attempts[0], question_id=q3).is_correct)
+
+    def test_regrade_view_queues_a_job(self):
+        q1, q2, q3 = (q.id for q in self.questions)
+        attempt, = grade_submissions(self.quiz, [(self.students[0], {q1: 'A', q2: 'B', q3: 'D'})])
+        Question.objects.filter(id=q3).update(correct_option='D')
+        self.client.force_login(self.teacher)
+
+        for _ in range(2):
+            response = self.client.post(reverse('quiz_regrade', args=[self.quiz.id]))
+        self.assertRedirects(response, reverse('add_questions', args=[self.quiz.id]))
+        self.assertEqual(QuizAttempt.objects.get(id=attempt.id).score, 3)
+        job = Job.objects.get(task='quizzes.regrade')
+
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result['rescored']), (Job.DONE, 1))
+        self.assertEqual(QuizAttempt.objects.get(id=attempt.id).score, 6)
+
+
+    def test_score_index_follows_grading_regrading_and_deletes(self):
+        q1, q2, q3 = (q.id for q in self.questions)
+        attempts = grade_submissions(self.quiz, [
+            (self.students[0], {q1: 'A', q2: 'B', q3: 'D'}),
+            (self.students[1], {q1: 'A', q2: 'B', q3: 'C'}),
+            (self.students[2], {q1: 'A'}),
+        ])
+        self.assertEqual(score_distribution(self.quiz.id), ((6.0, 1), (3.0, 1), (1.0, 1)))
+
+        Question.objects.filter(id=q3).update(correct_option='D')
+        regrade_quiz(self.quiz)
+        attempts[2].delete()
+
+        self.assertEqual(score_distribution(self.quiz.id), ((6.0, 1), (3.0, 1)))
+        self.assertEqual(
+            {score: count for score, count in score_distribution(self.quiz.id)},
+            compute_score_index([self.quiz.id])[self.quiz.id])
+
+        top = standing(self.quiz.id, 6.0)
+        self.assertEqual((top.rank, top.total, top.percentile), (1, 2, 75.0))
+
+        rebuild_score_index()
+        self.assertEqual(score_distribution(self.quiz.id), ((6.0, 1), (3.0, 1)))
+
+        deferred = QuizAttempt.objects.defer('score').get(id=attempts[1].id)
+        deferred.score = 4
+        deferred.save()
+        self.students[0].delete()
+        self.assertEqual(score_distribution(self.quiz.id), ((4.0, 1),))
+
+    def test_top_attempts_read_only_the_attempts_above_the_cutoff(self):
+        q1, q2, q3 = (q.id for q in self.questions)
+        attempts = grade_submissions(self.quiz, [
+            (self.students[0], {q1: 'A'}),
+            (self.students[1], {q1: 'A', q2: 'B', q3: 'C'}),
+            (self.students[2], {q3: 'C'}),
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            top = top_attempts(self.quiz.id, limit=2)
+        self.assertEqual([a.id for a in top], [attempts[1].id, attempts[2].id])
+        self.assertEqual(top[0].student.email, 'student1@edu.com')
+        self.assertEqual(len(queries), 2)  # the histogram, then the attempts from 3.0 up
+        self.assertIn('"score" >= 3.0', queries[1]['sql'])
+
+        self.assertEqual(len(top_attempts(self.quiz.id, limit=10)), 3)
+        self.assertEqual(top_attempts(self.quiz.id, limit=0), [])
+
+
+class CompiledQuizCacheTests(TestCase):
+
+    def setUp(self):
+        teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=teacher, title='Algebra', code='ALG001')
+        self.quiz = Quiz.objects.create(course=course, title='Quiz', created_by=teacher)
+        self.question = Question.objects.create(
+            quiz=self.quiz, text='Q', option_a='a', option_b='b', option_c='c',
+            option_d='d', correct_option='A', marks=2)
+        local_cache.clear()
+
+    def fresh_quiz(self):
+        return Quiz.objects.get(pk=self.quiz.pk)
+
+    def test_hit_reuses_compiled_quiz(self):
+        compiled = get_compiled_quiz(self.fresh_quiz())
+        quiz = self.fresh_quiz()
+        with self.assertNumQueries(0):
+            self.assertIs(get_compiled_quiz(quiz), compiled)
+        self.assertEqual((compiled.teacher_name, compiled.total_marks), ('Tom', 2))
+
+    def test_question_change_retires_cached_copy(self):
+        compiled = get_compiled_quiz(self.fresh_quiz())
+        self.question.correct_option = 'B'
+        self.question.save()
+
+        recompiled = get_compiled_quiz(self.fresh_quiz())
+        self.assertGreater(recompiled.version, compiled.version)
+        self.assertEqual(recompiled.key.correct.tolist(), [2])
+
+    def test_deleting_questions_bumps_each_quiz_once(self):
+        Question.objects.bulk_create([
+            Question(quiz=self.quiz, text=f'Q{n}', option_a='a', option_b='b', option_c='c',
+                     option_d='d', correct_option='A')
+            for n in range(3)
+        ])
+        version = self.fresh_quiz().version
+        self.quiz.questions.all().delete()
+        self.assertEqual(self.fresh_quiz().version, version + 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.fresh_quiz().delete()
+        self.assertFalse([q for q in queries if '"version"' in q['sql'] and 'UPDATE' in q['sql']])
+
+    def test_teacher_rename_retires_cached_copy(self):
+        get_compiled_quiz(self.fresh_quiz())
+        teacher = User.objects.get(email='teacher@edu.com')
+        teacher.save(update_fields=['last_login'])
+        teacher.first_name = 'Thomas'
+        teacher.save()
+        self.assertEqual(get_compiled_quiz(self.fresh_quiz()).teacher_name, 'Thomas')
+
+    def test_repeated_quiz_saves_keep_increasing_version(self):
+        quiz = self.fresh_quiz()
+        quiz.title = 'Renamed'
+        quiz.save()
+        quiz.time_limit = 20
+        quiz.save()
+        self.assertEqual(quiz.version, self.fresh_quiz().version)
+        self.assertEqual(get_compiled_quiz(quiz).title, 'Renamed')
+        self.assertGreaterEqual(quiz.version, 3)
+
+    def test_saves_not_changing_compiled_fields_keep_version(self):
+        quiz = self.fresh_quiz()
+        stale = self.fresh_quiz()
+        self.question.save()
+        stale.exam_mode = True
+        stale.save()
+        self.assertEqual(stale.version, quiz.version + 1)
+        self.assertEqual(self.fresh_quiz().version, quiz.version + 1)
+
+    def test_publishing_prewarms_question_fragment(self):
+        quiz = self.fresh_quiz()
+        quiz.is_published = True
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz.save()
+
+        key = make_template_fragment_key('quiz_questions', [quiz.id, quiz.version])
+        self.assertIn('name="q%d"' % self.question.id, cache.get(key))
+
+    def test_only_changes_to_a_published_quiz_rewarm_it(self):
+        quiz = self.fresh_quiz()
+        quiz.is_published = True
+        quiz.save()
+        with self.captureOnCommitCallbacks() as callbacks:
+            quiz.exam_mode = True
+            quiz.save(update_fields=['exam_mode', 'version'])
+            quiz.save()
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            quiz.title = 'Renamed'
+            quiz.save()
+        self.assertEqual(len(callbacks), 1)
+
+
+class ItemAnalysisTests(TestCase):
+
+    def test_statistics_match_direct_computation(self):
+        rng = np.random.default_rng(7)
+        key = AnswerKey.compile(1, [(i, 'ABCD'[i % 4], 1 + i % 3) for i in range(1, 9)])
+        compiled = SimpleNamespace(id=1, version=1, key=key, total_marks=key.total_marks)
+        matrix = rng.integers(0, 5, size=(400, len(key))).astype(np.int8)
+
+        full = AnalysisState.empty(compiled)
+        full.add(key, matrix)
+        incremental = AnalysisState.empty(compiled)
+        for chunk in np.array_split(matrix, 7):
+            incremental.add(key, chunk)
+        np.testing.assert_array_equal(full.correct_by_score, incremental.correct_by_score)
+
+        summary, items = item_statistics(full)
+        scores, correct = key.score_many(matrix)
+        self.assertEqual(summary['students'], 400)
+        self.assertAlmostEqual(summary['mean'], scores.mean())
+        for i, item in enumerate(items):
+            self.assertAlmostEqual(item['difficulty'], correct[:, i].mean())
+            self.assertAlmostEqual(
+                item['point_biserial'], np.corrcoef(correct[:, i], scores)[0, 1])
+            self.assertEqual(item['options'][1]['count'], int((matrix[:, i] == 2).sum()))
+            self.assertTrue(-1 <= item['discrimination'] <= 1)
+
+
+class PassageRetrievalTests(TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        settings = override_settings(RETRIEVAL_CACHE_DIR=cache_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(retrieval.loaded_indexes.clear)
+        self.cache_dir = cache_dir
+
+        teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.course = Course.objects.create(teacher=teacher, title='Biology', code='BIO101')
+        topics = [
+            'Mitochondria produce energy for the cell through respiration and ATP synthesis.',
+            'Photosynthesis in chloroplasts turns light, water and carbon dioxide into glucose.',
+            'Ribosomes translate messenger RNA into proteins using transfer RNA anticodons.',
+        ]
+        filler = 'The weather today was mild and the students walked to the library. '
+        self.text = '\n\n'.join(topic * 8 + ' ' + filler * 12 for topic in topics)
+        self.material = Material.objects.create(
+            course=self.course, title='Cells', file='materials/cells.txt', text=self.text)
+
+    def test_passages_overlap_and_cover_the_text(self):
+        spans = retrieval.split_passages(' '.join(f'w{i}' for i in range(500)), size=100, overlap=20)
+        self.assertEqual(spans[0][0], 0)
+        self.assertTrue(all(b[0] < a[1] for a, b in zip(spans, spans[1:])))
+        self.assertTrue(spans[-1][1] > 0)
+
+    def test_index_is_cached_on_disk_and_rebuilt_when_text_changes(self):
+        first = retrieval.get_index(self.material.id, self.text)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        retrieval.loaded_indexes.clear()
+        with mock.patch.object(retrieval.PassageIndex, 'build') as build:
+            loaded = retrieval.get_index(self.material.id, self.text)
+        build.assert_not_called()
+        np.testing.assert_array_equal(loaded.tf, first.tf)
+        np.testing.assert_array_equal(loaded.bm25(['ribosomes']), first.bm25(['ribosomes']))
+
+        changed = retrieval.get_index(self.material.id, self.text + ' Lysosomes digest waste.')
+        self.assertNotEqual(changed.fingerprint, first.fingerprint)
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(
+            retrieval.index_path(self.material.id, changed.fingerprint))])
+
+    def test_selection_prefers_distinct_relevant_passages(self):
+        passages = retrieval.select_passages([self.material.id], question_count=2, max_words=400)
+        self.assertTrue(passages)
+        self.assertLessEqual(sum(len(p.text.split()) for p in passages), 400)
+        self.assertTrue(all('weather' not in p.text[:40] for p in passages))
+
+        topical = retrieval.select_passages([self.material.id], 1, topic='photosynthesis glucose')
+        self.assertIn('Photosynthesis', topical[0].text)
+        self.assertEqual(retrieval.select_passages([], 5), [])
+
+    def test_passages_without_tokens_are_indexed(self):
+        text = 'Glucose feeds the cell.\n\n' + '+-----+-----+\n| --- | ... |\n' * 60
+        index = retrieval.get_index(self.material.id, text)
+        self.assertEqual(index.lengths[-1], 0)
+        self.assertTrue(index.bm25(['glucose'])[0] > 0)
+
+    def test_non_latin_material_is_indexed(self):
+        text = ' '.join(['Фотосинтез превращает свет в энергию клетки.'] * 60)
+        self.assertEqual(retrieval.tokenize('Клетки, клетки!'), ['клетки', 'клетки'])
+        Material.objects.filter(id=self.material.id).update(text=text)
+
+        passages = retrieval.select_passages([self.material.id], 1, topic='фотосинтез')
+        self.assertIn('Фотосинтез', passages[0].text)
+
+
+class AIQuizGenerationTests(TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        settings = override_settings(RETRIEVAL_CACHE_DIR=cache_dir, AI_QUIZ_MAX_PENDING=1)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(retrieval.loaded_indexes.clear)
+
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.course = Course.objects.create(teacher=self.teacher, title='Biology', code='BIO101')
+        text = ' '.join([
+            'Mitochondria produce energy for the cell through cellular respiration.',
+            'Chloroplasts capture sunlight and carry out photosynthesis in plants.',
+            'Ribosomes assemble proteins by translating messenger RNA sequences.',
+            'The nucleus stores genetic information inside chromosomes made of DNA.',
+            'Lysosomes contain digestive enzymes that break down cellular waste.',
+        ] * 3)
+        self.material = Material.objects.create(
+            course=self.course, title='Cells', file='materials/cells.txt', text=text)
+        self.client.force_login(self.teacher)
+
+    def generate(self):
+        return self.client.post(reverse('quiz_ai_generate', args=[self.course.id]), {
+            'total_questions': 3, 'total_marks': 7, 'difficulty': 'medium',
+            'materials': [self.material.id],
+        })
+
+    def test_generation_runs_as_a_job_and_feeds_the_preview(self):
+        response = self.generate()
+        job = Job.objects.get(task='quizzes.generate')
+        self.assertRedirects(response, reverse('quiz_ai_job', args=[job.id]))
+        self.assertEqual(job.status, Job.QUEUED)
+
+        status = self.client.get(reverse('quiz_ai_job', args=[job.id]), {'format': 'json'}).json()
+        self.assertEqual((status['status'], status['preview_url']), ('queued', None))
+
+        self.assertEqual(run_pending(), 1)
+        status = self.client.get(reverse('quiz_ai_job', args=[job.id]), {'format': 'json'}).json()
+        self.assertEqual((status['status'], status['progress']), ('done', 100))
+
+        # The local generator is deterministic.
+        job.refresh_from_db()
+        generated = job.result['quiz']
+        Job.objects.filter(id=job.id).update(status=Job.QUEUED, result=None)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.result['quiz'], generated)
+
+        response = self.client.get(status['preview_url'], follow=True)
+        quiz = response.context['quiz']
+        self.assertEqual(quiz, generated)
+        self.assertEqual(len(quiz['questions']), 3)
+        self.assertEqual(sum(q['marks'] for q in quiz['questions']), 7)
+        for question in quiz['questions']:
+            answer = question['options']['ABCD'.index(question['answer'])]
+            self.assertNotIn(answer, question['question'].lower())
+
+    def test_pending_generations_are_limited_and_cancellable(self):
+        self.generate()
+        job = Job.objects.get()
+        response = self.generate()
+        self.assertRedirects(response, reverse('class_view', args=[self.course.id]))
+        self.assertEqual(Job.objects.count(), 1)
+
+        other = User.objects.create_user(
+            email='other@edu.com', password='secret', first_name='Ann', role='teacher')
+        self.client.force_login(other)
+        self.assertEqual(self.client.post(reverse('quiz_ai_cancel', args=[job.id])).status_code, 404)
+
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('quiz_ai_cancel', args=[job.id]))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.CANCELLED)
+        self.assertEqual(run_pending(), 0)
+        self.generate()
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+
+
+class QuizDraftTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.course = Course.objects.create(teacher=self.teacher, title='Biology', code='BIO101')
+        self.client.force_login(self.teacher)
+
+    def make_draft(self, title='Cells quiz'):
+        return drafts.create_draft(self.teacher, self.course, {'title': title, 'questions': [
+            {'question': f'Question {i}?', 'options': ['w', 'x', 'y', 'z'], 'answer': 'B', 'marks': 2}
+            for i in range(3)
+        ]})
+
+    def test_questions_are_edited_one_row_at_a_time_without_the_session(self):
+        first, second = self.make_draft(), self.make_draft('Second quiz')
+        self.assertContains(self.client.get(reverse('quiz_list')), 'Second quiz')
+
+        with self.assertNumQueries(5):  # session + user, draft, one-row update, touch
+            response = self.client.post(
+                reverse('quiz_ai_draft_question', args=[first.id, 1]),
+                {'q1_text': 'Edited?', 'q1_a': 'a', 'q1_b': 'b', 'q1_c': 'c', 'q1_d': 'd',
+                 'q1_correct': 'D', 'q1_marks': '4'})
+        self.assertEqual(response.json(), {'saved': True})
+        self.assertEqual(DraftQuestion.objects.get(draft=first, position=1).data,
+                         {'q': 'Edited?', 'o': ['a', 'b', 'c', 'd'], 'a': 'D', 'm': '4'})
+        self.assertEqual(drafts.draft_quiz(second)['questions'][1]['question'], 'Question 1?')
+        self.assertNotIn('ai_quiz_preview', self.client.session)
+
+        quiz = drafts.draft_quiz(first)
+        data = {'title': 'Cells', 'total_questions': 3}
+        for i, question in enumerate(quiz['questions']):
+            data.update({f'q{i}_text': question['question'], f'q{i}_correct': question['answer'],
+                         f'q{i}_marks': question['marks']})
+            data.update({f'q{i}_{letter}': option for letter, option in zip('abcd', question['options'])})
+        self.client.post(reverse('quiz_ai_save', args=[first.id]), data)
+        saved = Quiz.objects.get(title='Cells')
+        self.assertEqual(saved.questions.get(text='Edited?').correct_option, 'D')
+        self.assertFalse(QuizDraft.objects.filter(id=first.id).exists())
+
+        other = User.objects.create_user(
+            email='other@edu.com', password='secret', first_name='Ann', role='teacher')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('quiz_ai_draft', args=[second.id])).status_code, 404)
+
+    def test_invalid_question_count_is_reported(self):
+        draft = self.make_draft()
+        response = self.client.post(reverse('quiz_ai_save', args=[draft.id]),
+                                    {'title': 'Cells', 'total_questions': 'three'})
+        self.assertRedirects(response, reverse('quiz_ai_draft', args=[draft.id]))
+        self.assertFalse(Quiz.objects.exists())
+
+        response = self.client.post(reverse('quiz_ai_generate', args=[self.course.id]),
+                                    {'total_questions': '10', 'total_marks': 'lots'}, follow=True)
+        self.assertContains(response, "Enter a whole number of questions and marks.")
+        self.assertFalse(Job.objects.exists())
+
+    def test_expired_drafts_are_hidden_and_purged(self):
+        fresh, stale = self.make_draft(), self.make_draft()
+        QuizDraft.objects.filter(id=stale.id).update(expires_at=timezone.now())
+        self.assertEqual(self.client.get(reverse('quiz_ai_draft', args=[stale.id])).status_code, 404)
+
+        call_command('purge_quiz_drafts', stdout=io.StringIO())
+        self.assertEqual(list(QuizDraft.objects.values_list('id', flat=True)), [fresh.id])
+        self.assertEqual(DraftQuestion.objects.count(), 3)
+
+
+class ExamModeTests(TestCase):
+
+    def setUp(self):
+        journal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal, ignore_errors=True)
+        settings = override_settings(EXAM_JOURNAL_DIR=journal, EXAM_JOURNAL_FSYNC=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.journal = journal
+        cache.clear()
+        local_cache.clear()
+
+        teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=teacher, title='Algebra', code='ALG001')
+        self.quiz = Quiz.objects.create(
+            course=course, title='Final', created_by=teacher, is_published=True, exam_mode=True)
+        self.question = Question.objects.create(
+            quiz=self.quiz, text='1 + 1?', option_a='1', option_b='2', option_c='3', option_d='4',
+            correct_option='B', marks=2)
+        self.students = [
+            User.objects.create_user(email=f's{i}@edu.com', password='secret', first_name=f'S{i}',
+                                     role='student')
+            for i in range(3)
+        ]
+        Enrollment.objects.bulk_create(Enrollment(course=course, student=s) for s in self.students)
+
+    def submit(self, student, option):
+        self.client.force_login(student)
+        return self.client.post(reverse('std_take_quiz', args=[self.quiz.id]),
+                                {f'q{self.question.id}': option})
+
+    def test_submission_is_acknowledged_then_graded_by_the_flusher(self):
+        pending = reverse('std_quiz_pending', args=[self.quiz.id])
+        self.assertRedirects(self.submit(self.students[0], 'B'), pending)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+        self.assertContains(self.client.get(pending), 'Grading your quiz')
+        self.assertEqual(self.client.get(pending, {'format': 'json'}).json(),
+                         {'graded': False, 'result_url': None})
+        # Reopening the quiz while it is being graded goes back to the pending page.
+        self.assertRedirects(self.client.get(reverse('std_take_quiz', args=[self.quiz.id])), pending)
+
+        out = io.StringIO()
+        call_command('flush_exam_submissions', stdout=out)
+        self.assertIn('1 attempt(s) stored', out.getvalue())
+        attempt = QuizAttempt.objects.get(student=self.students[0], quiz=self.quiz)
+        self.assertEqual((attempt.score, attempt.total_marks), (2, 2))
+        self.assertEqual(attempt.answers.get().selected_option, 'B')
+        self.assertEqual(self.client.get(pending, {'format': 'json'}).json()['result_url'],
+                         reverse('std_quiz_result', args=[attempt.id]))
+
+    def test_duplicates_and_replayed_segments_are_stored_once(self):
+        self.submit(self.students[0], 'B')
+        cache.clear()  # lose the pending marker so the student can post again
+        self.submit(self.students[0], 'C')
+        self.submit(self.students[1], 'A')
+        grade_submissions(self.quiz, [(self.students[2], {self.question.id: 'B'})])
+        self.submit(self.students[2], 'A')  # already graded: redirected, not journaled
+
+        # Simulate a crash after commit but before the segment was deleted.
+        segment = exam.rotate()
+        shutil.copy(segment, segment + '.bak')
+        stats = exam.flush()
+        os.rename(segment + '.bak', segment)
+        replay = exam.flush()
+
+        self.assertEqual((stats.records, stats.inserted, stats.duplicates), (3, 2, 1))
+        self.assertEqual((replay.inserted, replay.duplicates), (0, 3))
+        self.assertEqual(QuizAttempt.objects.filter(quiz=self.quiz).count(), 3)
+        first = QuizAttempt.objects.get(student=self.students[0])
+        self.assertEqual(first.answers.get().selected_option, 'B')
+        self.assertEqual(exam.backlog(), 0)
+
+    def test_torn_final_line_is_skipped(self):
+        self.submit(self.students[0], 'B')
+        with open(os.path.join(self.journal, exam.ACTIVE), 'ab') as journal:
+            journal.write(b'{"id": "trunc')
+        with self.assertLogs('quizzes.exam', 'WARNING'):
+            stats = exam.flush()
+        self.assertEqual((stats.records, stats.inserted), (1, 1))
+
+    def test_sweeper_leaves_journaled_submissions_to_the_flusher(self):
+        self.client.force_login(self.students[0])
+        self.client.get(reverse('std_take_quiz', args=[self.quiz.id]))
+        self.submit(self.students[0], 'B')
+        cache.clear()  # the sweeper runs in another process, without the receipt
+        QuizAttempt.objects.update(deadline=timezone.now() - timezone.timedelta(minutes=5))
+
+        result = deadlines.sweep_expired()
+        self.assertEqual((result.attempts, result.skipped), (0, 1))
+
+        self.assertEqual(exam.flush().inserted, 1)
+        attempt = QuizAttempt.objects.get(student=self.students[0])
+        self.assertEqual((attempt.is_submitted, attempt.score), (True, 2))
+
+    def test_submissions_of_deleted_students_are_dropped(self):
+        self.submit(self.students[0], 'B')
+        self.submit(self.students[1], 'B')
+        self.students[1].delete()
+
+        stats = exam.flush()
+
+        self.assertEqual((stats.inserted, stats.dropped), (1, 1))
+        self.assertEqual(exam.backlog(), 0)
+        self.assertEqual(exam.flush().records, 0)
+
+
+class AutosaveTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=teacher, title='Algebra', code='ALG001')
+        self.quiz = Quiz.objects.create(course=course, title='Quiz', created_by=teacher)
+        self.questions = Question.objects.bulk_create([
+            Question(quiz=self.quiz, text=f'Q{i}', option_a='a', option_b='b',
+                     option_c='c', option_d='d', correct_option='A', marks=1)
+            for i in range(3)
+        ])
+        self.students = User.objects.bulk_create([
+            User(email=f'student{i}@edu.com', first_name=f'S{i}', role='student') for i in range(40)
+        ])
+        Enrollment.objects.bulk_create(Enrollment(course=course, student=s) for s in self.students)
+        self.take_url = reverse('std_take_quiz', args=[self.quiz.id])
+        self.autosave_url = reverse('std_quiz_autosave', args=[self.quiz.id])
+
+    def test_answers_survive_a_reload_and_are_replaced_on_submit(self):
+        q1, q2, q3 = (q.id for q in self.questions)
+        self.client.force_login(self.students[0])
+        self.client.get(self.take_url)
+        attempt = QuizAttempt.objects.get(student=self.students[0], quiz=self.quiz)
+        self.assertFalse(attempt.is_submitted)
+
+        self.assertEqual(self.client.post(self.autosave_url, {f'q{q1}': 'A', f'q{q2}': 'C'}).json(),
+                         {'saved': 2})
+        self.client.post(self.autosave_url, {f'q{q2}': 'B', f'q{q3}': 'Z'})
+        self.assertFalse(StudentAnswer.objects.exists())  # still only in the cache
+        self.assertEqual(self.client.get(self.take_url).context['saved_answers'], {q1: 'A', q2: 'B'})
+
+        self.assertEqual(autosave.maybe_flush(now=time.time() + 60), 1)
+        self.assertEqual(dict(attempt.answers.values_list('question_id', 'selected_option')),
+                         {q1: 'A', q2: 'B'})
+        cache.clear()
+        self.assertEqual(self.client.get(self.take_url).context['saved_answers'], {q1: 'A', q2: 'B'})
+
+        self.client.post(self.take_url, {f'q{q1}': 'A', f'q{q2}': 'B', f'q{q3}': 'A'})
+        attempt.refresh_from_db()
+        self.assertTrue(attempt.is_submitted)
+        self.assertEqual(attempt.score, 2)
+        self.assertEqual(attempt.answers.count(), 3)
+        self.assertEqual(score_distribution(self.quiz.id), ((2.0, 1),))
+        self.assertEqual(self.client.post(self.autosave_url, {f'q{q1}': 'B'}).status_code, 409)
+
+    def test_a_class_autosaving_is_written_in_one_batch(self):
+        q1, q2, _ = (q.id for q in self.questions)
+        now = time.time()
+        key = get_compiled_quiz(self.quiz).key
+        for student in self.students:
+            attempt = deadlines.start_attempt(self.quiz, student)
+            for option in 'ABCD':
+                autosave.record(attempt.id, key, {q1: option, q2: 'A'}, now=now)
+
+        with self.assertNumQueries(5):  # savepoint, open attempts, questions, upsert, release
+            self.assertEqual(autosave.maybe_flush(now=now + 60), 40)
+        self.assertIsNone(autosave.maybe_flush(now=now + 60))
+        self.assertEqual(StudentAnswer.objects.filter(selected_option='D', question_id=q1).count(), 40)
+        self.assertEqual(StudentAnswer.objects.count(), 80)
+
+    def test_autosave_does_not_use_a_stale_compiled_quiz(self):
+        self.client.force_login(self.students[0])
+        self.client.get(self.take_url)
+        stale = get_compiled_quiz(self.quiz)
+        added = Question.objects.create(quiz=self.quiz, text='Q4', option_a='a', option_b='b',
+                                        option_c='c', option_d='d', correct_option='A', marks=1)
+        local_cache.set(self.quiz.id, stale)  # as another worker still has it
+
+        self.assertEqual(self.client.post(self.autosave_url, {f'q{added.id}': 'B'}).json(), {'saved': 1})
+        self.assertEqual(self.client.get(self.take_url).context['saved_answers'], {added.id: 'B'})
+
+
+class DeadlineTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        course = Course.objects.create(teacher=teacher, title='Algebra', code='ALG001')
+        self.quiz = Quiz.objects.create(course=course, title='Quiz', created_by=teacher, time_limit=20)
+        self.questions = Question.objects.bulk_create([
+            Question(quiz=self.quiz, text=f'Q{i}', option_a='a', option_b='b',
+                     option_c='c', option_d='d', correct_option='A', marks=1)
+            for i in range(2)
+        ])
+        self.students = User.objects.bulk_create([
+            User(email=f's{i}@edu.com', first_name=f'S{i}', role='student') for i in range(25)
+        ])
+        Enrollment.objects.bulk_create(Enrollment(course=course, student=s) for s in self.students)
+
+    def expire(self, *attempts):
+        QuizAttempt.objects.filter(id__in=[a.id for a in attempts]).update(
+            deadline=timezone.now() - timezone.timedelta(minutes=5))
+        cache.delete_many([autosave.attempt_key(self.quiz.id, a.student_id) for a in attempts])
+
+    def test_late_submit_keeps_only_answers_saved_in_time(self):
+        q1, q2 = (q.id for q in self.questions)
+        take_url = reverse('std_take_quiz', args=[self.quiz.id])
+        self.client.force_login(self.students[0])
+        response = self.client.get(take_url)
+        self.assertAlmostEqual(response.context['seconds_left'], 20 * 60, delta=2)
+        attempt = QuizAttempt.objects.get(student=self.students[0])
+        self.assertEqual(attempt.deadline - attempt.started_at, timezone.timedelta(minutes=20))
+        self.assertTrue(Job.objects.filter(task='quizzes.sweep_deadlines', status=Job.QUEUED).exists())
+
+        self.client.post(reverse('std_quiz_autosave', args=[self.quiz.id]), {f'q{q1}': 'A'})
+        autosave.maybe_flush(now=time.time() + 60)
+        self.expire(attempt)
+        late = self.client.post(reverse('std_quiz_autosave', args=[self.quiz.id]), {f'q{q2}': 'A'})
+        self.assertEqual(late.status_code, 409)
+
+        self.client.post(take_url, {f'q{q1}': 'A', f'q{q2}': 'A'})
+        attempt.refresh_from_db()
+        self.assertTrue(attempt.is_submitted)
+        self.assertEqual(attempt.score, 1)
+
+    def test_sweeper_finalizes_expired_attempts_in_batches(self):
+        q1, _ = (q.id for q in self.questions)
+        key = get_compiled_quiz(self.quiz).key
+        attempts = [deadlines.start_attempt(self.quiz, student) for student in self.students]
+        for attempt in attempts[:10]:
+            autosave.record(attempt.id, key, {q1: 'A'})
+        autosave.write_answers({attempt.id: {q1: 'A'} for attempt in attempts[10:15]})
+        grade_submissions(self.quiz, [(self.students[-1], {q1: 'A'})])
+        self.expire(*attempts[:-2])  # the second-to-last student still has time
+
+        result = deadlines.sweep_expired(batch_size=10)
+
+        self.assertEqual(result.attempts, 23)
+        self.assertEqual(QuizAttempt.objects.filter(is_submitted=False).count(), 1)
+        self.assertEqual(QuizAttempt.objects.filter(score=1).count(), 16)
+        swept = QuizAttempt.objects.get(id=attempts[0].id)
+        self.assertEqual(swept.submitted_at, swept.deadline)
+        self.assertEqual(swept.feedback, deadlines.AUTO_SUBMIT_FEEDBACK)
+        self.assertEqual(sum(count for _, count in score_distribution(self.quiz.id)), 24)
+        self.assertEqual(deadlines.sweep_expired().attempts, 0)
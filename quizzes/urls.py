@@ -1,17 +1,27 @@
 from django.urls import path
 from .views import (
-    quiz_list, create_quiz, add_questions,
-    quiz_ai_generate, quiz_ai_preview, quiz_ai_save
+    quiz_list, create_quiz, add_questions, quiz_publish, quiz_exam_mode, quiz_regrade,
+    quiz_ai_generate, quiz_ai_job, quiz_ai_cancel, quiz_ai_preview,
+    quiz_ai_draft, quiz_ai_draft_question, quiz_ai_discard, quiz_ai_save
 )
 
 urlpatterns = [
     path('', quiz_list, name='quiz_list'),
     path('create/', create_quiz, name='create_quiz'),
     path('<int:quiz_id>/add-questions/', add_questions, name='add_questions'),
+    path('<int:quiz_id>/publish/', quiz_publish, name='quiz_publish'),
+    path('<int:quiz_id>/exam-mode/', quiz_exam_mode, name='quiz_exam_mode'),
+    path('<int:quiz_id>/regrade/', quiz_regrade, name='quiz_regrade'),
 
     # FIXED: changed id → class_id
     path("generate/<int:class_id>/", quiz_ai_generate, name="quiz_ai_generate"),
 
+    path("ai/jobs/<int:job_id>/", quiz_ai_job, name="quiz_ai_job"),
+    path("ai/jobs/<int:job_id>/cancel/", quiz_ai_cancel, name="quiz_ai_cancel"),
     path("ai/preview/", quiz_ai_preview, name="quiz_ai_preview"),
-    path("ai/save/", quiz_ai_save, name="quiz_ai_save"),
+    path("ai/drafts/<int:draft_id>/", quiz_ai_draft, name="quiz_ai_draft"),
+    path("ai/drafts/<int:draft_id>/questions/<int:position>/", quiz_ai_draft_question,
+         name="quiz_ai_draft_question"),
+    path("ai/drafts/<int:draft_id>/discard/", quiz_ai_discard, name="quiz_ai_discard"),
+    path("ai/drafts/<int:draft_id>/save/", quiz_ai_save, name="quiz_ai_save"),
 ]
\ No newline at end of file
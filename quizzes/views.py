@@ -1,9 +1,31 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from jobs.models import Job
+from jobs.queue import cancel
 from users.decorators import role
 from courses.models import Course
+from django.db import transaction
+from django.db.models import Count
 from .models import Quiz, Question
+from .drafts import active_drafts, draft_for_job, draft_quiz, update_question
+from .importers import QuestionImportError, import_question_file, import_questions
+from .tasks import GenerationLimitReached, ai_quiz_ref, queue_quiz_generation, queue_regrade
+
+
+MAX_AI_QUESTIONS = 50
+
+
+def report_import_errors(request, exc, limit=5):
+    """Flash the first few validation errors of a rejected question import."""
+    errors = exc.errors
+    summary = "; ".join(errors[:limit])
+    if len(errors) > limit:
+        summary += f" (and {len(errors) - limit} more)"
+    messages.error(request, f"No questions were saved. {summary}")
 
 
 @login_required
@@ -11,8 +33,9 @@ from .models import Quiz, Question
 def quiz_list(request):
     """List all quizzes created by the logged-in teacher."""
     quizzes = Quiz.objects.filter(created_by=request.user).select_related('course').order_by('-created_at')
-    print(f"Your Quizes Are: {quizzes}")
-    return render(request, 'teacher/quiz_list.html', {'quizzes': quizzes})
+    drafts = active_drafts(request.user).select_related('course').annotate(
+        question_count=Count('questions'))
+    return render(request, 'teacher/quiz_list.html', {'quizzes': quizzes, 'drafts': drafts})
 
 
 @login_required
@@ -52,130 +75,261 @@ def add_questions(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id, created_by=request.user)
 
     if request.method == 'POST':
+        question_file = request.FILES.get('question_file')
+        if question_file:
+            try:
+                created = import_question_file(quiz, question_file, request.POST.get('format'))
+            except QuestionImportError as exc:
+                report_import_errors(request, exc)
+            else:
+                messages.success(request, f"Imported {created} questions successfully!")
+            return redirect('add_questions', quiz_id=quiz.id)
+
         text = request.POST.get('text')
-        option_a = request.POST.get('option_a')
-        option_b = request.POST.get('option_b')
-        option_c = request.POST.get('option_c')
-        option_d = request.POST.get('option_d')
         correct_option = request.POST.get('correct_option')
-        marks = request.POST.get('marks', 1)
 
         if not text or not correct_option:
             messages.warning(request, "Please fill in all required fields.")
             return redirect('add_questions', quiz_id=quiz.id)
 
-        Question.objects.create(
-            quiz=quiz,
-            text=text,
-            option_a=option_a,
-            option_b=option_b,
-            option_c=option_c,
-            option_d=option_d,
-            correct_option=correct_option,
-            marks=marks
-        )
-        messages.success(request, "Question added successfully!")
+        try:
+            import_questions(quiz, [{
+                "text": text,
+                "option_a": request.POST.get('option_a'),
+                "option_b": request.POST.get('option_b'),
+                "option_c": request.POST.get('option_c'),
+                "option_d": request.POST.get('option_d'),
+                "correct_option": correct_option,
+                "marks": request.POST.get('marks', 1),
+            }])
+        except QuestionImportError as exc:
+            report_import_errors(request, exc)
+        else:
+            messages.success(request, "Question added successfully!")
         return redirect('add_questions', quiz_id=quiz.id)
 
     questions = quiz.questions.all()
     return render(request, 'teacher/add_questions.html', {'quiz': quiz, 'questions': questions})
 
 
+@login_required
+@role('teacher')
+def quiz_publish(request, quiz_id):
+    """Publish or unpublish a quiz; publishing pre-warms its cached pages."""
+    quiz = get_object_or_404(Quiz, id=quiz_id, created_by=request.user)
+
+    if request.method == 'POST':
+        quiz.is_published = not quiz.is_published
+        quiz.save(update_fields=['is_published', 'version'])
+        state = "published" if quiz.is_published else "unpublished"
+        messages.success(request, f"Quiz '{quiz.title}' {state}.")
+    return redirect('quiz_list')
+
+
+@login_required
+@role('teacher')
+def quiz_exam_mode(request, quiz_id):
+    """Turn exam mode (write-behind grading, see quizzes.exam) on or off."""
+    quiz = get_object_or_404(Quiz, id=quiz_id, created_by=request.user)
+
+    if request.method == 'POST':
+        quiz.exam_mode = not quiz.exam_mode
+        quiz.save(update_fields=['exam_mode', 'version'])
+        state = "on" if quiz.exam_mode else "off"
+        messages.success(request, f"Exam mode {state} for '{quiz.title}'.")
+    return redirect('quiz_list')
+
+
+@login_required
+@role('teacher')
+def quiz_regrade(request, quiz_id):
+    """Queue a rescore of every attempt of a quiz against its current answer key."""
+    quiz = get_object_or_404(Quiz, id=quiz_id, created_by=request.user)
+
+    if request.method == 'POST':
+        # Regrading touches every attempt, so it runs in the job worker.
+        queue_regrade(quiz)
+        messages.success(request, f"Regrade of '{quiz.title}' queued; scores update once it has run.")
+    return redirect('add_questions', quiz_id=quiz.id)
+
+
 @login_required
 @role('teacher')
 def quiz_ai_generate(request, class_id):
     course = get_object_or_404(Course, id=class_id, teacher=request.user)
 
     if request.method == "POST":
-        payload = {
-            "course_id": course.id,
-            "total_questions": request.POST.get("total_questions"),
-            "total_marks": request.POST.get("total_marks"),
-            "difficulty": request.POST.get("difficulty"),
-            "materials": request.POST.getlist("materials"),
-        }
-
-        # 🔥 MOCKED AI RESPONSE (Demo Mode)
-        generated_quiz = {
-            "title": f"{course.title} – AI Generated Quiz",
-            "questions": [
-                {
-                    "question": "What is the purpose of algebra?",
-                    "options": ["To solve equations", "To cook food", "To play games", "To measure liquids"],
-                    "answer": "A",
-                    "marks": 2,
-                },
-                {
-                    "question": "Which shape has 4 equal sides?",
-                    "options": ["Triangle", "Circle", "Square", "Hexagon"],
-                    "answer": "C",
-                    "marks": 2,
-                }
-            ]
-        }
-
-        request.session["ai_quiz_preview"] = generated_quiz
-        request.session["ai_quiz_course"] = course.id
-
-        return redirect("quiz_ai_preview")
+        material_ids = list(course.materials.filter(
+            id__in=[m for m in request.POST.getlist("materials") if m.isdigit()]
+        ).values_list("id", flat=True))
+        try:
+            total_questions = min(max(int(request.POST.get("total_questions", 10)), 1), MAX_AI_QUESTIONS)
+            total_marks = max(int(request.POST.get("total_marks", 20)), 1)
+        except ValueError:
+            messages.error(request, "Enter a whole number of questions and marks.")
+            return redirect("class_view", class_id=course.id)
+        difficulty = request.POST.get("difficulty", "medium")
+
+        # Generation can take a while, so it runs in the job worker.
+        try:
+            job = queue_quiz_generation(
+                request.user, course, material_ids, total_questions, total_marks, difficulty)
+        except GenerationLimitReached as exc:
+            messages.error(request, str(exc))
+            return redirect("class_view", class_id=course.id)
+        return redirect("quiz_ai_job", job_id=job.id)
 
     return redirect("class_view", class_id=course.id)
 
 
+def generation_job(request, job_id):
+    return get_object_or_404(Job, id=job_id, task='quizzes.generate', ref=ai_quiz_ref(request.user.id))
+
+
+@login_required
+@role('teacher')
+def quiz_ai_job(request, job_id):
+    """Progress of an AI quiz generation; the page polls it with ``format=json``."""
+    job = generation_job(request, job_id)
+    preview_url = f"{reverse('quiz_ai_preview')}?job={job.id}"
+
+    if request.GET.get("format") == "json":
+        response = JsonResponse({
+            "status": job.status,
+            "progress": job.progress,
+            "preview_url": preview_url if job.status == Job.DONE else None,
+            "error": "Generation failed. Please try again." if job.status == Job.FAILED else None,
+        })
+        response["Cache-Control"] = "no-store"
+        return response
+
+    if job.status == Job.DONE:
+        return redirect(preview_url)
+    return render(request, "teacher/quiz_ai_job.html", {
+        "job": job,
+        "course_id": job.payload.get("course_id"),
+    })
+
+
+@login_required
+@role('teacher')
+@require_POST
+def quiz_ai_cancel(request, job_id):
+    job = generation_job(request, job_id)
+    if cancel(job.id):
+        messages.info(request, "Quiz generation cancelled.")
+    else:
+        messages.error(request, "This quiz generation has already finished.")
+    return redirect("class_view", class_id=job.payload.get("course_id"))
+
+
 @login_required
 @role('teacher')
 def quiz_ai_preview(request):
-    data = request.session.get("ai_quiz_preview")
-    course_id = request.session.get("ai_quiz_course")
+    """Open the draft holding a finished generation job's quiz."""
+    job_id = request.GET.get("job", "")
+    if not job_id.isdigit():
+        return redirect("quiz_list")
+    job = generation_job(request, job_id)
+    if job.status != Job.DONE or not job.result or "course_id" not in job.result:
+        return redirect("quiz_ai_job", job_id=job.id)
+
+    course = get_object_or_404(Course, id=job.result["course_id"], teacher=request.user)
+    draft = draft_for_job(request.user, course, job)
+    if draft is None:
+        messages.info(request, "This generated quiz has already been saved or discarded.")
+        return redirect("class_view", class_id=course.id)
+    return redirect("quiz_ai_draft", draft_id=draft.id)
 
-    if not data or not course_id:
-        messages.error(request, "AI quiz data not found.")
-        return redirect("teacher_dashboard")
 
-    course = get_object_or_404(Course, id=course_id, teacher=request.user)
+def get_draft(request, draft_id):
+    return get_object_or_404(
+        active_drafts(request.user).select_related("course"), id=draft_id)
 
+
+def posted_question(post, prefix):
+    return {
+        "question": post.get(f"{prefix}_text", ""),
+        "options": [post.get(f"{prefix}_{letter}", "") for letter in "abcd"],
+        "answer": post.get(f"{prefix}_correct", ""),
+        "marks": post.get(f"{prefix}_marks", ""),
+    }
+
+
+@login_required
+@role('teacher')
+def quiz_ai_draft(request, draft_id):
+    draft = get_draft(request, draft_id)
     return render(request, 'teacher/quiz_ai_preview.html', {
-        "course": course,
-        "quiz": data,
+        "course": draft.course,
+        "draft": draft,
+        "quiz": draft_quiz(draft),
     })
 
 
 @login_required
 @role('teacher')
-def quiz_ai_save(request):
-    if request.method != "POST":
-        return redirect("teacher_dashboard")
+@require_POST
+def quiz_ai_draft_question(request, draft_id, position):
+    """Save one edited question of a draft (sent by the preview page as you type)."""
+    draft = get_draft(request, draft_id)
+    if not update_question(draft, position, posted_question(request.POST, f"q{position}")):
+        return JsonResponse({"saved": False}, status=404)
+    return JsonResponse({"saved": True})
 
-    course_id = request.session.get("ai_quiz_course")
-    course = get_object_or_404(Course, id=course_id, teacher=request.user)
 
-    title = request.POST.get("title")
+@login_required
+@role('teacher')
+@require_POST
+def quiz_ai_discard(request, draft_id):
+    draft = get_draft(request, draft_id)
+    course_id = draft.course_id
+    draft.delete()
+    messages.info(request, "Draft discarded.")
+    return redirect("class_view", class_id=course_id)
 
-    quiz = Quiz.objects.create(
-        course=course,
-        title=title,
-        description="AI Generated Quiz",
-        time_limit=10,
-        created_by=request.user
-    )
 
-    total = int(request.POST.get("total_questions"))
+@login_required
+@role('teacher')
+@require_POST
+def quiz_ai_save(request, draft_id):
+    draft = get_draft(request, draft_id)
+    course = draft.course
 
+    title = request.POST.get("title")
+    try:
+        total = min(max(int(request.POST.get("total_questions") or 0), 0), MAX_AI_QUESTIONS)
+    except ValueError:
+        messages.error(request, "No questions were saved. The question count must be a whole number.")
+        return redirect("quiz_ai_draft", draft_id=draft.id)
+    records = []
     for i in range(total):
-        Question.objects.create(
-            quiz=quiz,
-            text=request.POST.get(f"q{i}_text"),
-            option_a=request.POST.get(f"q{i}_a"),
-            option_b=request.POST.get(f"q{i}_b"),
-            option_c=request.POST.get(f"q{i}_c"),
-            option_d=request.POST.get(f"q{i}_d"),
-            correct_option=request.POST.get(f"q{i}_correct"),
-            marks=request.POST.get(f"q{i}_marks"),
-        )
-
-    # Clear session
-    request.session.pop("ai_quiz_preview", None)
-    request.session.pop("ai_quiz_course", None)
+        question = posted_question(request.POST, f"q{i}")
+        records.append({
+            "text": question["question"],
+            "option_a": question["options"][0],
+            "option_b": question["options"][1],
+            "option_c": question["options"][2],
+            "option_d": question["options"][3],
+            "correct_option": question["answer"],
+            "marks": question["marks"],
+        })
+
+    # Quiz and questions are written together, or not at all.
+    try:
+        with transaction.atomic():
+            quiz = Quiz.objects.create(
+                course=course,
+                title=title,
+                description="AI Generated Quiz",
+                time_limit=10,
+                created_by=request.user
+            )
+            import_questions(quiz, records)
+            draft.delete()
+    except QuestionImportError as exc:
+        report_import_errors(request, exc)
+        return redirect("quiz_ai_draft", draft_id=draft.id)
 
     messages.success(request, f"AI Quiz '{quiz.title}' saved successfully!")
     return redirect("quiz_list")
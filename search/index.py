@@ -0,0 +1,293 @@
+"""
+Full-text search index over course materials and quiz questions.
+
+Searchable text is copied into a single ``search_entry`` table: an FTS5
+virtual table on SQLite, or a table with a stored, GIN-indexed
+``tsvector`` on PostgreSQL. Each row's id is derived from the source
+object (``object_id * len(KINDS) + kind``), so re-indexing an object is a
+primary-key replace.
+
+On SQLite the course and kind of a row are stored as one token of an
+indexed ``scope`` column (``c12m`` for a material of course 12), so
+permission scoping is part of the FTS query itself and only matching rows
+of the user's courses are ever ranked. Whole-word queries stay around a
+millisecond at a million rows; prefix matching is limited to a final term
+of at least three characters, backed by 3- and 4-character prefix indexes.
+
+The model signals in ``search.signals`` keep the index current; bulk
+writers call ``index_materials`` / ``index_questions`` themselves. Other
+database backends have no index and searches return nothing.
+"""
+import re
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from courses.models import Material
+from quizzes.models import Question
+
+
+TABLE = 'search_entry'
+KINDS = {'material': 0, 'question': 1}
+
+MAX_BODY_CHARS = 200_000
+MAX_QUERY_TERMS = 16
+MIN_PREFIX_CHARS = 3
+REINDEX_BATCH_SIZE = 2000
+
+# Marks placed around matches by the database, swapped for <mark> after escaping.
+START, STOP = '\x02', '\x03'
+
+
+@dataclass(frozen=True)
+class Entry:
+    kind: str
+    object_id: int
+    course_id: int
+    title: str
+    body: str
+
+    @property
+    def rowid(self):
+        return entry_id(self.kind, self.object_id)
+
+
+@dataclass
+class Hit:
+    kind: str
+    object_id: int
+    course_id: int
+    title: str
+    snippet: str
+    url: str = ''
+
+
+def entry_id(kind, object_id):
+    return object_id * len(KINDS) + KINDS[kind]
+
+
+def scope_token(course_id, kind):
+    return f"c{course_id}{kind[0]}"
+
+
+def highlight(text):
+    return mark_safe(escape(text or '').replace(START, '<mark>').replace(STOP, '</mark>'))
+
+
+def material_entries(materials):
+    rows = materials.values_list('id', 'course_id', 'title', 'summary', 'text')
+    for material_id, course_id, title, summary, text in rows.iterator(chunk_size=REINDEX_BATCH_SIZE):
+        body = '\n\n'.join(part for part in (summary, text) if part)
+        yield Entry('material', material_id, course_id, title, body[:MAX_BODY_CHARS])
+
+
+def question_entries(questions):
+    rows = questions.values_list(
+        'id', 'quiz__course_id', 'text', 'option_a', 'option_b', 'option_c', 'option_d')
+    for question_id, course_id, text, *options in rows.iterator(chunk_size=REINDEX_BATCH_SIZE):
+        yield Entry('question', question_id, course_id, text, '\n'.join(options))
+
+
+class SqliteBackend:
+
+    create_sql = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        "title, body, scope, kind UNINDEXED, object_id UNINDEXED, course_id UNINDEXED, "
+        "tokenize = 'porter unicode61 remove_diacritics 2', prefix = '3 4')",
+        # Rank title matches above body matches; the scope column never counts.
+        f"INSERT INTO {TABLE}({TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 0.0)')",
+    ]
+    drop_sql = [f"DROP TABLE IF EXISTS {TABLE}"]
+
+    def upsert(self, cursor, entries):
+        self.delete(cursor, [entry.rowid for entry in entries])
+        self.insert(cursor, entries)
+
+    def insert(self, cursor, entries):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, title, body, scope, kind, object_id, course_id) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [
+                (entry.rowid, entry.title, entry.body,
+                 scope_token(entry.course_id, entry.kind), entry.kind, entry.object_id, entry.course_id)
+                for entry in entries
+            ],
+        )
+
+    def delete(self, cursor, rowids):
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(rowid,) for rowid in rowids])
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+    def optimize(self, cursor):
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+
+    def match_expression(self, text, course_ids, kinds):
+        terms = re.findall(r'\w+', text.lower())[:MAX_QUERY_TERMS]
+        if not terms:
+            return None
+        # Quote every term so user input can never be read as FTS5 syntax;
+        # a long enough last term is a prefix so results update while typing.
+        query = ' '.join(f'"{term}"' for term in terms)
+        if len(terms[-1]) >= MIN_PREFIX_CHARS:
+            query += '*'
+        scope = ' OR '.join(
+            scope_token(course_id, kind) for course_id in course_ids for kind in kinds)
+        return f'{{title body}} : ({query}) AND scope : ({scope})'
+
+    def search(self, cursor, text, course_ids, kinds, limit, offset):
+        expression = self.match_expression(text, course_ids, kinds)
+        if expression is None:
+            return []
+        cursor.execute(
+            f"SELECT kind, object_id, course_id, "
+            f"highlight({TABLE}, 0, char(2), char(3)), "
+            f"snippet({TABLE}, 1, char(2), char(3), '…', 24) "
+            f"FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rank LIMIT %s OFFSET %s",
+            [expression, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+class PostgresBackend:
+
+    create_sql = [
+        f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+        "id bigint PRIMARY KEY, kind varchar(16) NOT NULL, object_id bigint NOT NULL, "
+        "course_id bigint NOT NULL, title text NOT NULL, body text NOT NULL, "
+        "document tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', title), 'A') || "
+        "setweight(to_tsvector('english', body), 'B')) STORED)",
+        f"CREATE INDEX IF NOT EXISTS {TABLE}_document ON {TABLE} USING GIN (document)",
+        f"CREATE INDEX IF NOT EXISTS {TABLE}_course ON {TABLE} (course_id, kind)",
+    ]
+    drop_sql = [f"DROP TABLE IF EXISTS {TABLE}"]
+
+    def upsert(self, cursor, entries):
+        self.insert(cursor, entries)
+
+    def insert(self, cursor, entries):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (id, kind, object_id, course_id, title, body) "
+            "VALUES (%s, %s, %s, %s, %s, %s) ON CONFLICT (id) DO UPDATE SET "
+            "course_id = EXCLUDED.course_id, title = EXCLUDED.title, body = EXCLUDED.body",
+            [
+                (entry.rowid, entry.kind, entry.object_id, entry.course_id,
+                 entry.title, entry.body.replace('\x00', ''))
+                for entry in entries
+            ],
+        )
+
+    def delete(self, cursor, rowids):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE id = ANY(%s)", [list(rowids)])
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {TABLE}")
+
+    def optimize(self, cursor):
+        cursor.execute(f"ANALYZE {TABLE}")
+
+    def search(self, cursor, text, course_ids, kinds, limit, offset):
+        if not text.strip():
+            return []
+        # Rank and page first, then build headlines for the returned page only.
+        options = "'StartSel=' || chr(2) || ', StopSel=' || chr(3)"
+        cursor.execute(
+            f"SELECT e.kind, e.object_id, e.course_id, "
+            f"ts_headline('english', e.title, q, {options} || ', HighlightAll=true'), "
+            f"ts_headline('english', e.body, q, {options} || ', MaxFragments=2') "
+            f"FROM (SELECT id, ts_rank_cd(document, q) AS score, q FROM {TABLE}, "
+            f"websearch_to_tsquery('english', %s) q WHERE document @@ q "
+            f"AND course_id = ANY(%s) AND kind = ANY(%s) "
+            f"ORDER BY score DESC, id LIMIT %s OFFSET %s) ranked "
+            f"JOIN {TABLE} e ON e.id = ranked.id ORDER BY ranked.score DESC, e.id",
+            [text, list(course_ids), list(kinds), limit, offset],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {'sqlite': SqliteBackend, 'postgresql': PostgresBackend}
+
+
+def get_backend(vendor=None):
+    backend = BACKENDS.get(vendor or connection.vendor)
+    return backend() if backend else None
+
+
+def write_entries(entries, removed=()):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        if removed:
+            backend.delete(cursor, list(removed))
+        if entries:
+            backend.upsert(cursor, entries)
+
+
+def index_materials(material_ids):
+    """(Re)index the given materials, dropping any that no longer exist."""
+    entries = list(material_entries(Material.objects.filter(id__in=material_ids)))
+    found = {entry.object_id for entry in entries}
+    write_entries(entries, [entry_id('material', i) for i in material_ids if i not in found])
+
+
+def index_questions(question_ids):
+    """(Re)index the given questions, dropping any that no longer exist."""
+    entries = list(question_entries(Question.objects.filter(id__in=question_ids)))
+    found = {entry.object_id for entry in entries}
+    write_entries(entries, [entry_id('question', i) for i in question_ids if i not in found])
+
+
+def remove(kind, object_ids):
+    write_entries([], [entry_id(kind, object_id) for object_id in object_ids])
+
+
+def search(text, course_ids, kinds=tuple(KINDS), page=1, page_size=20):
+    """
+    Return ``(hits, has_next)`` for ``text`` within ``course_ids``, best
+    match first.
+    """
+    backend = get_backend()
+    course_ids = list(course_ids)
+    if backend is None or not course_ids or not kinds:
+        return [], False
+    with connection.cursor() as cursor:
+        rows = backend.search(
+            cursor, text, course_ids, kinds, page_size + 1, (page - 1) * page_size)
+    hits = [
+        Hit(kind, object_id, course_id, highlight(title), highlight(snippet))
+        for kind, object_id, course_id, title, snippet in rows[:page_size]
+    ]
+    return hits, len(rows) > page_size
+
+
+def rebuild_index(batch_size=REINDEX_BATCH_SIZE, progress=None):
+    """Rebuild the whole index in batches; returns the number of entries written."""
+    backend = get_backend()
+    if backend is None:
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.clear(cursor)
+        written = 0
+        for entries in (material_entries(Material.objects.order_by('id')),
+                        question_entries(Question.objects.order_by('id'))):
+            batch = []
+            for entry in entries:
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    backend.insert(cursor, batch)
+                    written += len(batch)
+                    batch = []
+                    if progress:
+                        progress(written)
+            if batch:
+                backend.insert(cursor, batch)
+                written += len(batch)
+                if progress:
+                    progress(written)
+        backend.optimize(cursor)
+    return written
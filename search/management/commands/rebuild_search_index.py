@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from search.index import REINDEX_BATCH_SIZE, get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index over materials and questions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REINDEX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            raise CommandError("Full-text search needs SQLite (FTS5) or PostgreSQL.")
+
+        started = time.monotonic()
+        written = rebuild_index(
+            batch_size=options['batch_size'],
+            progress=lambda count: self.stdout.write(f"  indexed {count} entries"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {written} entries in {time.monotonic() - started:.1f}s."))
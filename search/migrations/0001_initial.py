@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+# The index as it was created by this migration. It is spelled out here
+# rather than read from search.index, so later changes to that module
+# cannot change what this migration does.
+CREATE_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_entry USING fts5("
+        "title, body, scope, kind UNINDEXED, object_id UNINDEXED, course_id UNINDEXED, "
+        "tokenize = 'porter unicode61 remove_diacritics 2', prefix = '3 4')",
+        "INSERT INTO search_entry(search_entry, rank) VALUES ('rank', 'bm25(10.0, 1.0, 0.0)')",
+    ],
+    'postgresql': [
+        "CREATE TABLE IF NOT EXISTS search_entry ("
+        "id bigint PRIMARY KEY, kind varchar(16) NOT NULL, object_id bigint NOT NULL, "
+        "course_id bigint NOT NULL, title text NOT NULL, body text NOT NULL, "
+        "document tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', title), 'A') || "
+        "setweight(to_tsvector('english', body), 'B')) STORED)",
+        "CREATE INDEX IF NOT EXISTS search_entry_document ON search_entry USING GIN (document)",
+        "CREATE INDEX IF NOT EXISTS search_entry_course ON search_entry (course_id, kind)",
+    ],
+}
+DROP_SQL = ["DROP TABLE IF EXISTS search_entry"]
+
+
+def create_index(apps, schema_editor):
+    for statement in CREATE_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        for statement in DROP_SQL:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_material_blobs'),
+        ('quizzes', '0004_scorebucket'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
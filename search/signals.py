@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from courses.models import Material
+from quizzes.models import Question
+from . import index
+
+
+# Writes run inside the saving transaction, so the index never gets ahead
+# of a rolled-back change.
+
+@receiver(post_save, sender=Material)
+def material_saved(sender, instance, **kwargs):
+    index.index_materials([instance.pk])
+
+
+@receiver(post_delete, sender=Material)
+def material_deleted(sender, instance, **kwargs):
+    index.remove('material', [instance.pk])
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    index.index_questions([instance.pk])
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    index.remove('question', [instance.pk])
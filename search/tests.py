@@ -0,0 +1,67 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from courses.models import Course, Enrollment, Material
+from quizzes.importers import import_questions
+from quizzes.models import Quiz, Question
+from users.models import User
+from .index import rebuild_index, search
+
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='teacher@edu.com', password='secret', first_name='Tom', role='teacher')
+        self.course = Course.objects.create(teacher=self.teacher, title='Biology', code='BIO001')
+        self.other = Course.objects.create(teacher=self.teacher, title='Chemistry', code='CHE001')
+        self.quiz = Quiz.objects.create(course=self.course, title='Cells', created_by=self.teacher)
+
+        Material.objects.bulk_create([
+            Material(course=self.course, title='Cell biology notes', file='notes.txt',
+                     summary='Mitochondria are the powerhouse of the cell.'),
+            Material(course=self.other, title='Chemical bonds', file='bonds.txt',
+                     summary='Ionic and covalent bonds between atoms.'),
+        ])
+        import_questions(self.quiz, [{
+            'text': 'Which organelle produces energy?', 'option_a': 'Mitochondria',
+            'option_b': 'Nucleus', 'option_c': 'Ribosome', 'option_d': 'Vacuole',
+            'correct_option': 'A',
+        }])
+        rebuild_index()  # bulk_create above skipped the signals
+
+    def kinds(self, query, course_ids, **kwargs):
+        hits, _ = search(query, course_ids, **kwargs)
+        return [(hit.kind, str(hit.title)) for hit in hits]
+
+    def test_ranked_scoped_and_highlighted(self):
+        hits, has_next = search('mitochondria', [self.course.id])
+        self.assertFalse(has_next)
+        self.assertEqual({hit.kind for hit in hits}, {'material', 'question'})
+        self.assertIn('<mark>Mitochondria</mark>', hits[0].snippet + hits[1].snippet)
+
+        # Other courses stay out of scope; prefix matching on the last term.
+        self.assertEqual(self.kinds('covalent', [self.course.id]), [])
+        self.assertEqual(self.kinds('coval', [self.other.id]), [('material', 'Chemical bonds')])
+        # FTS syntax in user input is treated as plain words.
+        self.assertEqual(self.kinds('cell" (* :', [self.course.id], kinds=('material',)),
+                         [('material', '<mark>Cell</mark> biology notes')])
+
+    def test_signals_keep_index_current(self):
+        question = Question.objects.get()
+        question.text = 'Where is DNA stored?'
+        question.save()
+        self.assertEqual(self.kinds('dna', [self.course.id]), [('question', 'Where is <mark>DNA</mark> stored?')])
+        self.assertEqual(self.kinds('organelle', [self.course.id]), [])
+
+        question.delete()
+        self.assertEqual(self.kinds('dna', [self.course.id]), [])
+
+    def test_students_only_search_their_materials(self):
+        student = User.objects.create_user(
+            email='student@edu.com', password='secret', first_name='Sam', role='student')
+        Enrollment.objects.create(student=student, course=self.course)
+        self.client.force_login(student)
+
+        response = self.client.get(reverse('search'), {'q': 'mitochondria', 'format': 'json'})
+        self.assertEqual([r['kind'] for r in response.json()['results']], ['material'])
@@ -0,0 +1,77 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.urls import reverse
+
+from courses.models import Course, Material
+from quizzes.models import Question
+from users.decorators import role
+from .index import KINDS, search as run_search
+
+
+PAGE_SIZE = 20
+
+
+def searchable_scope(user):
+    """Course ids and entry kinds ``user`` may search."""
+    if user.role == 'teacher':
+        course_ids = Course.objects.filter(teacher=user).values_list('id', flat=True)
+        return list(course_ids), tuple(KINDS)
+    # Students never see question text outside a quiz attempt.
+    course_ids = Course.objects.filter(enrollments__student=user).values_list('id', flat=True)
+    return list(course_ids), ('material',)
+
+
+def attach_urls(hits):
+    """Resolve a link for every hit with one query per kind."""
+    material_ids = [hit.object_id for hit in hits if hit.kind == 'material']
+    question_ids = [hit.object_id for hit in hits if hit.kind == 'question']
+    files = dict(Material.objects.filter(id__in=material_ids).values_list('id', 'file'))
+    quizzes = dict(Question.objects.filter(id__in=question_ids).values_list('id', 'quiz_id'))
+    storage = Material._meta.get_field('file').storage
+    for hit in hits:
+        if hit.kind == 'material' and files.get(hit.object_id):
+            hit.url = storage.url(files[hit.object_id])
+        elif hit.kind == 'question' and hit.object_id in quizzes:
+            hit.url = reverse('add_questions', args=[quizzes[hit.object_id]])
+
+
+@login_required
+@role('teacher', 'student')
+def search(request):
+    """Ranked full-text search over the materials (and, for teachers, questions) of the user's courses."""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    course_ids, kinds = searchable_scope(request.user)
+    kind = request.GET.get('kind')
+    if kind in kinds:
+        kinds = (kind,)
+
+    hits, has_next = run_search(query, course_ids, kinds, page, PAGE_SIZE) if query else ([], False)
+    attach_urls(hits)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'query': query,
+            'page': page,
+            'has_next': has_next,
+            'results': [
+                {'kind': hit.kind, 'id': hit.object_id, 'course_id': hit.course_id,
+                 'title': hit.title, 'snippet': hit.snippet, 'url': hit.url}
+                for hit in hits
+            ],
+        })
+
+    return render(request, 'search/results.html', {
+        'base_template': 'tbase.html' if request.user.role == 'teacher' else 'sbase.html',
+        'query': query,
+        'kind': kind if kind in KINDS else '',
+        'kinds': kinds,
+        'hits': hits,
+        'page': page,
+        'has_next': has_next,
+    })
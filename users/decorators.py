@@ -1,6 +1,8 @@
 from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
 
 
 def role(*allowed_roles):
@@ -17,8 +19,15 @@ def role(*allowed_roles):
     @login_required
     @role('teacher', 'student')
     def shared_view(...):
+
+    Async views are wrapped in an async wrapper. ``login_required`` is
+    sync-only in Django 4.2, so on async views use ``role`` on its own: it
+    then also sends anonymous users to the login page.
     """
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            return async_role_wrapper(view_func, allowed_roles)
+
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
             # Ensure user is authenticated
@@ -37,3 +46,28 @@ def role(*allowed_roles):
             return view_func(request, *args, **kwargs)
         return wrapper
     return decorator
+
+
+def load_user(request):
+    request.user.is_authenticated  # evaluates the lazy object (session + user queries)
+    return request.user
+
+
+async def resolve_user(request):
+    """Load ``request.user`` off the event loop; afterwards it can be used from async code."""
+    return await sync_to_async(load_user)(request)
+
+
+def async_role_wrapper(view_func, allowed_roles):
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await resolve_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+
+        if getattr(user, 'role', None) not in allowed_roles:
+            messages.error(request, "Access denied: You do not have permission to view this page.")
+            return redirect(request.META.get('HTTP_REFERER', '/'))
+
+        return await view_func(request, *args, **kwargs)
+    return wrapper